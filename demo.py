@@ -13,6 +13,11 @@ import io
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
 
+def print_token(text):
+    """逐段打印模型输出的文本"""
+    print(text, end="", flush=True)
+
+
 def print_separator(title=None):
     """打印分隔线，使输出更清晰"""
     if title:
@@ -59,7 +64,8 @@ def main():
         print_separator("2. 基本文本生成示例")
         prompt = "请简单解释什么是人工智能，并列举两个实际应用场景"
         print(f"提问: {prompt}")
-        response = client.generate(prompt, stream=True)  # 使用流式输出
+        response = client.generate(prompt, stream=True, sink=print_token)  # 使用流式输出
+        print()
         print(f"生成结果: {response}")
     except Exception as e:
         print(f"文本生成出错：{str(e)}")
@@ -83,7 +89,8 @@ def main():
         messages.append({"role": "user", "content": new_question})
         print(f"\nUser: {new_question}")
         
-        response = client.chat(messages, stream=True)  # 使用流式输出
+        response = client.chat(messages, stream=True, sink=print_token)  # 使用流式输出
+        print()
         print(f"Assistant: {response}")
         
         # 将AI的回复添加到对话历史中，以便后续对话
@@ -110,7 +117,7 @@ def main():
         if os.path.exists(image_path):
             # 确保使用支持图片的多模态模型，例如qwen2.5vl:latest
             # 查找支持多模态的模型
-            multimodal_models = [model['name'] for model in models if any(keyword in model['name'].lower() for keyword in ['llava', 'vl', 'vision'])]
+            multimodal_models = [info.name for info in client.catalog.find("vision")]
             
             if multimodal_models:
                 # 使用找到的第一个多模态模型
@@ -123,8 +130,10 @@ def main():
                     model=multimodal_model,
                     messages=image_messages,
                     images=[image_path],
-                    stream=True  # 对于长文本回复，禁用流式输出可能更易于阅读
+                    stream=True,  # 对于长文本回复，禁用流式输出可能更易于阅读
+                    sink=print_token
                 )
+                print()
                 print(f"图片分析结果：{response}")
             else:
                 print("未找到支持图片分析的多模态模型")
@@ -0,0 +1,181 @@
+"""
+按模型分组调度请求，减少服务器反复卸载和加载模型
+
+等待中的请求按模型排队，同一时间只服务有限个模型（一波），同一模型的请求可以并发执行；
+当前模型的请求处理完后再切换到下一个模型。其他模型的请求等待超过max_wait秒时，当前模型
+停止接收新的请求，尽快让出位置，避免请求饿死。
+"""
+
+import collections
+import contextlib
+import threading
+import time
+
+
+class _Waiter:
+    __slots__ = ("since",)
+
+    def __init__(self):
+        self.since = time.monotonic()
+
+
+class ModelScheduler:
+    """
+    模型亲和调度器
+
+    用法:
+        client = OllamaClient(scheduler=ModelScheduler(per_model=4, max_wait=30))
+        for result in client.generate_many(items, concurrency=32):  # 线程数决定可以重新排序的请求数
+            ...
+        print(client.scheduler.stats["avoided_switches"])
+    """
+    def __init__(self, per_model=4, max_loaded=1, max_wait=30.0):
+        """
+        Args:
+            per_model (int): 每个模型同时发往服务器的最大请求数
+            max_loaded (int): 同时服务的模型数，通常与服务器的OLLAMA_MAX_LOADED_MODELS一致
+            max_wait (float): 请求的最长等待秒数，超过后当前模型让出位置
+        """
+        self.per_model = per_model
+        self.max_loaded = max_loaded
+        self.max_wait = max_wait
+        self.requests = 0
+        self.switches = 0
+        self.arrival_switches = 0
+        self.admitted = 0
+        self.total_wait = 0.0
+        self.longest_wait = 0.0
+        self._running = {}
+        self._waiting = collections.OrderedDict()
+        self._loaded = []
+        self._last_arrival = None
+        self._cond = threading.Condition()
+
+    def _busy(self):
+        return {model for model, count in self._running.items() if count}
+
+    def _starving(self, busy, now):
+        return [
+            model for model, queue in self._waiting.items()
+            if queue and model not in busy and now - queue[0].since >= self.max_wait
+        ]
+
+    def _pick(self, busy, starving):
+        """
+        选择下一波要服务的模型：优先饿死的请求，其次是已加载的模型，最后按等待时间先后
+        """
+        candidates = starving or [
+            model for model, queue in self._waiting.items() if queue and model not in busy
+        ]
+        if not starving:
+            loaded = [model for model in candidates if model in self._loaded]
+            candidates = loaded or candidates
+        return min(candidates, key=lambda model: self._waiting[model][0].since, default=None)
+
+    def _admissible(self, model, waiter, now):
+        if self._waiting[model][0] is not waiter or self._running.get(model, 0) >= self.per_model:
+            return False
+        busy = self._busy()
+        starving = self._starving(busy, now)
+        if model in busy:
+            # 有其他模型的请求等待过久时，当前模型不再接收新的请求
+            return not starving
+        if len(busy) >= self.max_loaded:
+            return False
+        return model == self._pick(busy, starving)
+
+    def _timeout(self, now):
+        """
+        距离下一个请求达到最长等待时间的秒数，届时需要重新检查
+        """
+        heads = [queue[0].since for queue in self._waiting.values() if queue]
+        if not heads:
+            return None
+        return max(0.0, min(heads) + self.max_wait - now) + 0.001
+
+    def acquire(self, model):
+        """
+        等待轮到model
+
+        Args:
+            model (str): 请求使用的模型
+        """
+        with self._cond:
+            self.requests += 1
+            if self._last_arrival is not None and model != self._last_arrival:
+                self.arrival_switches += 1
+            self._last_arrival = model
+            waiter = _Waiter()
+            queue = self._waiting.setdefault(model, collections.deque())
+            queue.append(waiter)
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self._admissible(model, waiter, now):
+                        break
+                    self._cond.wait(self._timeout(now))
+            finally:
+                queue.remove(waiter)
+                if not queue:
+                    del self._waiting[model]
+                # 无论是获得名额还是被中断，队列都发生了变化
+                self._cond.notify_all()
+            self._running[model] = self._running.get(model, 0) + 1
+            self._load(model)
+            waited = time.monotonic() - waiter.since
+            self.admitted += 1
+            self.total_wait += waited
+            self.longest_wait = max(self.longest_wait, waited)
+
+    def _load(self, model):
+        if model in self._loaded:
+            self._loaded.remove(model)
+        elif len(self._loaded) >= self.max_loaded:
+            # 服务器需要卸载一个模型才能加载这个模型
+            self._loaded.pop(0)
+            self.switches += 1
+        self._loaded.append(model)
+
+    def release(self, model):
+        """
+        请求结束后调用
+        """
+        with self._cond:
+            self._running[model] -= 1
+            if not self._running[model]:
+                del self._running[model]
+            self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def slot(self, model):
+        """
+        在with代码块中占用model的一个名额
+        """
+        self.acquire(model)
+        try:
+            yield
+        finally:
+            self.release(model)
+
+    @property
+    def stats(self):
+        """
+        调度统计信息
+
+        Returns:
+            dict: requests（请求数）、switches（实际的模型切换次数）、arrival_switches（按到达顺序执行时
+                的切换次数，估算值）、avoided_switches（避免的切换次数）、mean_wait/longest_wait（排队秒数）、
+                running/waiting（各模型正在执行和等待的请求数）、loaded（最近服务的模型）
+        """
+        with self._cond:
+            return {
+                "requests": self.requests,
+                "switches": self.switches,
+                "arrival_switches": self.arrival_switches,
+                "avoided_switches": max(0, self.arrival_switches - self.switches),
+                "mean_wait": self.total_wait / self.admitted if self.admitted else 0.0,
+                "longest_wait": self.longest_wait,
+                "running": dict(self._running),
+                "waiting": {model: len(queue) for model, queue in self._waiting.items()},
+                "loaded": list(self._loaded),
+            }
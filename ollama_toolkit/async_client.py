@@ -0,0 +1,309 @@
+import asyncio
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp是可选依赖: pip install ollama_toolkit[async]
+    aiohttp = None
+
+from ollama_toolkit.batch import arun_many
+from ollama_toolkit.images import ImageEncoder
+from ollama_toolkit.ndjson import LineSplitter, decode_line
+from ollama_toolkit.ollama_client import _attach_images, _format_http_error
+from ollama_toolkit.streaming import ResponseAccumulator, StreamChunk
+
+
+class AsyncOllamaClient:
+    """
+    基于asyncio的Ollama客户端，使用有上限的keep-alive连接池，
+    适合在一个事件循环中同时驱动大量并发的generate/chat请求。
+
+    用法:
+        async with AsyncOllamaClient(max_connections=200) as client:
+            async for chunk in client.generate_stream("你好"):
+                ...
+    """
+    def __init__(self, base_url="http://localhost:11434", default_model="qwen3",
+                 max_connections=100, max_connections_per_host=0, keepalive_timeout=60,
+                 image_encoder=None):
+        """
+        初始化异步Ollama客户端
+
+        Args:
+            base_url (str): Ollama API的基础URL
+            default_model (str): 默认使用的模型名称
+            max_connections (int): 连接池中最多同时打开的连接数
+            max_connections_per_host (int): 每个主机最多同时打开的连接数，0表示不单独限制
+            keepalive_timeout (float): 空闲连接保持的秒数
+            image_encoder (ImageEncoder, optional): 图片编码器，为None时使用默认配置
+        """
+        if aiohttp is None:
+            raise ImportError("AsyncOllamaClient需要aiohttp，请先安装: pip install aiohttp")
+        self.base_url = base_url.rstrip('/')
+        self.default_model = default_model
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.image_encoder = image_encoder or ImageEncoder()
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    @property
+    def session(self):
+        """
+        延迟创建的aiohttp会话（必须在事件循环中创建）
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            # 生成可能持续很久，不设置总超时
+            timeout = aiohttp.ClientTimeout(total=None)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    async def close(self):
+        """
+        关闭连接池和图片编码线程池
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        # 等待正在进行的编码结束，不阻塞事件循环
+        await asyncio.get_running_loop().run_in_executor(None, self.image_encoder.close)
+
+    async def _raise_for_status(self, response):
+        """
+        检查HTTP状态码，出错时抛出带有处理建议的aiohttp.ClientResponseError
+        """
+        if response.status < 400:
+            return
+        text = await response.text()
+        error_msg = _format_http_error(f"{response.status} {response.reason}", text)
+        raise aiohttp.ClientResponseError(
+            response.request_info,
+            response.history,
+            status=response.status,
+            message=error_msg,
+            headers=response.headers,
+        )
+
+    async def _stream(self, path, data):
+        """
+        发送流式请求，逐个产出解析后的NDJSON数据块
+        """
+        url = f"{self.base_url}{path}"
+        async with self.session.post(url, json=data) as response:
+            await self._raise_for_status(response)
+            # 自行按行切分：最后一个数据块携带的context数组可能超过aiohttp的单行长度限制
+            splitter = LineSplitter()
+            async for data in response.content.iter_any():
+                for line in splitter.feed(data):
+                    chunk = decode_line(line)
+                    if chunk is None:
+                        continue
+                    yield chunk
+                    # 检查是否完成
+                    if chunk.get("done", False):
+                        return
+            chunk = decode_line(splitter.flush())
+            if chunk is not None:
+                yield chunk
+
+    async def _request(self, path, data):
+        """
+        发送非流式请求，返回解析后的JSON响应
+        """
+        url = f"{self.base_url}{path}"
+        async with self.session.post(url, json=data) as response:
+            await self._raise_for_status(response)
+            return await response.json(content_type=None)
+
+    async def _prepare_chat(self, messages, model, stream, images, kwargs):
+        """
+        构造chat请求数据，图片在线程池中读取和编码，避免阻塞事件循环
+        """
+        if model is None:
+            model = self.default_model
+        data = {
+            "model": model,
+            "messages": messages,
+            "stream": stream,
+            **kwargs
+        }
+        if images:
+            loop = asyncio.get_running_loop()
+            encoded = await loop.run_in_executor(None, self.image_encoder.encode_many, images)
+            data["messages"] = _attach_images(messages, encoded)
+        return data
+
+    async def generate_stream(self, prompt, model=None, images=None, **kwargs):
+        """
+        以异步迭代器的形式流式生成文本响应
+
+        Args:
+            prompt (str): 提示文本
+            model (str, optional): 要使用的模型名称，如果为None则使用默认模型
+            images (list, optional): 图片文件路径列表，提供时改用chat API
+            **kwargs: 其他传递给Ollama API的参数
+
+        Yields:
+            StreamChunk: 数据块，最后一个数据块的done为True并携带统计信息
+        """
+        if images:
+            messages = [{"role": "user", "content": prompt}]
+            async for chunk in self.chat_stream(messages, model=model, images=images, **kwargs):
+                yield chunk
+            return
+
+        data = {
+            "model": model or self.default_model,
+            "prompt": prompt,
+            "stream": True,
+            **kwargs
+        }
+        async for chunk in self._stream("/api/generate", data):
+            yield StreamChunk.from_generate(chunk)
+
+    async def generate(self, prompt, model=None, stream=True, images=None, **kwargs):
+        """
+        生成文本响应
+
+        Args:
+            prompt (str): 提示文本
+            model (str, optional): 要使用的模型名称，如果为None则使用默认模型
+            stream (bool, optional): 是否让服务器流式返回，默认为True
+            images (list, optional): 图片文件路径列表，提供时改用chat API
+            **kwargs: 其他传递给Ollama API的参数
+
+        Returns:
+            str: 完整的响应文本
+        """
+        if images:
+            messages = [{"role": "user", "content": prompt}]
+            return await self.chat(messages, model=model, stream=stream, images=images, **kwargs)
+
+        if stream:
+            accumulator = ResponseAccumulator()
+            async for chunk in self.generate_stream(prompt, model=model, **kwargs):
+                accumulator.add(chunk)
+            return accumulator.text
+
+        data = {
+            "model": model or self.default_model,
+            "prompt": prompt,
+            "stream": False,
+            **kwargs
+        }
+        result = await self._request("/api/generate", data)
+        return result.get("response", "")
+
+    async def chat_stream(self, messages, model=None, images=None, **kwargs):
+        """
+        以异步迭代器的形式流式进行聊天
+
+        Args:
+            messages (list): 消息历史列表，每个消息包含role和content
+            model (str, optional): 要使用的模型名称，如果为None则使用默认模型
+            images (list, optional): 图像文件路径列表
+            **kwargs: 其他传递给Ollama API的参数
+
+        Yields:
+            StreamChunk: 数据块，最后一个数据块的done为True并携带统计信息
+        """
+        data = await self._prepare_chat(messages, model, True, images, kwargs)
+        async for chunk in self._stream("/api/chat", data):
+            yield StreamChunk.from_chat(chunk)
+
+    async def chat(self, messages, model=None, stream=True, images=None, **kwargs):
+        """
+        使用聊天模式与模型交互
+
+        Args:
+            messages (list): 消息历史列表，每个消息包含role和content
+            model (str, optional): 要使用的模型名称，如果为None则使用默认模型
+            stream (bool, optional): 是否让服务器流式返回，默认为True
+            images (list, optional): 图像文件路径列表
+            **kwargs: 其他传递给Ollama API的参数
+
+        Returns:
+            str: 最新的响应文本
+        """
+        if stream:
+            accumulator = ResponseAccumulator()
+            async for chunk in self.chat_stream(messages, model=model, images=images, **kwargs):
+                accumulator.add(chunk)
+            return accumulator.text
+
+        data = await self._prepare_chat(messages, model, False, images, kwargs)
+        result = await self._request("/api/chat", data)
+        return result.get("message", {}).get("content", "")
+
+    async def list_models(self):
+        """
+        列出可用的模型
+
+        Returns:
+            list: 模型列表
+        """
+        url = f"{self.base_url}/api/tags"
+        async with self.session.get(url) as response:
+            await self._raise_for_status(response)
+            data = await response.json(content_type=None)
+        return data.get("models", [])
+
+    def generate_many(self, prompts, concurrency=32, ordered=True, **kwargs):
+        """
+        并发地为多个提示生成响应
+
+        Args:
+            prompts (iterable): 提示迭代器或异步迭代器，每项可以是提示文本，
+                也可以是传给generate的参数字典，按需读取
+            concurrency (int): 同时执行的最大请求数
+            ordered (bool): 为True时按输入顺序返回结果，否则按完成顺序返回
+            **kwargs: 所有请求共用的generate参数，默认stream=False
+
+        Returns:
+            异步迭代器，产出BatchResult
+        """
+        kwargs.setdefault("stream", False)
+
+        async def call(item):
+            if isinstance(item, dict):
+                params = dict(kwargs)
+                params.update(item)
+                return await self.generate(**params)
+            return await self.generate(item, **kwargs)
+
+        return arun_many(call, prompts, concurrency=concurrency, ordered=ordered)
+
+    def chat_many(self, conversations, concurrency=32, ordered=True, **kwargs):
+        """
+        并发地执行多个聊天请求
+
+        Args:
+            conversations (iterable): 对话迭代器或异步迭代器，每项可以是消息列表，
+                也可以是传给chat的参数字典，按需读取
+            concurrency (int): 同时执行的最大请求数
+            ordered (bool): 为True时按输入顺序返回结果，否则按完成顺序返回
+            **kwargs: 所有请求共用的chat参数，默认stream=False
+
+        Returns:
+            异步迭代器，产出BatchResult
+        """
+        kwargs.setdefault("stream", False)
+
+        async def call(item):
+            if isinstance(item, dict):
+                params = dict(kwargs)
+                params.update(item)
+                return await self.chat(**params)
+            return await self.chat(item, **kwargs)
+
+        return arun_many(call, conversations, concurrency=concurrency, ordered=ordered)
@@ -0,0 +1,405 @@
+"""
+批量并发执行请求的工具函数，以及带检查点的JSONL批处理任务
+
+输入按需从迭代器中读取，同一时间只保留有限数量的请求在内存中，
+因此可以直接传入包含数百万条记录的生成器。
+"""
+
+import collections
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+# 输入迭代器耗尽的标记
+_END = object()
+
+
+class BatchResult:
+    """
+    批量请求中单个输入的执行结果
+
+    Attributes:
+        index (int): 输入在原始迭代器中的位置
+        input: 原始输入
+        output (str): 响应文本，失败时为None
+        error (Exception): 执行过程中出现的异常，成功时为None
+    """
+    __slots__ = ("index", "input", "output", "error")
+
+    def __init__(self, index, input, output=None, error=None):
+        self.index = index
+        self.input = input
+        self.output = output
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        if self.ok:
+            return f"BatchResult(index={self.index}, output={self.output!r})"
+        return f"BatchResult(index={self.index}, error={self.error!r})"
+
+
+def _call(func, index, item):
+    try:
+        return BatchResult(index, item, output=func(item))
+    except Exception as e:
+        return BatchResult(index, item, error=e)
+
+
+async def _acall(func, index, item):
+    try:
+        return BatchResult(index, item, output=await func(item))
+    except Exception as e:
+        return BatchResult(index, item, error=e)
+
+
+def run_many(func, items, concurrency=8, ordered=True, max_pending=None):
+    """
+    在线程池中并发地对每个输入调用func
+
+    Args:
+        func (callable): 处理单个输入的函数
+        items (iterable): 输入迭代器，按需读取
+        concurrency (int): 同时执行的最大请求数
+        ordered (bool): 为True时按输入顺序返回结果，否则按完成顺序返回
+        max_pending (int, optional): 已提交但尚未返回的最大请求数，默认为concurrency的两倍
+
+    Yields:
+        BatchResult: 每个输入的执行结果，单个输入失败不会中断整个批次
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency必须大于0")
+    max_pending = max(max_pending or concurrency * 2, concurrency)
+    source = enumerate(items)
+    pending = collections.deque() if ordered else set()
+
+    def fill(pool):
+        while len(pending) < max_pending:
+            try:
+                index, item = next(source)
+            except StopIteration:
+                return
+            future = pool.submit(_call, func, index, item)
+            if ordered:
+                pending.append(future)
+            else:
+                pending.add(future)
+
+    pool = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        fill(pool)
+        while pending:
+            if ordered:
+                yield pending.popleft().result()
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.discard(future)
+                    yield future.result()
+            fill(pool)
+    finally:
+        # 调用方提前停止迭代时，取消尚未开始执行的请求
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=True)
+
+
+async def arun_many(func, items, concurrency=8, ordered=True, max_pending=None):
+    """
+    在事件循环中并发地对每个输入调用协程函数func
+
+    Args:
+        func (callable): 处理单个输入的协程函数
+        items (iterable): 输入迭代器或异步迭代器，按需读取
+        concurrency (int): 同时执行的最大请求数
+        ordered (bool): 为True时按输入顺序返回结果，否则按完成顺序返回
+        max_pending (int, optional): 已创建但尚未返回的最大请求数，默认为concurrency的两倍
+
+    Yields:
+        BatchResult: 每个输入的执行结果，单个输入失败不会中断整个批次
+    """
+    # 只有异步客户端需要asyncio，在这里导入以免拖慢其他场景的启动
+    import asyncio
+
+    if concurrency < 1:
+        raise ValueError("concurrency必须大于0")
+    # 在途任务数决定内存占用，信号量决定真正同时发出的请求数
+    max_pending = max(max_pending or concurrency * 2, concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    pending = collections.deque() if ordered else set()
+    index = 0
+
+    async def limited(index, item):
+        async with semaphore:
+            return await _acall(func, index, item)
+
+    if hasattr(items, "__aiter__"):
+        source = items.__aiter__()
+
+        async def next_item():
+            try:
+                return await source.__anext__()
+            except StopAsyncIteration:
+                return _END
+    else:
+        source = iter(items)
+
+        async def next_item():
+            return next(source, _END)
+
+    async def fill():
+        nonlocal index
+        while len(pending) < max_pending:
+            item = await next_item()
+            if item is _END:
+                return
+            task = asyncio.ensure_future(limited(index, item))
+            index += 1
+            if ordered:
+                pending.append(task)
+            else:
+                pending.add(task)
+
+    try:
+        await fill()
+        while pending:
+            if ordered:
+                yield await pending.popleft()
+            else:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    pending.discard(task)
+                    yield task.result()
+            await fill()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def _truncate_partial_line(path, block_size=1 << 16):
+    """
+    截掉文件末尾没有换行符的不完整行：从文件末尾按块向前查找最后一个换行符，不会读取整个文件
+    """
+    with open(path, "r+b") as f:
+        size = f.seek(0, os.SEEK_END)
+        end = size
+        while end > 0:
+            start = max(end - block_size, 0)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+        if end < size:
+            f.truncate(end)
+
+
+class Checkpoint:
+    """
+    记录已完成请求ID的检查点文件
+
+    每完成一个请求就向文件追加一行JSON编码的ID，崩溃后重新加载即可跳过已完成的请求。
+    """
+    def __init__(self, path):
+        """
+        Args:
+            path (str): 检查点文件路径，不存在时会自动创建
+        """
+        self.path = path
+        self.completed = set()
+        if os.path.exists(path):
+            # 崩溃时写了一半的最后一行：截掉，否则下一个ID会接在它后面，两者合并成一个错误的ID
+            _truncate_partial_line(path)
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        try:
+                            self.completed.add(json.loads(line))
+                        except (json.JSONDecodeError, TypeError):
+                            continue
+        self._file = open(path, "a", encoding="utf-8")
+
+    def __contains__(self, request_id):
+        return request_id in self.completed
+
+    def __len__(self):
+        return len(self.completed)
+
+    def add(self, request_id):
+        """
+        记录一个已完成的请求ID
+        """
+        self.completed.add(request_id)
+        self._file.write(json.dumps(request_id, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def count_lines(path, buffer_size=1 << 20):
+    """
+    按块统计文件行数，不会把整个文件读入内存
+    """
+    count = 0
+    last = b"\n"
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(buffer_size)
+            if not block:
+                break
+            count += block.count(b"\n")
+            last = block[-1:]
+    return count if last == b"\n" else count + 1
+
+
+class InvalidRequest(ValueError):
+    """
+    请求文件中无法解析的一行
+    """
+
+
+def _read_requests(path, checkpoint, skipped):
+    """
+    逐行读取JSONL请求文件，跳过检查点中已完成的请求
+
+    无法解析的行和"id"为列表或对象的行以行号为ID产出InvalidRequest，由调用方记为失败，不会中断整个任务
+    """
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                yield line_number, InvalidRequest(f"第{line_number}行不是合法的JSON: {e}")
+                continue
+            if not isinstance(request, dict):
+                yield line_number, InvalidRequest(f"第{line_number}行不是JSON对象")
+                continue
+            request_id = request.get("id", line_number)
+            if isinstance(request_id, (list, dict)):
+                yield line_number, InvalidRequest(f"第{line_number}行的id必须是字符串或数字")
+                continue
+            if checkpoint is not None and request_id in checkpoint:
+                skipped[0] += 1
+                continue
+            yield request_id, request
+
+
+class BatchProgress:
+    """
+    批量任务的进度、吞吐量和预计剩余时间
+    """
+    def __init__(self, total=None):
+        self.total = total
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.started = time.monotonic()
+
+    def update(self, ok, skipped=0):
+        if ok:
+            self.completed += 1
+        else:
+            self.failed += 1
+        self.skipped = skipped
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def throughput(self):
+        """
+        本次运行中每秒完成的请求数
+        """
+        elapsed = self.elapsed
+        return (self.completed + self.failed) / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self):
+        """
+        预计剩余秒数，无法估计时返回None
+        """
+        if not self.total or not self.throughput:
+            return None
+        remaining = self.total - self.skipped - self.completed - self.failed
+        return max(remaining, 0) / self.throughput
+
+
+def run_jsonl(client, input_path, output_path, checkpoint_path=None, concurrency=8,
+              on_progress=None, **kwargs):
+    """
+    执行JSONL格式的批量请求文件，并在每个请求完成时把结果追加到输出文件
+
+    输入文件每行是一个JSON对象：包含"prompt"时调用generate，包含"messages"时调用chat，
+    "id"用于标识请求（缺省时使用行号），其余字段（如"model"、"options"）作为请求参数。
+    输出文件每行包含"id"以及"response"或"error"。失败的请求不会记入检查点，恢复时会重新执行；
+    无法解析的行（包括"id"为列表或对象的行）以行号为"id"记为失败，其余请求照常执行；
+    输出文件末尾崩溃时写了一半的行会在恢复时截掉。
+
+    结果先写入输出文件再记入检查点，因此输出是"至少一次"的：在两者之间崩溃时，恢复后
+    同一个"id"会再次执行并再写一行结果，读取输出时应按"id"去重（保留最后一行）。
+
+    Args:
+        client (OllamaClient): 客户端
+        input_path (str): 输入JSONL文件路径
+        output_path (str): 输出JSONL文件路径，以追加方式写入
+        checkpoint_path (str, optional): 检查点文件路径，默认为输出文件路径加上".ckpt"
+        concurrency (int): 同时执行的最大请求数
+        on_progress (callable, optional): 每完成一个请求调用一次，参数为BatchProgress
+        **kwargs: 所有请求共用的参数
+
+    Returns:
+        BatchProgress: 最终的进度统计
+    """
+    checkpoint = Checkpoint(checkpoint_path or output_path + ".ckpt")
+    kwargs["stream"] = False
+    skipped = [0]
+
+    def call(item):
+        request_id, request = item
+        if isinstance(request, InvalidRequest):
+            raise request
+        params = dict(kwargs)
+        params.update(request)
+        params.pop("id", None)
+        if "messages" in params:
+            return client.chat(**params)
+        return client.generate(**params)
+
+    progress = BatchProgress(total=count_lines(input_path))
+    client._ensure_pool_size(concurrency)
+    requests_iter = _read_requests(input_path, checkpoint, skipped)
+    if os.path.exists(output_path):
+        # 崩溃时写了一半的结果行：截掉，否则下一条结果会接在它后面，使输出文件无法解析
+        _truncate_partial_line(output_path)
+    try:
+        with open(output_path, "a", encoding="utf-8") as out:
+            for result in run_many(call, requests_iter, concurrency=concurrency, ordered=False):
+                request_id = result.input[0]
+                if result.ok:
+                    record = {"id": request_id, "response": result.output}
+                else:
+                    record = {"id": request_id, "error": str(result.error)}
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                # 在这里崩溃时结果已经写入但没有记入检查点，恢复后会重复执行（至少一次）
+                if result.ok:
+                    checkpoint.add(request_id)
+                progress.update(result.ok, skipped[0])
+                if on_progress is not None:
+                    on_progress(progress)
+    finally:
+        checkpoint.close()
+    progress.skipped = skipped[0]
+    return progress
@@ -0,0 +1,545 @@
+"""
+客户端基准测试：在本地模拟服务器上测量客户端自身的开销以及并发时的扩展性，
+以及命令行的启动时间和终端输出的开销
+
+模拟服务器运行在单独的进程中，因此测得的CPU时间只包括客户端。结果可以保存为JSON，
+并与之前版本的结果比较。
+"""
+
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import requests
+
+from ollama_toolkit import ndjson
+from ollama_toolkit.ollama_client import OllamaClient
+from ollama_toolkit.render import FrameRenderer
+
+# 导入时间的预算：导入这些模块时不应连带导入的重量级模块
+IMPORT_BUDGET = {
+    "ollama_toolkit.cli": ("requests", "urllib3", "numpy", "PIL", "asyncio", "http.server"),
+    "ollama_toolkit.ollama_client": ("numpy", "PIL", "asyncio", "http.server"),
+}
+
+# 需要模拟服务器的测试
+SERVER_BENCHMARKS = ("sync", "stream", "concurrency", "memory")
+
+ALL_BENCHMARKS = ("startup", "render", "decode") + SERVER_BENCHMARKS
+
+
+def start_server_process(**options):
+    """
+    在子进程中启动模拟服务器
+
+    Args:
+        **options: 传给fake_server命令行的参数，例如tokens_per_second=200
+
+    Returns:
+        tuple: (subprocess.Popen, 服务器URL)
+    """
+    command = [sys.executable, "-m", "ollama_toolkit.fake_server", "--port", "0"]
+    for name, value in options.items():
+        if value is not None:
+            command += ["--" + name.replace("_", "-"), str(value)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, universal_newlines=True)
+    url = process.stdout.readline().strip()
+    if not url:
+        process.kill()
+        raise RuntimeError("模拟服务器启动失败")
+    return process, url
+
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+def _ms(value):
+    return round(value * 1000, 3) if value is not None else None
+
+
+def bench_overhead(client, num_requests, stream):
+    """
+    在不限速的服务器上顺序执行请求，测量每个token的客户端CPU时间和请求延迟
+
+    Args:
+        client (OllamaClient): 指向不限速模拟服务器的客户端
+        num_requests (int): 请求数
+        stream (bool): 是否使用流式接口
+
+    Returns:
+        dict: 测量结果
+    """
+    client.generate("warm up", stream=stream)
+    with client.track() as records:
+        cpu = time.process_time()
+        wall = time.perf_counter()
+        for i in range(num_requests):
+            client.generate(f"request {i}", stream=stream)
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+    tokens = sum(record.eval_count or 0 for record in records)
+    durations = [record.duration for record in records]
+    result = {
+        "requests": num_requests,
+        "tokens": tokens,
+        "cpu_per_token_us": round(cpu / tokens * 1e6, 3) if tokens else None,
+        "cpu_per_request_us": round(cpu / num_requests * 1e6, 3),
+        "latency_p50_ms": _ms(_percentile(durations, 50)),
+        "latency_p95_ms": _ms(_percentile(durations, 95)),
+        "requests_per_second": round(num_requests / wall, 2),
+    }
+    if stream:
+        # 客户端测得的首个数据块延迟减去服务器报告的提示评估时间，即客户端和传输的开销
+        overhead = [record.ttft - (record.prompt_eval_duration or 0) for record in records if record.ttft is not None]
+        result["ttft_overhead_p50_ms"] = _ms(_percentile(overhead, 50))
+        result["ttft_overhead_p95_ms"] = _ms(_percentile(overhead, 95))
+    return result
+
+
+def bench_concurrency(client, concurrency, num_requests, tokens_per_second):
+    """
+    在限速的服务器上同时执行concurrency个流式请求，测量总吞吐量
+
+    Args:
+        client (OllamaClient): 指向限速模拟服务器的客户端
+        concurrency (int): 并发的流数
+        num_requests (int): 请求总数
+        tokens_per_second (float): 服务器上每个流的token速率，用于计算理想吞吐量
+
+    Returns:
+        dict: 测量结果
+    """
+    with client.track() as records:
+        cpu = time.process_time()
+        wall = time.perf_counter()
+        failed = 0
+        for result in client.generate_many((f"request {i}" for i in range(num_requests)),
+                                           concurrency=concurrency, stream=True):
+            if not result.ok:
+                failed += 1
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+    tokens = sum(record.eval_count or 0 for record in records)
+    throughput = tokens / wall
+    ideal = concurrency * tokens_per_second
+    ttfts = [record.ttft for record in records if record.ttft is not None]
+    return {
+        "concurrency": concurrency,
+        "requests": num_requests,
+        "failed": failed,
+        "tokens": tokens,
+        "elapsed_s": round(wall, 3),
+        "tokens_per_second": round(throughput, 1),
+        "ideal_tokens_per_second": ideal,
+        "efficiency": round(throughput / ideal, 3) if ideal else None,
+        "requests_per_second": round(num_requests / wall, 2),
+        "ttft_p50_ms": _ms(_percentile(ttfts, 50)),
+        "ttft_p95_ms": _ms(_percentile(ttfts, 95)),
+        "cpu_per_token_us": round(cpu / tokens * 1e6, 3) if tokens else None,
+    }
+
+
+def bench_memory(client, streams):
+    """
+    同时打开streams个流并各读取一个数据块，测量每个打开的流占用的Python内存
+
+    Args:
+        client (OllamaClient): 指向限速模拟服务器的客户端
+        streams (int): 同时打开的流数
+
+    Returns:
+        dict: 测量结果
+    """
+    client._ensure_pool_size(streams)
+    open_streams = []
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        for i in range(streams):
+            stream = client.generate_stream(f"stream {i}")
+            next(stream)
+            open_streams.append(stream)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        for stream in open_streams:
+            stream.close()
+    return {
+        "streams": streams,
+        "bytes_per_stream": (current - before) // streams,
+        "peak_bytes": peak - before,
+    }
+
+
+def _legacy_decode(response):
+    """
+    原来的解码循环：默认的512字节读取、requests按行切分、标准库json逐行解析
+    """
+    for line in response.iter_lines():
+        if line:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def _fake_response(payload):
+    response = requests.models.Response()
+    response.status_code = 200
+    response.raw = io.BytesIO(payload)
+    return response
+
+
+def bench_decode(tokens=50000, chunk_size=ndjson.READ_CHUNK_SIZE):
+    """
+    比较原来的解码循环和ndjson的解码路径解析同一段NDJSON流的CPU时间
+
+    Args:
+        tokens (int): 流中的数据块数
+        chunk_size (int): 新解码路径每次读取的字节数
+
+    Returns:
+        dict: 测量结果
+    """
+    lines = [json.dumps({"model": "qwen3", "created_at": "2024-01-01T00:00:00.000000Z",
+                         "response": f" token{i}", "done": False}) for i in range(tokens)]
+    lines.append(json.dumps({"model": "qwen3", "response": "", "done": True, "context": list(range(4096))}))
+    payload = ("\n".join(lines) + "\n").encode("utf-8")
+
+    def measure(decode):
+        best = None
+        for _ in range(3):
+            started = time.process_time()
+            count = sum(1 for _ in decode(_fake_response(payload)))
+            elapsed = time.process_time() - started
+            best = elapsed if best is None else min(best, elapsed)
+        if count != len(lines):
+            raise RuntimeError(f"解码得到{count}个数据块，应为{len(lines)}个")
+        return best
+
+    legacy = measure(_legacy_decode)
+    fast = measure(lambda response: ndjson.iter_ndjson(response.iter_content(chunk_size)))
+    return {
+        "tokens": len(lines),
+        "json_backend": "orjson" if ndjson.orjson is not None else "json",
+        "legacy_us_per_line": round(legacy / len(lines) * 1e6, 3),
+        "fast_us_per_line": round(fast / len(lines) * 1e6, 3),
+        "speedup": round(legacy / fast, 2) if fast else None,
+    }
+
+
+def _import_profile(module):
+    """
+    在新的解释器中导入module，返回(累计导入微秒数, 连带导入的超出预算的模块)
+    """
+    forbidden = IMPORT_BUDGET.get(module, ())
+    code = (f"import sys, json; import {module}; "
+            f"print(json.dumps([name for name in {list(forbidden)!r} if name in sys.modules]))")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    cumulative = None
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            cumulative = int(parts[1])
+    return cumulative, json.loads(result.stdout)
+
+
+def _wall_time(command, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def bench_startup(runs=5):
+    """
+    测量命令行的启动时间，并检查主要模块的导入是否超出IMPORT_BUDGET
+
+    Args:
+        runs (int): 每项测量的次数，取中位数
+
+    Returns:
+        dict: 测量结果，violations列出超出预算的导入
+    """
+    interpreter = _wall_time([sys.executable, "-c", "pass"], runs)
+    help_time = _wall_time([sys.executable, "-m", "ollama_toolkit.cli", "--help"], runs)
+    imports = {}
+    violations = []
+    for module in IMPORT_BUDGET:
+        samples = []
+        for _ in range(runs):
+            cumulative, loaded = _import_profile(module)
+            samples.append(cumulative)
+        imports[module] = round(statistics.median(samples) / 1000, 3)
+        violations.extend(f"{module} -> {name}" for name in loaded)
+    return {
+        "interpreter_ms": _ms(interpreter),
+        "help_ms": _ms(help_time),
+        "help_overhead_ms": _ms(help_time - interpreter),
+        "import_ms": imports,
+        "violations": violations,
+    }
+
+
+class _CountingStream:
+    """
+    丢弃写入内容并统计真正写到文件的次数的输出目标
+    """
+    def __init__(self):
+        self.file = open(os.devnull, "w")
+        self.flushes = 0
+
+    def write(self, text):
+        self.file.write(text)
+
+    def flush(self):
+        self.file.flush()
+        self.flushes += 1
+
+    def close(self):
+        self.file.close()
+
+
+def bench_render(tokens=20000, fps=30):
+    """
+    比较逐个token写入并刷新与FrameRenderer按帧合并写入的CPU时间和写入次数
+
+    Args:
+        tokens (int): 输出的token数（不限速地连续输出）
+        fps (float): FrameRenderer的帧率
+
+    Returns:
+        dict: 测量结果
+    """
+    texts = [f" token{i}" for i in range(tokens)]
+
+    def measure(make_sink):
+        stream = _CountingStream()
+        try:
+            sink, finish = make_sink(stream)
+            started = time.process_time()
+            for text in texts:
+                sink(text)
+            finish()
+            elapsed = time.process_time() - started
+        finally:
+            stream.close()
+        return elapsed, stream.flushes
+
+    def echo(stream):
+        def write(text):
+            stream.write(text)
+            stream.flush()
+        return write, lambda: None
+
+    def frames(stream):
+        renderer = FrameRenderer(stream, fps=fps)
+        return renderer.write, renderer.flush
+
+    legacy, legacy_writes = measure(echo)
+    framed, framed_writes = measure(frames)
+    return {
+        "tokens": tokens,
+        "fps": fps,
+        "per_token_us": round(legacy / tokens * 1e6, 3),
+        "per_token_writes": legacy_writes,
+        "framed_us": round(framed / tokens * 1e6, 3),
+        "framed_writes": framed_writes,
+        "speedup": round(legacy / framed, 2) if framed else None,
+    }
+
+
+def _version():
+    try:
+        from importlib import metadata
+        return metadata.version("ollama_toolkit")
+    except Exception:
+        return None
+
+
+def run_benchmarks(num_requests=200, num_tokens=64, tokens_per_second=200, concurrency=(1, 8, 32),
+                   streams=64, on_progress=None, only=None):
+    """
+    运行全部基准测试
+
+    Args:
+        num_requests (int): 每项测试的请求数
+        num_tokens (int): 每个响应的token数
+        tokens_per_second (float): 并发和内存测试中服务器上每个流的token速率
+        concurrency (tuple): 要测试的并发流数
+        streams (int): 内存测试中同时打开的流数
+        on_progress (callable, optional): 每项测试开始前以测试名称为参数调用的函数
+        only (iterable, optional): 只运行这些测试（ALL_BENCHMARKS中的名称），为None时全部运行
+
+    Returns:
+        dict: 可以JSON序列化的测试结果
+    """
+    progress = on_progress or (lambda name: None)
+    selected = set(only or ALL_BENCHMARKS)
+    unknown = selected - set(ALL_BENCHMARKS)
+    if unknown:
+        raise ValueError(f"未知的测试: {', '.join(sorted(unknown))}")
+    results = {}
+    if "startup" in selected:
+        progress("startup")
+        results["startup"] = bench_startup()
+    if "render" in selected:
+        progress("render")
+        results["render"] = bench_render()
+    if "decode" in selected:
+        progress("decode")
+        results["decode"] = bench_decode()
+    if selected.intersection(SERVER_BENCHMARKS):
+        _run_server_benchmarks(results, selected, progress, num_requests, num_tokens, tokens_per_second,
+                               concurrency, streams)
+
+    return {
+        "version": _version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "requests": num_requests,
+            "num_tokens": num_tokens,
+            "tokens_per_second": tokens_per_second,
+            "concurrency": list(concurrency),
+            "streams": streams,
+        },
+        "results": results,
+    }
+
+
+def _run_server_benchmarks(results, selected, progress, num_requests, num_tokens, tokens_per_second,
+                           concurrency, streams):
+    fast_process, fast_url = start_server_process(num_tokens=num_tokens)
+    paced_process, paced_url = start_server_process(num_tokens=num_tokens, tokens_per_second=tokens_per_second)
+    fast = OllamaClient(base_url=fast_url)
+    paced = OllamaClient(base_url=paced_url)
+    try:
+        for stream, name in ((False, "sync"), (True, "stream")):
+            if name in selected:
+                progress(name)
+                results[name] = bench_overhead(fast, num_requests, stream=stream)
+        if "concurrency" in selected:
+            results["concurrency"] = []
+            for level in concurrency:
+                progress(f"concurrency={level}")
+                results["concurrency"].append(
+                    bench_concurrency(paced, level, max(num_requests, level * 2), tokens_per_second)
+                )
+        if "memory" in selected:
+            progress("memory")
+            results["memory"] = bench_memory(paced, streams)
+    finally:
+        fast.close()
+        paced.close()
+        for process in (fast_process, paced_process):
+            process.terminate()
+            process.wait()
+
+
+def _flatten(results, prefix=""):
+    flat = {}
+    if isinstance(results, dict):
+        for key, value in results.items():
+            flat.update(_flatten(value, f"{prefix}{key}."))
+    elif isinstance(results, list):
+        for item in results:
+            # 并发测试以并发数作为键，便于不同配置之间对应
+            label = item.get("concurrency", "") if isinstance(item, dict) else ""
+            flat.update(_flatten(item, f"{prefix}{label}."))
+    elif isinstance(results, (int, float)) and not isinstance(results, bool):
+        flat[prefix[:-1]] = results
+    return flat
+
+
+def compare(current, baseline):
+    """
+    比较两次测试结果中相同的数值指标
+
+    Args:
+        current (dict): 本次结果（run_benchmarks的返回值）
+        baseline (dict): 之前保存的结果
+
+    Returns:
+        list: (指标名称, 之前的值, 本次的值, 相对变化)元组的列表，相对变化在之前的值为0时为None
+    """
+    old = _flatten(baseline.get("results", {}))
+    new = _flatten(current.get("results", {}))
+    rows = []
+    for name, value in new.items():
+        if name in old:
+            change = (value - old[name]) / old[name] if old[name] else None
+            rows.append((name, old[name], value, change))
+    return rows
+
+
+def format_results(report):
+    """
+    把测试结果格式化为便于阅读的文本
+    """
+    results = report["results"]
+    lines = []
+    if "startup" in results:
+        startup = results["startup"]
+        imports = "  ".join(f"{module} {ms}ms" for module, ms in startup["import_ms"].items())
+        lines.append(f"启动     --help {startup['help_ms']}ms（解释器本身{startup['interpreter_ms']}ms）  导入 {imports}")
+        for violation in startup["violations"]:
+            lines.append(f"         超出导入预算: {violation}")
+    if "render" in results:
+        render = results["render"]
+        lines.append(f"终端输出 逐个token {render['per_token_us']}us/token（写入{render['per_token_writes']}次）  "
+                     f"按帧合并 {render['framed_us']}us/token（写入{render['framed_writes']}次，{render['speedup']}倍）")
+    for name in ("sync", "stream"):
+        if name not in results:
+            continue
+        r = results[name]
+        line = (f"{name:<8} CPU/token {r['cpu_per_token_us']}us  CPU/请求 {r['cpu_per_request_us']}us  "
+                f"延迟 p50 {r['latency_p50_ms']}ms p95 {r['latency_p95_ms']}ms  {r['requests_per_second']} 请求/秒")
+        if "ttft_overhead_p50_ms" in r:
+            line += f"  TTFT开销 p50 {r['ttft_overhead_p50_ms']}ms p95 {r['ttft_overhead_p95_ms']}ms"
+        lines.append(line)
+    for r in results.get("concurrency", []):
+        lines.append(
+            f"并发{r['concurrency']:<5} {r['tokens_per_second']} token/秒（理想值{r['ideal_tokens_per_second']}，"
+            f"效率{r['efficiency']}）  TTFT p50 {r['ttft_p50_ms']}ms p95 {r['ttft_p95_ms']}ms  "
+            f"CPU/token {r['cpu_per_token_us']}us  失败{r['failed']}"
+        )
+    if "decode" in results:
+        decode = results["decode"]
+        lines.append(f"解码     原来的循环 {decode['legacy_us_per_line']}us/行  新的解码路径 {decode['fast_us_per_line']}us/行"
+                     f"（{decode['json_backend']}，{decode['speedup']}倍）")
+    if "memory" in results:
+        memory = results["memory"]
+        lines.append(f"内存     每个打开的流 {memory['bytes_per_stream']} 字节（同时打开{memory['streams']}个）")
+    return "\n".join(lines)
+
+
+def save_results(report, path):
+    """
+    把测试结果保存为JSON文件
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def load_results(path):
+    """
+    读取之前保存的测试结果
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,312 @@
+"""
+确定性请求的响应缓存：内存LRU层加上基于SQLite的持久层
+
+缓存键是请求体的规范化哈希（图片数据替换为其摘要），"stream"、"keep_alive"等不影响
+生成结果的字段不参与计算，因此流式和非流式请求共享同一条缓存。
+"""
+
+import collections
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from ollama_toolkit.streaming import StreamChunk
+
+# 不影响生成结果、不参与缓存键计算的字段
+IGNORED_FIELDS = ("stream", "keep_alive")
+
+
+def _image_digest(image):
+    return "sha256:" + hashlib.sha256(image.encode("utf-8")).hexdigest()
+
+
+def request_key(path, data):
+    """
+    计算请求的缓存键
+
+    Args:
+        path (str): API路径，例如"/api/generate"
+        data (dict): 请求数据
+
+    Returns:
+        str: 请求体规范化JSON的sha256摘要
+    """
+    body = {key: value for key, value in data.items() if key not in IGNORED_FIELDS}
+    if body.get("images"):
+        body["images"] = [_image_digest(image) for image in body["images"]]
+    if body.get("messages"):
+        messages = []
+        for message in body["messages"]:
+            if message.get("images"):
+                message = dict(message)
+                message["images"] = [_image_digest(image) for image in message["images"]]
+            messages.append(message)
+        body["messages"] = messages
+    canonical = json.dumps([path, body], sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def is_deterministic(data):
+    """
+    判断请求是否是确定性的（temperature为0或指定了固定的seed）
+    """
+    options = data.get("options") or {}
+    return options.get("temperature") == 0 or options.get("seed") is not None
+
+
+class MemoryCache:
+    """
+    线程安全的内存LRU缓存
+    """
+    def __init__(self, max_entries=1024):
+        """
+        Args:
+            max_entries (int): 最多保存的条目数
+        """
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, ttl=None):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            created, value = item
+            if ttl is not None and time.time() - created > ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value, created=None):
+        with self._lock:
+            self._entries[key] = (created if created is not None else time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SqliteCache:
+    """
+    基于SQLite的持久缓存，按总大小淘汰最久未访问的条目
+
+    设置ttl时，过期条目在打开时以及每写入purge_every次后批量删除，不会一直占用空间直到被淘汰。
+    """
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, ttl=None, purge_every=256):
+        """
+        Args:
+            path (str): 数据库文件路径
+            max_bytes (int): 缓存内容的最大总字节数
+            ttl (float, optional): 条目的有效期（秒），为None时不主动删除过期条目
+            purge_every (int): 每写入多少次删除一次过期条目
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (created)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if ttl is not None:
+            self.purge_expired(ttl)
+
+    def get(self, key, ttl=None):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created = row
+            now = time.time()
+            if ttl is not None and now - created > ttl:
+                self._delete(key)
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return json.loads(value), created
+
+    def put(self, key, value, created=None):
+        encoded = json.dumps(value, ensure_ascii=False)
+        size = len(encoded.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self._delete(key)
+            self._conn.execute(
+                "INSERT INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, encoded, size, created if created is not None else now, now)
+            )
+            self._size += size
+            self._evict()
+            self._writes += 1
+            if self.ttl is not None and self._writes % self.purge_every == 0:
+                self._purge(self.ttl)
+            self._conn.commit()
+
+    def _delete(self, key):
+        row = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._size -= row[0]
+
+    def _evict(self):
+        while self._size > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY accessed LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._size -= size
+                if self._size <= self.max_bytes:
+                    break
+
+    def purge_expired(self, ttl):
+        """
+        删除超过ttl秒的条目
+
+        Returns:
+            int: 删除的条目数
+        """
+        with self._lock:
+            purged = self._purge(ttl)
+            self._conn.commit()
+            return purged
+
+    def _purge(self, ttl):
+        cutoff = time.time() - ttl
+        purged = self._conn.execute("DELETE FROM responses WHERE created < ?", (cutoff,)).rowcount
+        if purged:
+            self._size = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()[0]
+        return purged
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._size = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """
+    两级响应缓存：先查内存LRU，未命中时再查持久层并回填内存
+
+    每条缓存保存完整的响应文本和最后一个数据块（包含统计信息），命中时以
+    "文本数据块 + 结束数据块"的形式重放，流式调用方的行为与未命中时一致。
+
+    用法:
+        cache = ResponseCache(path="responses.db", ttl=7 * 24 * 3600)
+        client = OllamaClient(cache=cache)
+        client.generate("...", options={"temperature": 0})
+    """
+    def __init__(self, path=None, max_entries=1024, max_bytes=256 * 1024 * 1024, ttl=None,
+                 deterministic_only=True):
+        """
+        Args:
+            path (str, optional): SQLite数据库文件路径，为None时只使用内存缓存
+            max_entries (int): 内存缓存最多保存的条目数
+            max_bytes (int): 持久缓存的最大总字节数
+            ttl (float, optional): 缓存有效期（秒），为None时永不过期
+            deterministic_only (bool): 为True时只缓存确定性的请求（temperature为0或指定了seed）
+        """
+        self.memory = MemoryCache(max_entries)
+        self.store = SqliteCache(path, max_bytes, ttl) if path else None
+        self.ttl = ttl
+        self.deterministic_only = deterministic_only
+        self.hits = 0
+        self.misses = 0
+
+    def key_for(self, path, data):
+        """
+        返回请求的缓存键，请求不可缓存时返回None
+        """
+        if self.deterministic_only and not is_deterministic(data):
+            return None
+        return request_key(path, data)
+
+    def get(self, key):
+        """
+        查找缓存
+
+        Returns:
+            dict: 包含"text"和"final"的缓存条目，未命中时返回None
+        """
+        value = self.memory.get(key, self.ttl)
+        if value is None and self.store is not None:
+            row = self.store.get(key, self.ttl)
+            if row is not None:
+                value, created = row
+                self.memory.put(key, value, created)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key, text, final):
+        """
+        保存一次完整的响应
+
+        Args:
+            key (str): 缓存键
+            text (str): 完整的响应文本
+            final (dict): 最后一个数据块的原始数据
+        """
+        final = dict(final or {})
+        # 文本已单独保存，去掉非流式响应中重复的文本
+        if "response" in final:
+            final["response"] = ""
+        if isinstance(final.get("message"), dict):
+            final["message"] = dict(final["message"], content="")
+        value = {"text": text, "final": final}
+        created = time.time()
+        self.memory.put(key, value, created)
+        if self.store is not None:
+            self.store.put(key, value, created)
+
+    def replay(self, value):
+        """
+        把缓存条目重放为数据块序列
+        """
+        if value["text"]:
+            yield StreamChunk(value["text"], False, {})
+        final = dict(value["final"] or {})
+        final["cached"] = True
+        yield StreamChunk("", True, final)
+
+    def clear(self):
+        self.memory.clear()
+        if self.store is not None:
+            self.store.clear()
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
@@ -0,0 +1,295 @@
+"""
+模型目录：缓存/api/tags和/api/show的结果，建立模型能力（视觉、嵌入、工具调用等）、
+上下文长度和参数规模的索引，供自动选择模型和限制输入长度使用
+"""
+
+import os
+import re
+import threading
+import time
+
+import requests
+
+COMPLETION = "completion"
+VISION = "vision"
+EMBEDDING = "embedding"
+TOOLS = "tools"
+THINKING = "thinking"
+
+_SIZE_UNITS = {"K": 1e-6, "M": 1e-3, "B": 1.0, "T": 1e3}
+
+# 请求和Modelfile都没有设置num_ctx时Ollama服务器使用的上下文长度；服务器设置了
+# OLLAMA_CONTEXT_LENGTH时以它为准（客户端与服务器在同一环境中运行时可以直接读取）
+DEFAULT_NUM_CTX = 4096
+
+
+def default_num_ctx():
+    """
+    服务器默认的上下文长度：环境变量OLLAMA_CONTEXT_LENGTH，否则为DEFAULT_NUM_CTX
+    """
+    try:
+        return int(os.environ["OLLAMA_CONTEXT_LENGTH"])
+    except (KeyError, ValueError):
+        return DEFAULT_NUM_CTX
+
+
+def _parse_num_ctx(parameters):
+    """
+    从/api/show返回的parameters文本中读取num_ctx
+    """
+    match = re.search(r"^\s*num_ctx\s+(\d+)", parameters or "", re.MULTILINE)
+    return int(match.group(1)) if match else None
+
+
+def _infer_capabilities(details, model_info, show):
+    """
+    较旧的Ollama版本不返回capabilities字段，根据模型结构推断
+    """
+    families = set(details.get("families") or []) | {details.get("family")}
+    if any("bert" in (family or "") for family in families):
+        return frozenset([EMBEDDING])
+    capabilities = {COMPLETION}
+    if show.get("projector_info") or "clip" in families or any(".vision." in key for key in model_info):
+        capabilities.add(VISION)
+    return frozenset(capabilities)
+
+
+class ModelInfo:
+    """
+    一个本地模型的信息
+
+    Attributes:
+        name (str): 模型名称，例如"qwen3:latest"
+        digest (str): 模型摘要，模型被重新拉取后会变化
+        size (int): 模型文件大小（字节）
+        family (str): 模型系列
+        parameter_size (str): 参数规模，例如"8.2B"
+        quantization (str): 量化方式，例如"Q4_K_M"
+        capabilities (frozenset): 模型能力，例如{"completion", "vision"}
+        context_length (int): 模型支持的最大上下文长度
+        num_ctx (int): Modelfile中设置的上下文长度（如果有）
+        embedding_length (int): 隐藏层/嵌入向量的维度
+    """
+    def __init__(self, entry, show):
+        details = show.get("details") or entry.get("details") or {}
+        model_info = show.get("model_info") or {}
+        architecture = model_info.get("general.architecture") or details.get("family")
+        self.name = entry.get("name") or entry.get("model")
+        self.digest = entry.get("digest")
+        self.size = entry.get("size")
+        self.family = details.get("family")
+        self.parameter_size = details.get("parameter_size")
+        self.quantization = details.get("quantization_level")
+        self.context_length = model_info.get(f"{architecture}.context_length")
+        self.embedding_length = model_info.get(f"{architecture}.embedding_length")
+        self.num_ctx = _parse_num_ctx(show.get("parameters"))
+        if show.get("capabilities"):
+            self.capabilities = frozenset(show["capabilities"])
+        else:
+            self.capabilities = _infer_capabilities(details, model_info, show)
+
+    def supports(self, capability):
+        return capability in self.capabilities
+
+    @property
+    def parameters(self):
+        """
+        以十亿为单位的参数规模，无法解析时为None
+        """
+        match = re.match(r"^\s*([\d.]+)\s*([KMBT])", self.parameter_size or "", re.IGNORECASE)
+        if not match:
+            return None
+        return float(match.group(1)) * _SIZE_UNITS[match.group(2).upper()]
+
+    @property
+    def context_window(self):
+        """
+        没有在请求中设置num_ctx时服务器实际使用的上下文长度，见window()
+        """
+        return self.window()
+
+    def window(self, options=None, default=None):
+        """
+        服务器实际使用的上下文长度：请求options中的num_ctx，其次是Modelfile中的num_ctx，
+        最后是服务器的默认值；模型支持的最大长度context_length只作为上限
+
+        Args:
+            options (dict, optional): 请求的options
+            default (int, optional): 服务器默认的上下文长度，为None时使用default_num_ctx()
+
+        Returns:
+            int: 上下文长度
+        """
+        window = (options or {}).get("num_ctx") or self.num_ctx or default or default_num_ctx()
+        if self.context_length:
+            window = min(window, self.context_length)
+        return window
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "digest": self.digest,
+            "size": self.size,
+            "family": self.family,
+            "parameter_size": self.parameter_size,
+            "quantization": self.quantization,
+            "capabilities": sorted(self.capabilities),
+            "context_length": self.context_length,
+            "num_ctx": self.num_ctx,
+            "embedding_length": self.embedding_length,
+        }
+
+    def __repr__(self):
+        return f"ModelInfo({self.name!r}, capabilities={sorted(self.capabilities)}, context={self.context_window})"
+
+
+class ModelCatalog:
+    """
+    模型目录
+
+    /api/tags的结果在ttl秒内直接使用缓存；刷新后只对新增或摘要发生变化（重新拉取）的模型
+    重新请求/api/show，其余模型的详细信息继续沿用。
+
+    用法:
+        client.catalog.find("vision")              # 所有支持图片的模型
+        client.catalog.info("qwen3").context_length
+        client.catalog.refresh()                   # 拉取或删除模型后立即刷新
+    """
+    def __init__(self, client, ttl=60.0, server_num_ctx=None):
+        """
+        Args:
+            client (OllamaClient): 客户端
+            ttl (float): 模型列表的缓存秒数，为0时每次都重新请求
+            server_num_ctx (int, optional): 服务器默认的上下文长度，为None时使用default_num_ctx()
+        """
+        self.client = client
+        self.ttl = ttl
+        self.server_num_ctx = server_num_ctx
+        self._models = None
+        self._fetched_at = 0.0
+        self._infos = {}
+        self._lock = threading.RLock()
+
+    def models(self, refresh=False):
+        """
+        模型列表（/api/tags返回的原始数据）
+
+        Args:
+            refresh (bool): 是否忽略缓存重新请求
+
+        Returns:
+            list: 模型列表
+        """
+        with self._lock:
+            expired = time.monotonic() - self._fetched_at >= self.ttl
+            if refresh or self._models is None or expired:
+                response = self.client._request("GET", "/api/tags")
+                self._models = response.json().get("models", [])
+                self._fetched_at = time.monotonic()
+                # 只保留摘要没有变化的模型的详细信息
+                digests = {entry.get("name"): entry.get("digest") for entry in self._models}
+                self._infos = {
+                    name: info for name, info in self._infos.items() if digests.get(name) == info.digest
+                }
+            return list(self._models)
+
+    def refresh(self):
+        """
+        立即重新请求模型列表
+        """
+        return self.models(refresh=True)
+
+    def invalidate(self):
+        """
+        使缓存失效，下次使用时重新请求
+        """
+        with self._lock:
+            self._models = None
+
+    def _entry(self, name):
+        for entry in self.models():
+            if name in (entry.get("name"), entry.get("model")):
+                return entry
+        if ":" not in name:
+            return self._entry(name + ":latest")
+        return None
+
+    def info(self, name):
+        """
+        模型的详细信息，第一次使用时请求/api/show
+
+        Args:
+            name (str): 模型名称，省略标签时视为":latest"
+
+        Returns:
+            ModelInfo: 模型信息，模型不存在时为None
+        """
+        with self._lock:
+            entry = self._entry(name)
+            if entry is None:
+                return None
+            info = self._infos.get(entry.get("name"))
+            if info is None:
+                show = self.client._request("POST", "/api/show", {"model": entry.get("name")}).json()
+                info = self._infos[entry.get("name")] = ModelInfo(entry, show)
+            return info
+
+    def find(self, capability=None, min_context=None):
+        """
+        查找满足条件的模型，按/api/tags的顺序返回
+
+        Args:
+            capability (str, optional): 所需的能力，例如"vision"、"embedding"、"tools"
+            min_context (int, optional): 最小上下文长度
+
+        Returns:
+            list: ModelInfo列表
+        """
+        found = []
+        for entry in self.models():
+            try:
+                info = self.info(entry.get("name"))
+            except requests.exceptions.HTTPError:
+                # 个别模型的信息无法读取（例如文件损坏）时跳过
+                continue
+            if info is None:
+                continue
+            if capability is not None and not info.supports(capability):
+                continue
+            if min_context is not None and info.window(default=self.server_num_ctx) < min_context:
+                continue
+            found.append(info)
+        return found
+
+    def route(self, model, capability):
+        """
+        为需要某种能力的请求选择模型：model具备该能力时直接使用，否则使用第一个具备该能力的模型
+
+        Args:
+            model (str): 首选的模型
+            capability (str): 所需的能力
+
+        Returns:
+            str: 选中的模型，没有模型具备该能力时返回model
+        """
+        info = self.info(model)
+        if info is not None and info.supports(capability):
+            return model
+        candidates = self.find(capability)
+        return candidates[0].name if candidates else model
+
+    def context_window(self, model, options=None):
+        """
+        请求实际可用的上下文长度：请求options中的num_ctx优先，其次是Modelfile中的num_ctx，
+        最后是服务器的默认值，均不超过模型支持的最大长度
+
+        Returns:
+            int: 上下文长度，无法读取模型信息时为None
+        """
+        try:
+            info = self.info(model)
+        except requests.exceptions.RequestException:
+            info = None
+        if info is None:
+            return (options or {}).get("num_ctx") or None
+        return info.window(options, self.server_num_ctx)
@@ -2,34 +2,107 @@
 # -*- coding: utf-8 -*-
 
 import argparse
+import json
 import sys
-from ollama_toolkit.ollama_client import OllamaClient
 
+# 模块级只导入标准库中的轻量模块：客户端（以及requests）在解析完参数、确实需要发送请求时才导入，
+# 使--help等简单命令可以快速启动；导入时间的预算见bench.IMPORT_BUDGET
 
-def main():
+
+def parse_url(value):
+    """
+    解析--url参数，逗号分隔的多个URL表示多个节点
+    """
+    urls = [url.strip() for url in value.split(',') if url.strip()]
+    return urls if len(urls) > 1 else value
+
+
+def parse_keep_alive(value):
+    """
+    解析--keep-alive参数，纯数字表示秒数（-1表示一直保持）
+    """
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def add_timeout_argument(parser):
+    """
+    添加--timeout参数
+    """
+    parser.add_argument('--timeout', type=float,
+                        help='等待响应数据的最长秒数，0表示不限制；未指定时流式响应两次收到数据之间最多等待300秒，非流式请求不限制')
+
+
+def timeout_options(args):
+    """
+    根据--timeout参数得到创建客户端的timeout参数，未指定时为空，使用客户端的默认超时
+    """
+    from ollama_toolkit.ollama_client import DEFAULT_TIMEOUT
+    
+    if args.timeout is None:
+        return {}
+    return {"timeout": (DEFAULT_TIMEOUT[0], args.timeout or None)}
+
+
+def main(argv=None):
     """
     命令行入口函数
     """
-    parser = argparse.ArgumentParser(description='Ollama模型调用工具')
+    if argv is None:
+        argv = sys.argv[1:]
+    
+    # 子命令
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
+    
+    parser = argparse.ArgumentParser(
+        description='Ollama模型调用工具',
+        epilog='子命令: ' + ', '.join(sorted(COMMANDS)) + '（使用"ollama-tool 子命令 --help"查看帮助）'
+    )
     
     # 基本参数
     parser.add_argument('prompt', type=str, nargs='?', help='提示文本')
     parser.add_argument('--model', '-m', type=str, help='要使用的模型名称')
-    parser.add_argument('--url', '-u', type=str, default='http://localhost:11434', help='Ollama API的URL')
+    parser.add_argument('--url', '-u', type=str, default='http://localhost:11434', help='Ollama API的URL，逗号分隔的多个URL表示在多个节点之间路由请求')
     parser.add_argument('--no-stream', action='store_true', help='禁用流式输出')
+    add_timeout_argument(parser)
     
     # 文件上传参数
     parser.add_argument('--image', '-i', type=str, action='append', help='要上传的图片文件路径，可以多次使用')
-    parser.add_argument('--file', '-f', type=str, action='append', help='要上传的其他文件路径，可以多次使用')
+    parser.add_argument('--file', '-f', type=str, action='append', help='要上传的文本文件路径，可以多次使用，内容过大时自动分块处理')
     
     # 其他操作
     parser.add_argument('--list-models', action='store_true', help='列出可用的模型')
     parser.add_argument('--chat', action='store_true', help='使用聊天模式')
+    parser.add_argument('--keep-alive', type=str,
+                        help='交互模式中模型在两次请求之间保持加载的时间，例如30m，-1表示一直保持')
+    parser.add_argument('--history-tokens', type=int, default=4096,
+                        help='交互聊天模式中对话历史的token预算，超出时较早的对话会被总结为摘要')
+    parser.add_argument('--session', '-s', type=str,
+                        help='使用持久化的命名会话（隐含--chat），退出后再次使用同一名称即可继续对话')
+    parser.add_argument('--sessions-dir', type=str, help='保存会话的目录，默认为~/.ollama_toolkit/sessions')
+    parser.add_argument('--fps', type=float, default=30,
+                        help='终端输出的最高刷新次数（每秒），同一帧内到达的token合并为一次写入，0表示逐个token输出')
     
-    args = parser.parse_args()
+    # 结构化输出
+    parser.add_argument('--schema', type=str,
+                        help='按JSON Schema文件生成结构化输出（"json"表示只要求输出JSON），违反Schema时中断生成')
+    parser.add_argument('--depth', type=int, default=0,
+                        help='与--schema一起使用：路径长度为depth的值（例如顶层数组的元素）一旦完整就输出为一行JSON')
+    
+    args = parser.parse_args(argv)
+    if args.session:
+        args.chat = True
+    
+    from ollama_toolkit.ollama_client import OllamaClient
+    from ollama_toolkit.render import FrameRenderer
     
     # 创建客户端
-    client = OllamaClient(base_url=args.url, default_model=args.model or "qwen3")
+    client = OllamaClient(base_url=parse_url(args.url), default_model=args.model or "qwen3", **timeout_options(args))
     
     # 列出模型
     if args.list_models:
@@ -46,33 +119,55 @@ def main():
     if not args.prompt:
         # 如果没有提供提示文本且不是列出模型，则进入交互模式
         interactive_mode(client, args)
+    elif args.schema:
+        return structured_request(client, args)
     else:
         # 执行单次请求
+        renderer = FrameRenderer(sys.stdout, fps=args.fps)
         if args.chat:
             # 聊天模式
             messages = [{"role": "user", "content": args.prompt}]
-            client.chat(messages, model=args.model, stream=not args.no_stream)
+            history = open_session(args) if args.session else None
+            try:
+                client.chat(messages, model=args.model, stream=not args.no_stream, sink=renderer, history=history)
+            finally:
+                if history is not None:
+                    history.close()
         else:
             # 生成模式
+            if args.image:
+                print(f"检测到图片，使用{args.model or client.default_model}模型进行图像分析...")
+                print("提示：分析图片可能需要较多系统资源，这是正常的")
             client.generate(
                 args.prompt,
                 model=args.model,
                 stream=not args.no_stream,
                 images=args.image,
-                files=args.file
+                files=args.file,
+                sink=renderer
             )
+        renderer.flush()
+        print()  # 输出换行
 
 
 def interactive_mode(client, args):
     """
     交互模式，允许用户持续输入提示
     """
+    from ollama_toolkit.memory import ConversationMemory
+    from ollama_toolkit.render import FrameRenderer
+    from ollama_toolkit.session import GenerateSession
+    
+    renderer = FrameRenderer(sys.stdout, fps=args.fps)
     print(f"进入Ollama交互模式（模型: {client.default_model}, URL: {client.base_url}）")
     print("输入'quit'或'exit'退出，输入'!models'列出可用模型")
     
     if args.chat:
-        # 聊天模式，保存对话历史
-        messages = []
+        # 聊天模式，保存有上限的对话历史；使用命名会话时每轮对话追加到会话日志中
+        log = open_session(args) if args.session else None
+        memory = ConversationMemory(client, max_tokens=args.history_tokens, log=log)
+        if log is not None:
+            print(f"会话: {args.session}（已有{len(log)}条消息，恢复了最近{len(memory.messages)}条），输入'!clear'清空会话")
         
         while True:
             try:
@@ -88,23 +183,29 @@ def interactive_mode(client, args):
                     else:
                         print("\n没有找到可用的模型")
                     continue
+                if prompt.lower() == '!clear':
+                    memory.clear()
+                    print("已清空对话")
+                    continue
                 
-                # 添加用户消息到历史
-                messages.append({"role": "user", "content": prompt})
-                
-                # 调用模型
+                # 调用模型，用户消息和AI响应都会加入对话历史
                 print("\nAI:", end="", flush=True)
-                response = client.chat(messages, stream=not args.no_stream)
-                
-                # 添加AI响应到历史
-                messages.append({"role": "assistant", "content": response})
+                memory.chat(prompt, stream=not args.no_stream, sink=renderer)
+                renderer.flush()
+                print()  # 输出换行
             except KeyboardInterrupt:
+                renderer.flush()
                 print("\n中断输入")
                 break
             except EOFError:
                 break
+        memory.close()
+        if log is not None:
+            log.close()
     else:
-        # 生成模式，不保存对话历史
+        # 生成模式，复用服务器返回的context，后续提示不必重新评估之前的内容
+        session = GenerateSession(client, keep_alive=parse_keep_alive(args.keep_alive))
+        print("输入'!reset'清除上下文，输入'!stats'查看上下文复用统计")
         while True:
             try:
                 prompt = input("\n> ")
@@ -119,14 +220,459 @@ def interactive_mode(client, args):
                     else:
                         print("\n没有找到可用的模型")
                     continue
+                if prompt.lower() == '!reset':
+                    session.reset()
+                    print("已清除上下文")
+                    continue
+                if prompt.lower() == '!stats':
+                    for key, value in session.stats.items():
+                        print(f"{key}: {value}")
+                    continue
                 
-                client.generate(prompt, stream=not args.no_stream)
+                session.generate(prompt, stream=not args.no_stream, sink=renderer)
+                renderer.flush()
+                print()  # 输出换行
             except KeyboardInterrupt:
+                renderer.flush()
                 print("\n中断输入")
                 break
             except EOFError:
                 break
 
 
+def open_session(args):
+    """
+    打开--session指定的会话
+    """
+    from ollama_toolkit.history import SessionStore
+    
+    return SessionStore(args.sessions_dir).open(args.session, max_tokens=args.history_tokens)
+
+
+def structured_request(client, args):
+    """
+    按--schema执行单次结构化输出请求，值一旦完整就以JSON行的形式输出
+    """
+    from ollama_toolkit.structured import StructuredOutputError
+    
+    schema = "json"
+    if args.schema != "json":
+        with open(args.schema, encoding="utf-8") as f:
+            schema = json.load(f)
+    if args.chat:
+        messages = [{"role": "user", "content": args.prompt}]
+        events = client.chat_structured(messages, schema, model=args.model, images=args.image, depth=args.depth)
+    else:
+        events = client.generate_structured(args.prompt, schema, model=args.model, images=args.image,
+                                            files=args.file, depth=args.depth)
+    try:
+        for path, value in events:
+            if len(path) == args.depth:
+                print(json.dumps(value, ensure_ascii=False), flush=True)
+    except StructuredOutputError as e:
+        print(f"结构化输出无效，已中断生成: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def format_duration(seconds):
+    """
+    将秒数格式化为H:MM:SS
+    """
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def batch_command(argv):
+    """
+    批处理子命令：并发执行JSONL请求文件，结果追加写入输出文件，支持中断后恢复
+    """
+    parser = argparse.ArgumentParser(
+        prog='ollama-tool batch',
+        description='并发执行JSONL请求文件（每行包含prompt或messages，可选id、model、options等字段）'
+    )
+    parser.add_argument('input', type=str, help='输入JSONL文件路径')
+    parser.add_argument('output', type=str, help='输出JSONL文件路径（追加写入）')
+    parser.add_argument('--model', '-m', type=str, help='默认使用的模型名称')
+    parser.add_argument('--url', '-u', type=str, default='http://localhost:11434', help='Ollama API的URL，逗号分隔的多个URL表示在多个节点之间路由请求')
+    parser.add_argument('--concurrency', '-c', type=int, default=8, help='同时执行的最大请求数')
+    parser.add_argument('--checkpoint', type=str, help='检查点文件路径，默认为输出文件路径加上.ckpt')
+    parser.add_argument('--per-model', type=int, help='按模型分组发送请求，每个模型同时发往服务器的最大请求数（应小于--concurrency）')
+    parser.add_argument('--max-wait', type=float, default=30.0, help='按模型分组时请求的最长等待秒数')
+    parser.add_argument('--quiet', '-q', action='store_true', help='不显示进度')
+    add_timeout_argument(parser)
+    args = parser.parse_args(argv)
+    
+    from ollama_toolkit.batch import run_jsonl
+    from ollama_toolkit.ollama_client import OllamaClient
+    
+    scheduler = None
+    if args.per_model:
+        from ollama_toolkit.affinity import ModelScheduler
+        scheduler = ModelScheduler(per_model=args.per_model, max_wait=args.max_wait)
+    client = OllamaClient(base_url=parse_url(args.url), default_model=args.model or "qwen3", scheduler=scheduler,
+                          **timeout_options(args))
+    last_report = [0.0]
+    
+    def report(progress, force=False):
+        # 每秒最多刷新一次进度
+        if args.quiet or (not force and progress.elapsed - last_report[0] < 1.0):
+            return
+        last_report[0] = progress.elapsed
+        done = progress.skipped + progress.completed + progress.failed
+        total = progress.total if progress.total is not None else '?'
+        eta = progress.eta
+        sys.stderr.write(
+            f"\r已完成 {done}/{total}（失败 {progress.failed}，跳过 {progress.skipped}）"
+            f" {progress.throughput:.2f} 请求/秒"
+            f" 已用时 {format_duration(progress.elapsed)}"
+            f" 剩余 {format_duration(eta) if eta is not None else '?'}"
+        )
+        sys.stderr.flush()
+    
+    try:
+        progress = run_jsonl(
+            client,
+            args.input,
+            args.output,
+            checkpoint_path=args.checkpoint,
+            concurrency=args.concurrency,
+            on_progress=report
+        )
+    except KeyboardInterrupt:
+        print("\n已中断，重新运行相同的命令即可从检查点继续", file=sys.stderr)
+        return 130
+    report(progress, force=True)
+    if not args.quiet:
+        sys.stderr.write("\n")
+        if scheduler is not None:
+            stats = scheduler.stats
+            sys.stderr.write(f"模型切换 {stats['switches']} 次（避免了 {stats['avoided_switches']} 次）\n")
+    return 1 if progress.failed else 0
+
+
+def bench_command(argv):
+    """
+    基准测试子命令：在本地模拟服务器上测量客户端的开销和并发扩展性
+    """
+    parser = argparse.ArgumentParser(
+        prog='ollama-tool bench',
+        description='在本地模拟服务器上测量客户端的CPU开销、并发吞吐量、每个流的内存和TTFT开销'
+    )
+    parser.add_argument('--requests', '-n', dest='num_requests', type=int, default=200, help='每项测试的请求数')
+    parser.add_argument('--num-tokens', type=int, default=64, help='每个响应的token数')
+    parser.add_argument('--tokens-per-second', type=float, default=200, help='并发测试中模拟服务器上每个流的token速率')
+    parser.add_argument('--concurrency', '-c', type=str, default='1,8,32', help='要测试的并发流数，逗号分隔')
+    parser.add_argument('--streams', type=int, default=64, help='内存测试中同时打开的流数')
+    parser.add_argument('--output', '-o', type=str, help='把结果保存为JSON文件')
+    parser.add_argument('--baseline', '-b', type=str, help='与之前保存的JSON结果比较')
+    parser.add_argument('--only', type=str,
+                        help='只运行指定的测试，逗号分隔：startup、render、decode、sync、stream、concurrency、memory')
+    args = parser.parse_args(argv)
+    
+    from ollama_toolkit import bench
+    
+    def report(name):
+        sys.stderr.write(f"正在测试 {name} ...\n")
+        sys.stderr.flush()
+    
+    results = bench.run_benchmarks(
+        num_requests=args.num_requests,
+        num_tokens=args.num_tokens,
+        tokens_per_second=args.tokens_per_second,
+        concurrency=[int(level) for level in args.concurrency.split(',') if level.strip()],
+        streams=args.streams,
+        on_progress=report,
+        only=[name.strip() for name in args.only.split(',') if name.strip()] if args.only else None
+    )
+    print(bench.format_results(results))
+    
+    if args.baseline:
+        print(f"\n与{args.baseline}比较:")
+        for name, old, new, change in bench.compare(results, bench.load_results(args.baseline)):
+            change = f"{change:+.1%}" if change is not None else "-"
+            print(f"  {name:<40} {old:>12} -> {new:<12} {change}")
+    if args.output:
+        bench.save_results(results, args.output)
+        print(f"\n结果已保存到 {args.output}")
+    # 导入超出预算时返回非零值，便于在CI中检查
+    return 1 if results["results"].get("startup", {}).get("violations") else 0
+
+
+def serve_command(argv):
+    """
+    网关子命令：提供与Ollama兼容的HTTP API，合并相同的并发请求并按优先级排队转发
+    """
+    parser = argparse.ArgumentParser(
+        prog='ollama-tool serve',
+        description='本地网关：合并相同的并发请求，按优先级和调用方配额排队后转发到Ollama'
+    )
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', '-p', type=int, default=11435, help='监听端口')
+    parser.add_argument('--url', '-u', type=str, default='http://localhost:11434', help='上游Ollama API的URL，逗号分隔的多个URL表示在多个节点之间路由请求')
+    parser.add_argument('--max-concurrency', '-c', type=int, default=8, help='同时发往上游的最大请求数')
+    parser.add_argument('--per-client', type=int, help='每个调用方（X-Client-Id请求头或IP地址）同时占用的最大并发数')
+    parser.add_argument('--quota', action='append', default=[], metavar='CLIENT=N', help='为某个调用方单独设置并发配额，可以多次指定')
+    parser.add_argument('--no-coalesce', action='store_true', help='不合并相同的并发请求')
+    parser.add_argument('--warm-up', action='append', default=[], metavar='MODEL', help='启动前预热的模型，可以多次指定')
+    parser.add_argument('--keep-alive', type=str, help='与--warm-up一起使用：模型保持加载的时间，例如30m，-1表示一直保持')
+    add_timeout_argument(parser)
+    args = parser.parse_args(argv)
+    
+    from ollama_toolkit.gateway import Gateway
+    from ollama_toolkit.ollama_client import OllamaClient
+    
+    quotas = {}
+    for item in args.quota:
+        client_id, _, limit = item.rpartition('=')
+        if not client_id or not limit.isdigit():
+            parser.error(f"无效的配额: {item}，格式应为CLIENT=N")
+        quotas[client_id] = int(limit)
+    
+    client = OllamaClient(base_url=parse_url(args.url), **timeout_options(args))
+    client._ensure_pool_size(args.max_concurrency)
+    if args.warm_up:
+        print(f"正在预热: {', '.join(args.warm_up)}", file=sys.stderr)
+        for result in client.warm_up(args.warm_up, keep_alive=parse_keep_alive(args.keep_alive)):
+            if not result.ok:
+                url, model = result.input
+                print(f"预热失败: {model} @ {url} - {result.error}", file=sys.stderr)
+    gateway = Gateway(
+        client,
+        max_concurrency=args.max_concurrency,
+        per_client=args.per_client,
+        quotas=quotas,
+        coalesce=not args.no_coalesce
+    )
+    server = gateway.serve(args.host, args.port)
+    print(f"网关已启动: http://{args.host}:{args.port} -> {args.url}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        client.close()
+    return 0
+
+
+def format_bytes(size):
+    """
+    将字节数格式化为便于阅读的形式
+    """
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def report_results(results, describe):
+    """
+    逐行输出每个(节点URL, 模型)的执行结果，返回退出码
+    """
+    failed = 0
+    for result in results:
+        url, model = result.input
+        if result.ok:
+            print(f"{model} @ {url}: {describe(result.output)}")
+        else:
+            failed += 1
+            print(f"{model} @ {url}: 失败 - {result.error}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def model_command_parser(name, description, models_help, models_required=True):
+    """
+    模型管理子命令共用的参数
+    """
+    parser = argparse.ArgumentParser(prog=f'ollama-tool {name}', description=description)
+    parser.add_argument('models', type=str, nargs='+' if models_required else '*', help=models_help)
+    parser.add_argument('--url', '-u', type=str, default='http://localhost:11434', help='Ollama API的URL，逗号分隔的多个URL表示对每个节点执行')
+    add_timeout_argument(parser)
+    return parser
+
+
+def preload_command(argv):
+    """
+    预加载子命令：把模型加载到内存中并设置保持加载的时间
+    """
+    parser = model_command_parser('preload', '把模型加载到（每个节点的）内存中', '要加载的模型名称')
+    parser.add_argument('--keep-alive', type=str, help='模型保持加载的时间，例如30m，-1表示一直保持')
+    args = parser.parse_args(argv)
+    
+    from ollama_toolkit.ollama_client import OllamaClient
+    
+    client = OllamaClient(base_url=parse_url(args.url), **timeout_options(args))
+    results = client.preload(args.models, keep_alive=parse_keep_alive(args.keep_alive))
+    return report_results(results, lambda seconds: f"已加载（{seconds:.2f}秒）")
+
+
+def unload_command(argv):
+    """
+    卸载子命令：立即从内存中卸载模型
+    """
+    parser = model_command_parser('unload', '立即从（每个节点的）内存中卸载模型', '要卸载的模型名称，省略时卸载所有已加载的模型',
+                                  models_required=False)
+    args = parser.parse_args(argv)
+    
+    from ollama_toolkit.ollama_client import OllamaClient
+    
+    client = OllamaClient(base_url=parse_url(args.url), **timeout_options(args))
+    results = client.unload(args.models or None)
+    if not results:
+        print("没有已加载的模型")
+    return report_results(results, lambda output: "已卸载")
+
+
+def warmup_command(argv):
+    """
+    预热子命令：在服务启动时加载模型并执行一次只生成一个token的请求
+    """
+    parser = model_command_parser('warmup', '加载模型并执行一次只生成一个token的请求，使第一个真实请求不再承担冷启动的开销',
+                                  '要预热的模型名称，省略时为qwen3', models_required=False)
+    parser.add_argument('--keep-alive', type=str, help='模型保持加载的时间，例如30m，-1表示一直保持')
+    parser.add_argument('--prompt', type=str, default='hi', help='预热请求的提示文本')
+    args = parser.parse_args(argv)
+    
+    from ollama_toolkit.ollama_client import OllamaClient
+    
+    client = OllamaClient(base_url=parse_url(args.url), **timeout_options(args))
+    results = client.warm_up(args.models or None, keep_alive=parse_keep_alive(args.keep_alive), prompt=args.prompt)
+    return report_results(
+        results,
+        lambda output: f"加载 {output['load']:.2f}秒，预热请求 {output['first_token']:.2f}秒"
+    )
+
+
+def pull_command(argv):
+    """
+    拉取子命令：并发拉取多个模型，显示汇总进度，中断后重新运行即可继续
+    """
+    parser = model_command_parser('pull', '并发拉取多个模型（在每个节点上），连接中断时自动从断点继续', '要拉取的模型名称')
+    parser.add_argument('--concurrency', '-c', type=int, default=3, help='同时拉取的最大模型数')
+    parser.add_argument('--update', action='store_true', help='已经存在的模型也检查更新（默认跳过）')
+    parser.add_argument('--insecure', action='store_true', help='允许不安全的仓库连接')
+    parser.add_argument('--quiet', '-q', action='store_true', help='不显示进度')
+    args = parser.parse_args(argv)
+    
+    from ollama_toolkit.ollama_client import OllamaClient
+    
+    client = OllamaClient(base_url=parse_url(args.url), **timeout_options(args))
+    last_report = [0.0]
+    latest = []
+    
+    def report(progress, force=False):
+        # 每秒最多刷新两次进度
+        latest[:] = [progress]
+        if args.quiet or (not force and progress.elapsed - last_report[0] < 0.5):
+            return
+        last_report[0] = progress.elapsed
+        eta = progress.eta
+        sys.stderr.write(
+            f"\r已完成 {progress.finished}/{progress.count}（失败 {progress.failed}）"
+            f" {format_bytes(progress.completed)}/{format_bytes(progress.total)}"
+            f" {format_bytes(progress.rate)}/秒"
+            f" 剩余 {format_duration(eta) if eta is not None else '?'}   "
+        )
+        sys.stderr.flush()
+    
+    try:
+        results = client.pull_many(
+            args.models,
+            concurrency=args.concurrency,
+            on_progress=report,
+            skip_existing=not args.update,
+            insecure=args.insecure
+        )
+    except KeyboardInterrupt:
+        print("\n已中断，重新运行相同的命令即可继续拉取", file=sys.stderr)
+        return 130
+    if latest:
+        report(latest[0], force=True)
+    if not args.quiet:
+        sys.stderr.write("\n")
+    return report_results(results, lambda output: "已存在" if output == "exists" else "拉取完成")
+
+
+def ps_command(argv):
+    """
+    列出（每个节点上）已加载到内存中的模型
+    """
+    parser = argparse.ArgumentParser(prog='ollama-tool ps', description='列出（每个节点上）已加载到内存中的模型')
+    parser.add_argument('--url', '-u', type=str, default='http://localhost:11434', help='Ollama API的URL，逗号分隔的多个URL表示列出每个节点')
+    add_timeout_argument(parser)
+    args = parser.parse_args(argv)
+    
+    from ollama_toolkit.ollama_client import OllamaClient
+    
+    client = OllamaClient(base_url=parse_url(args.url), **timeout_options(args))
+    status = 0
+    for url, models in client.running_models().items():
+        print(f"{url}:")
+        if isinstance(models, Exception):
+            print(f"  无法访问 - {models}")
+            status = 1
+            continue
+        if not models:
+            print("  （没有已加载的模型）")
+        for model in models:
+            print(f"  - {model.get('name')}  显存 {format_bytes(model.get('size_vram') or 0)}"
+                  f"  到期 {model.get('expires_at', '?')}")
+    return status
+
+
+def sessions_command(argv):
+    """
+    会话子命令：列出、查看或删除持久化的聊天会话
+    """
+    parser = argparse.ArgumentParser(prog='ollama-tool sessions', description='列出、查看或删除持久化的聊天会话')
+    parser.add_argument('--dir', type=str, help='保存会话的目录，默认为~/.ollama_toolkit/sessions')
+    parser.add_argument('--show', type=str, metavar='NAME', help='显示会话的最近消息')
+    parser.add_argument('--last', type=int, default=10, help='与--show一起使用：显示的消息条数')
+    parser.add_argument('--delete', type=str, metavar='NAME', help='删除会话')
+    args = parser.parse_args(argv)
+    
+    import time
+    
+    from ollama_toolkit.history import SessionStore
+    
+    store = SessionStore(args.dir)
+    for name in (args.show, args.delete):
+        if name is not None and not store.exists(name):
+            print(f"会话不存在: {name}", file=sys.stderr)
+            return 1
+    if args.delete:
+        store.delete(args.delete)
+        print(f"已删除会话: {args.delete}")
+        return 0
+    if args.show:
+        with store.open(args.show) as log:
+            for message in log.read(max(len(log) - args.last, 0)):
+                print(f"{message.get('role')}: {message.get('content', '')}\n")
+        return 0
+    sessions = store.sessions()
+    if not sessions:
+        print("没有保存的会话")
+    for session in sessions:
+        updated = time.strftime("%Y-%m-%d %H:%M", time.localtime(session["updated"]))
+        print(f"{session['name']}  {session['messages']}条消息  {format_bytes(session['bytes'])}  {updated}")
+    return 0
+
+
+# 子命令名称到处理函数的映射
+COMMANDS = {
+    'batch': batch_command,
+    'bench': bench_command,
+    'preload': preload_command,
+    'ps': ps_command,
+    'pull': pull_command,
+    'serve': serve_command,
+    'sessions': sessions_command,
+    'unload': unload_command,
+    'warmup': warmup_command,
+}
+
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,257 @@
+"""
+本地向量索引与检索
+
+向量以连续的float32矩阵保存（预先归一化，余弦相似度即为点积），可以持久化到目录中并以
+内存映射方式打开；追加数据时只需在文件末尾写入新行，无需重写整个索引。
+"""
+
+import json
+import os
+
+try:
+    import numpy as np
+except ImportError:  # numpy是可选依赖: pip install ollama_toolkit[vector]
+    np = None
+
+# 默认的嵌入模型
+EMBED_MODEL = "nomic-embed-text"
+
+RETRIEVAL_TEMPLATE = "以下是与用户问题可能相关的参考资料，请在回答时参考：\n\n{passages}"
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class VectorIndex:
+    """
+    基于NumPy的本地向量索引，支持增量追加和向量化的余弦相似度top-k检索
+
+    用法:
+        index = VectorIndex(path="docs_index")          # path为None时只保存在内存中
+        index.add(client.embed(texts), payloads=texts)
+        for score, i, text in index.search(client.embed(["问题"])[0], k=3):
+            ...
+    """
+    VECTORS_FILE = "vectors.f32"
+    PAYLOADS_FILE = "payloads.jsonl"
+    META_FILE = "meta.json"
+
+    def __init__(self, path=None, dim=None):
+        """
+        Args:
+            path (str, optional): 索引目录，已存在时以内存映射方式打开，为None时只保存在内存中
+            dim (int, optional): 向量维度，为None时由第一次添加的向量决定
+        """
+        if np is None:
+            raise ImportError("VectorIndex需要numpy，请先安装: pip install numpy")
+        self.path = path
+        self.dim = dim
+        self.payloads = []
+        self._vectors = None
+        self._size = 0
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            meta_path = os.path.join(path, self.META_FILE)
+            if os.path.exists(meta_path):
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    self.dim = json.load(f)["dim"]
+                self._repair()
+                self._map()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def vectors(self):
+        """
+        已归一化的向量矩阵（形状为(len(self), dim)）
+        """
+        if self._vectors is None:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return self._vectors[:self._size]
+
+    def _repair(self):
+        """
+        加载附加数据，并把两个文件截断到都完整写入的行数
+
+        向量和附加数据分两次写入，崩溃时两者的行数可能不一致（或者留下写了一半的行）；
+        如果只在内存中忽略多出的部分，之后追加的数据会写在多出的部分之后，两个文件从此错位。
+        """
+        vectors_path = os.path.join(self.path, self.VECTORS_FILE)
+        payloads_path = os.path.join(self.path, self.PAYLOADS_FILE)
+        row_bytes = 4 * self.dim
+        vector_rows = os.path.getsize(vectors_path) // row_bytes if os.path.exists(vectors_path) else 0
+        data = b""
+        if os.path.exists(payloads_path):
+            with open(payloads_path, "rb") as f:
+                data = f.read()
+        # 每一行附加数据的结束位置（只包括以换行符结尾的完整行）
+        ends = []
+        position = data.find(b"\n")
+        while position >= 0:
+            ends.append(position + 1)
+            position = data.find(b"\n", position + 1)
+        rows = min(vector_rows, len(ends))
+        payloads_end = ends[rows - 1] if rows else 0
+        self.payloads = [json.loads(line) for line in data[:payloads_end].splitlines()]
+        if os.path.exists(vectors_path) and os.path.getsize(vectors_path) > rows * row_bytes:
+            os.truncate(vectors_path, rows * row_bytes)
+        if len(data) > payloads_end:
+            os.truncate(payloads_path, payloads_end)
+
+    def _map(self):
+        """
+        以只读内存映射方式打开磁盘上的向量文件
+        """
+        vectors_path = os.path.join(self.path, self.VECTORS_FILE)
+        rows = os.path.getsize(vectors_path) // (4 * self.dim) if os.path.exists(vectors_path) else 0
+        # 以完整写入的行为准，忽略崩溃时写了一半的数据
+        rows = min(rows, len(self.payloads))
+        self._size = rows
+        self._vectors = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim)) \
+            if rows else None
+
+    def add(self, vectors, payloads=None):
+        """
+        追加向量
+
+        Args:
+            vectors (array-like): 形状为(n, dim)的向量
+            payloads (list, optional): 与向量一一对应的附加数据（必须可以JSON序列化），例如原文
+
+        Returns:
+            range: 新向量在索引中的位置
+        """
+        vectors = _normalize(vectors)
+        count = vectors.shape[0]
+        if payloads is None:
+            payloads = [None] * count
+        payloads = list(payloads)
+        if len(payloads) != count:
+            raise ValueError("payloads的数量必须与向量数量一致")
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"向量维度不一致: 期望{self.dim}，实际{vectors.shape[1]}")
+
+        start = self._size
+        if self.path is not None:
+            self._append_to_disk(vectors, payloads)
+        else:
+            self._append_in_memory(vectors)
+            self.payloads.extend(payloads)
+        return range(start, start + count)
+
+    def _append_in_memory(self, vectors):
+        count = vectors.shape[0]
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        if self._size + count > capacity:
+            # 容量按倍数增长，追加的均摊复杂度为O(1)
+            new_capacity = max(self._size + count, capacity * 2, 64)
+            grown = np.empty((new_capacity, self.dim), dtype=np.float32)
+            if self._size:
+                grown[:self._size] = self._vectors[:self._size]
+            self._vectors = grown
+        self._vectors[self._size:self._size + count] = vectors
+        self._size += count
+
+    def _append_to_disk(self, vectors, payloads):
+        meta_path = os.path.join(self.path, self.META_FILE)
+        if not os.path.exists(meta_path):
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump({"dim": self.dim}, f)
+        with open(os.path.join(self.path, self.VECTORS_FILE), "ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        with open(os.path.join(self.path, self.PAYLOADS_FILE), "a", encoding="utf-8") as f:
+            for payload in payloads:
+                f.write(json.dumps(payload, ensure_ascii=False) + "\n")
+        self.payloads.extend(payloads)
+        self._map()
+
+    def search(self, query, k=5):
+        """
+        检索与query最相似的k个向量
+
+        Args:
+            query (array-like): 查询向量
+            k (int): 返回的结果数
+
+        Returns:
+            list: (相似度, 位置, 附加数据)元组的列表，按相似度从高到低排序
+        """
+        return self.search_many([query], k)[0]
+
+    def search_many(self, queries, k=5):
+        """
+        批量检索，一次矩阵乘法计算所有查询的相似度
+
+        Args:
+            queries (array-like): 形状为(m, dim)的查询向量
+            k (int): 每个查询返回的结果数
+
+        Returns:
+            list: 每个查询对应一个结果列表，格式同search
+        """
+        queries = _normalize(queries)
+        if not self._size:
+            return [[] for _ in range(queries.shape[0])]
+        scores = queries @ self.vectors.T
+        k = min(k, self._size)
+        if k < self._size:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(self._size), (queries.shape[0], 1))
+        results = []
+        for row, candidates in zip(scores, top):
+            order = candidates[np.argsort(-row[candidates])]
+            results.append([(float(row[i]), int(i), self.payloads[i]) for i in order])
+        return results
+
+
+class Retriever:
+    """
+    把问题嵌入后在向量索引中检索相关段落，可直接作为chat的retrieve参数
+
+    用法:
+        client.chat(messages, retrieve=Retriever(client, index, k=4))
+    """
+    def __init__(self, client, index, k=4, model=EMBED_MODEL, min_score=None):
+        """
+        Args:
+            client (OllamaClient): 用于计算嵌入的客户端
+            index (VectorIndex): 向量索引，附加数据应为段落文本
+            k (int): 检索的段落数
+            model (str): 嵌入模型名称
+            min_score (float, optional): 相似度下限，低于该值的段落会被忽略
+        """
+        self.client = client
+        self.index = index
+        self.k = k
+        self.model = model
+        self.min_score = min_score
+
+    def __call__(self, query):
+        """
+        Returns:
+            list: 相关段落文本的列表
+        """
+        vector = self.client.embed([query], model=self.model)[0]
+        return [
+            payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+            for score, _, payload in self.index.search(vector, self.k)
+            if self.min_score is None or score >= self.min_score
+        ]
+
+
+def retrieval_message(passages):
+    """
+    把检索到的段落组织为一条system消息
+    """
+    numbered = "\n\n".join(f"[{i}] {passage}" for i, passage in enumerate(passages, 1))
+    return {"role": "system", "content": RETRIEVAL_TEMPLATE.format(passages=numbered)}
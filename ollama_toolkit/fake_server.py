@@ -0,0 +1,291 @@
+"""
+本地的Ollama模拟服务器，用于基准测试和离线调试客户端
+
+支持/api/generate、/api/chat、/api/tags、/api/ps、/api/show和/api/embed，可以配置首个token前的延迟、
+每秒产出的token数、响应长度以及按比例注入的错误。
+
+用法:
+    with FakeOllamaServer(tokens_per_second=100, latency=0.2) as server:
+        client = OllamaClient(base_url=server.url)
+
+    # 也可以作为独立进程运行
+    python -m ollama_toolkit.fake_server --port 11500 --tokens-per-second 50
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOllamaServer:
+    """
+    在后台线程中运行的Ollama模拟服务器
+    """
+    def __init__(self, host="127.0.0.1", port=0, tokens_per_second=None, latency=0.0, num_tokens=32,
+                 token=" token", error_rate=0.0, error_status=500, embedding_dim=384,
+                 models=("qwen3", "nomic-embed-text"), seed=None):
+        """
+        Args:
+            host (str): 监听地址
+            port (int): 监听端口，为0时由系统分配
+            tokens_per_second (float, optional): 每个流每秒产出的token数，为None时不限速
+            latency (float): 产出第一个token前的延迟秒数（模拟提示评估）
+            num_tokens (int): 每个响应的token数，请求中的options.num_predict优先
+            token (str): 每个token的文本
+            error_rate (float): 以该比例随机返回错误
+            error_status (int): 注入错误时的HTTP状态码
+            embedding_dim (int): /api/embed返回的向量维度
+            models (tuple): /api/tags列出的模型
+            seed (int, optional): 错误注入的随机种子
+        """
+        self.tokens_per_second = tokens_per_second
+        self.latency = latency
+        self.num_tokens = num_tokens
+        self.token = token
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.embedding_dim = embedding_dim
+        self.models = tuple(models)
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _make_handler(self))
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """
+        在后台线程中开始处理请求
+
+        Returns:
+            FakeOllamaServer: 自身，便于链式调用
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._server.serve_forever, name="fake-ollama", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        停止服务器
+        """
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _should_fail(self):
+        with self._lock:
+            self.requests += 1
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.errors += 1
+                return True
+            return False
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 客户端提前断开（例如取消流式请求）属于正常情况
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def _make_handler(server):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # 响应头和响应体分开写入，避免Nagle算法与延迟确认叠加造成约40ms的延迟
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, obj, status=200):
+            body = json.dumps(obj).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _write_chunk(self, obj):
+            line = json.dumps(obj).encode("utf-8") + b"\n"
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+            self.wfile.flush()
+
+        def do_GET(self):
+            if self.path == "/api/tags":
+                self._send_json({"models": [{"name": name, "model": name} for name in server.models]})
+            elif self.path == "/api/ps":
+                self._send_json({"models": [{"name": server.models[0], "model": server.models[0]}]})
+            elif self.path in ("/", "/api/version"):
+                self._send_json({"version": "0.0.0-fake"})
+            else:
+                self._send_json({"error": "not found"}, 404)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._send_json({"error": "invalid JSON"}, 400)
+                return
+            if self.path == "/api/show":
+                self._show(body)
+                return
+            if self.path not in ("/api/generate", "/api/chat", "/api/embed"):
+                self._send_json({"error": "not found"}, 404)
+                return
+            if server._should_fail():
+                self._send_json({"error": "injected failure: model runner has unexpectedly stopped"},
+                                server.error_status)
+                return
+            if self.path == "/api/embed":
+                self._embed(body)
+            else:
+                self._complete(body)
+
+        def _show(self, body):
+            name = body.get("model") or body.get("name")
+            if name not in server.models:
+                self._send_json({"error": f"model '{name}' not found"}, 404)
+                return
+            embedding = "embed" in name
+            self._send_json({
+                "details": {"family": "bert" if embedding else "llama", "parameter_size": "8B"},
+                "model_info": {
+                    "general.architecture": "fake",
+                    "fake.context_length": 8192,
+                    "fake.embedding_length": server.embedding_dim,
+                },
+                "capabilities": ["embedding"] if embedding else ["completion"],
+            })
+
+        def _embed(self, body):
+            inputs = body.get("input", [])
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            embeddings = []
+            for text in inputs:
+                rng = random.Random(text)
+                embeddings.append([rng.uniform(-1, 1) for _ in range(server.embedding_dim)])
+            self._send_json({"model": body.get("model"), "embeddings": embeddings})
+
+        def _complete(self, body):
+            started = time.perf_counter()
+            chat = self.path == "/api/chat"
+            model = body.get("model", server.models[0])
+            count = (body.get("options") or {}).get("num_predict") or server.num_tokens
+            interval = 1.0 / server.tokens_per_second if server.tokens_per_second else 0.0
+
+            def piece(text, done=False):
+                chunk = {"model": model, "created_at": "1970-01-01T00:00:00Z", "done": done}
+                if chat:
+                    chunk["message"] = {"role": "assistant", "content": text}
+                else:
+                    chunk["response"] = text
+                return chunk
+
+            def final(text, eval_started):
+                now = time.perf_counter()
+                chunk = piece(text, done=True)
+                chunk.update({
+                    "done_reason": "stop",
+                    "total_duration": int((now - started) * 1e9),
+                    "load_duration": 0,
+                    "prompt_eval_count": len(json.dumps(body.get("messages") or body.get("prompt", ""))) // 4,
+                    "prompt_eval_duration": int((eval_started - started) * 1e9),
+                    "eval_count": count,
+                    "eval_duration": int((now - eval_started) * 1e9),
+                })
+                if not chat:
+                    chunk["context"] = list(range(count))
+                return chunk
+
+            if server.latency:
+                time.sleep(server.latency)
+            eval_started = time.perf_counter()
+
+            if not body.get("stream", True):
+                if interval:
+                    time.sleep(interval * count)
+                self._send_json(final(server.token * count, eval_started))
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                deadline = time.perf_counter()
+                for _ in range(count):
+                    if interval:
+                        # 按绝对时间排期，避免sleep误差累积
+                        deadline += interval
+                        delay = deadline - time.perf_counter()
+                        if delay > 0:
+                            time.sleep(delay)
+                    self._write_chunk(piece(server.token))
+                self._write_chunk(final("", eval_started))
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+            except ConnectionError:
+                # 客户端提前断开
+                self.close_connection = True
+
+    return Handler
+
+
+def main(argv=None):
+    """
+    以独立进程运行模拟服务器，启动后在标准输出打印URL
+    """
+    parser = argparse.ArgumentParser(prog='python -m ollama_toolkit.fake_server', description='Ollama模拟服务器')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=11500, help='监听端口，0表示由系统分配')
+    parser.add_argument('--tokens-per-second', type=float, help='每个流每秒产出的token数，默认不限速')
+    parser.add_argument('--latency', type=float, default=0.0, help='产出第一个token前的延迟秒数')
+    parser.add_argument('--num-tokens', type=int, default=32, help='每个响应的token数')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='随机返回错误的比例')
+    parser.add_argument('--error-status', type=int, default=500, help='注入错误时的HTTP状态码')
+    args = parser.parse_args(argv)
+
+    server = FakeOllamaServer(
+        host=args.host,
+        port=args.port,
+        tokens_per_second=args.tokens_per_second,
+        latency=args.latency,
+        num_tokens=args.num_tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+    )
+    print(server.url, flush=True)
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,314 @@
+"""
+文件输入：流式分块读取大文件，并以map-reduce的方式并发处理
+
+小文件直接内联到提示中；超过单次上下文预算的文件会被切分为多个块，
+每个块并发地交给模型提取相关信息（map），再把各块的结果逐层合并为最终答案（reduce）。
+整个过程只在内存中保留当前批次的块和各块的简短结果，不会把整个文件读入一个提示字符串。
+"""
+
+import itertools
+import os
+
+from ollama_toolkit.tokens import estimate_tokens, truncate_tokens
+
+INLINE_TEMPLATE = "文件 {name} 的内容：\n```\n{content}\n```\n\n"
+
+MAP_TEMPLATE = (
+    "以下是文件 {name} 的第{index}部分内容：\n```\n{content}\n```\n\n"
+    "请只根据这部分内容，提取与下面的请求相关的信息并简要作答；"
+    "如果这部分内容与请求无关，请只回答“无相关内容”。\n\n请求：{prompt}"
+)
+
+REDUCE_TEMPLATE = (
+    "下面是从一个或多个文件的不同部分分别得到的结果：\n\n{content}\n\n"
+    "请把这些结果合并为对下面请求的完整回答，去掉重复和无关的内容。\n\n请求：{prompt}"
+)
+
+# 模板本身占用的token数（估算值，取较长的map模板）
+TEMPLATE_TOKENS = estimate_tokens(MAP_TEMPLATE)
+
+# 根据上下文长度缩小块大小时的下限，避免切出过多的小块
+MIN_CHUNK_TOKENS = 256
+
+# 只用于最终请求的参数：中间的map/reduce请求输出的是自由文本的中间结果，不能套用最终的输出格式
+FINAL_ONLY_PARAMS = ("format",)
+
+PARTIAL_NOTE = "注意：以下部分处理失败，结果中没有包含它们的内容：\n{failures}\n\n"
+
+
+class FileChunk:
+    """
+    文件中的一个文本块
+
+    Attributes:
+        path (str): 文件路径
+        index (int): 块在文件中的序号（从1开始）
+        text (str): 文本内容
+        tokens (int): 估算的token数
+        start_line (int): 块的第一行在文件中的行号（从1开始）
+        end_line (int): 块的最后一行在文件中的行号
+    """
+    __slots__ = ("path", "index", "text", "tokens", "start_line", "end_line")
+
+    def __init__(self, path, index, text, tokens, start_line=1, end_line=None):
+        self.path = path
+        self.index = index
+        self.text = text
+        self.tokens = tokens
+        self.start_line = start_line
+        self.end_line = end_line if end_line is not None else start_line + max(text.count("\n") - 1, 0)
+
+    @property
+    def name(self):
+        return os.path.basename(self.path)
+
+
+class ChunkFailure:
+    """
+    map阶段处理失败的块
+
+    Attributes:
+        path (str): 文件路径
+        index (int): 块在文件中的序号
+        start_line (int): 块的第一行的行号
+        end_line (int): 块的最后一行的行号
+        error (Exception): 请求的错误
+    """
+    __slots__ = ("path", "index", "start_line", "end_line", "error")
+
+    def __init__(self, chunk, error):
+        self.path = chunk.path
+        self.index = chunk.index
+        self.start_line = chunk.start_line
+        self.end_line = chunk.end_line
+        self.error = error
+
+    def __str__(self):
+        return (f"{os.path.basename(self.path)}的第{self.index}部分"
+                f"（第{self.start_line}-{self.end_line}行）: {self.error}")
+
+
+class FileProcessingError(RuntimeError):
+    """
+    部分文件块处理失败，而调用方没有允许只根据其余部分作答
+
+    Attributes:
+        failures (list): ChunkFailure列表
+    """
+    def __init__(self, failures):
+        self.failures = failures
+        super().__init__(f"{len(failures)}个文件块处理失败:\n" + "\n".join(str(failure) for failure in failures))
+
+
+def iter_chunks(path, max_tokens=2048, encoding="utf-8"):
+    """
+    流式读取文本文件并按行切分为不超过max_tokens的块
+
+    按行读取时限制单次读取的长度，因此即使文件没有换行符也不会一次读入整个文件。
+
+    Args:
+        path (str): 文件路径
+        max_tokens (int): 每个块的token上限（估算值）
+        encoding (str): 文件编码，无法解码的字节会被替换
+
+    Yields:
+        FileChunk: 文本块
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"文件不存在: {path}")
+    # 每个token至少对应一个字符，以此限制单行读取的长度
+    max_line = max_tokens
+    lines = []
+    tokens = 0
+    index = 0
+    # 当前读取位置所在的行号，当前块的第一行和最后一行的行号
+    line_number = 1
+    start_line = 1
+    last_line = 1
+    with open(path, "r", encoding=encoding, errors="replace", newline="") as f:
+        for line in iter(lambda: f.readline(max_line), ""):
+            line_tokens = estimate_tokens(line)
+            if lines and tokens + line_tokens > max_tokens:
+                index += 1
+                yield FileChunk(path, index, "".join(lines), tokens, start_line, last_line)
+                lines = []
+                tokens = 0
+                start_line = line_number
+            lines.append(line)
+            tokens += line_tokens
+            last_line = line_number
+            if line.endswith("\n"):
+                line_number += 1
+    if lines:
+        index += 1
+        yield FileChunk(path, index, "".join(lines), tokens, start_line, last_line)
+
+
+class FileIngestor:
+    """
+    把文件内容作为generate的输入
+
+    map阶段有块处理失败时默认抛出FileProcessingError；设置allow_partial=True时只根据其余部分作答，
+    最终提示中会注明缺少的部分，最终响应的最后一个数据块的data["failed_chunks"]列出失败的块。
+
+    用法:
+        ingestor = FileIngestor(chunk_tokens=4096, concurrency=4)
+        client = OllamaClient(file_ingestor=ingestor)
+        client.generate("总结这份日志中的错误", files=["server.log"])
+    """
+    def __init__(self, chunk_tokens=2048, concurrency=4, encoding="utf-8",
+                 map_template=MAP_TEMPLATE, reduce_template=REDUCE_TEMPLATE, allow_partial=False):
+        """
+        Args:
+            chunk_tokens (int): 单次请求中文件内容的token上限（估算值），超过模型的上下文长度时会自动缩小
+            concurrency (int): map阶段同时执行的最大请求数
+            encoding (str): 文件编码
+            map_template (str): map阶段的提示模板，可用字段: name, index, content, prompt
+            reduce_template (str): reduce阶段的提示模板，可用字段: content, prompt
+            allow_partial (bool): 部分块处理失败时是否仍根据其余部分作答
+        """
+        self.chunk_tokens = chunk_tokens
+        self.concurrency = concurrency
+        self.encoding = encoding
+        self.map_template = map_template
+        self.reduce_template = reduce_template
+        self.allow_partial = allow_partial
+
+    def iter_chunks(self, files, max_tokens=None):
+        """
+        依次切分所有文件
+
+        Yields:
+            FileChunk: 文本块
+        """
+        for path in files:
+            for chunk in iter_chunks(path, max_tokens or self.chunk_tokens, self.encoding):
+                yield chunk
+
+    def budget(self, client, prompt, model=None, options=None):
+        """
+        单次请求中文件内容的token上限：chunk_tokens，且不超过模型上下文长度减去提示和输出预留的部分
+
+        Args:
+            client (OllamaClient): 客户端
+            prompt (str): 提示文本
+            model (str, optional): 要使用的模型名称
+            options (dict, optional): 请求的options，num_ctx和num_predict会被考虑
+
+        Returns:
+            int: token上限（估算值）
+        """
+        window = client.catalog.context_window(model or client.default_model, options)
+        if not window:
+            return self.chunk_tokens
+        # 为模板、提示和输出预留空间，num_predict未设置时预留四分之一的上下文
+        reserve = (options or {}).get("num_predict") or window // 4
+        available = window - reserve - estimate_tokens(prompt) - TEMPLATE_TOKENS
+        return max(MIN_CHUNK_TOKENS, min(self.chunk_tokens, available))
+
+    def stream(self, client, prompt, files, model=None, images=None, **kwargs):
+        """
+        结合文件内容生成响应
+
+        Args:
+            client (OllamaClient): 客户端
+            prompt (str): 提示文本
+            files (list): 文件路径列表
+            model (str, optional): 要使用的模型名称
+            images (list, optional): 图片文件路径列表，只在最终请求中使用
+            **kwargs: 其他传递给Ollama API的参数
+
+        Yields:
+            StreamChunk: 最终响应的数据块
+
+        Raises:
+            FileProcessingError: 有块处理失败且allow_partial为False
+        """
+        chunk_tokens = self.budget(client, prompt, model, kwargs.get("options"))
+        chunks = self.iter_chunks(files, chunk_tokens)
+
+        # 先读取不超过一个块预算的内容，判断能否直接内联到提示中
+        head = []
+        total = 0
+        for chunk in chunks:
+            head.append(chunk)
+            total += chunk.tokens
+            if total > chunk_tokens:
+                break
+        else:
+            inline = "".join(
+                INLINE_TEMPLATE.format(name=chunk.name, content=chunk.text) for chunk in head
+            )
+            for chunk in client.generate_stream(inline + prompt, model=model, images=images, **kwargs):
+                yield chunk
+            return
+
+        # 中间请求不使用最终的输出格式（例如structured输出的format）
+        intermediate = {key: value for key, value in kwargs.items() if key not in FINAL_ONLY_PARAMS}
+        partials, failures = self._map(client, prompt, itertools.chain(head, chunks), model, intermediate)
+        final_prompt = self._reduce(client, prompt, partials, model, intermediate, chunk_tokens)
+        if failures:
+            note = PARTIAL_NOTE.format(failures="\n".join(str(failure) for failure in failures))
+            final_prompt = note + final_prompt
+        for chunk in client.generate_stream(final_prompt, model=model, images=images, **kwargs):
+            if chunk.done and failures:
+                chunk.data = dict(chunk.data, failed_chunks=[str(failure) for failure in failures])
+            yield chunk
+
+    def _map(self, client, prompt, chunks, model, kwargs):
+        """
+        并发处理每个块
+
+        Returns:
+            tuple: (各块的结果文本列表（按文件顺序）, ChunkFailure列表)
+        """
+        # 只保留块的位置信息，用于报告失败的块，不保留块的内容
+        chunk_list = []
+
+        def prompts():
+            for chunk in chunks:
+                chunk_list.append(FileChunk(chunk.path, chunk.index, "", 0, chunk.start_line, chunk.end_line))
+                yield self.map_template.format(name=chunk.name, index=chunk.index, content=chunk.text, prompt=prompt)
+
+        partials = []
+        failures = []
+        for result in client.generate_many(prompts(), concurrency=self.concurrency, ordered=True,
+                                           model=model, **kwargs):
+            if result.ok:
+                partials.append(result.output.strip())
+            else:
+                failures.append(ChunkFailure(chunk_list[result.index], result.error))
+        if failures and (not self.allow_partial or not partials):
+            raise FileProcessingError(failures)
+        return partials, failures
+
+    def _reduce(self, client, prompt, partials, model, kwargs, chunk_tokens):
+        """
+        逐层合并各块的结果，直到可以放入一次请求，返回最终请求的提示
+
+        超过预算一半的结果会被截断，保证每两个结果可以合并，每一层的结果数至少减半
+        """
+        while True:
+            limit = chunk_tokens // 2 if len(partials) > 1 else chunk_tokens
+            partials = [truncate_tokens(partial, limit) for partial in partials]
+            groups = [[]]
+            tokens = 0
+            for partial in partials:
+                partial_tokens = estimate_tokens(partial)
+                if groups[-1] and tokens + partial_tokens > chunk_tokens:
+                    groups.append([])
+                    tokens = 0
+                groups[-1].append(partial)
+                tokens += partial_tokens
+            if len(groups) == 1:
+                return self.reduce_template.format(content="\n\n---\n\n".join(partials), prompt=prompt)
+            prompts = [
+                self.reduce_template.format(content="\n\n---\n\n".join(group), prompt=prompt)
+                for group in groups
+            ]
+            partials = []
+            for result in client.generate_many(prompts, concurrency=self.concurrency, ordered=True,
+                                               model=model, **kwargs):
+                if not result.ok:
+                    raise result.error
+                partials.append(result.output.strip())
@@ -0,0 +1,562 @@
+"""
+本地网关：对外提供与Ollama兼容的HTTP API，并通过OllamaClient转发请求
+
+- 同时到达的相同generate/chat请求只向上游发出一次，token流会分发给所有等待者
+- 上游请求按优先级排队，并限制每个调用方同时占用的并发数，避免批处理任务挤占交互式请求
+- 其他API（例如/api/tags、/api/embed）原样转发
+
+用法:
+    ollama-tool serve --port 11435 --url http://gpu1:11434,http://gpu2:11434 --max-concurrency 8
+
+调用方可以通过请求头指定身份和优先级：
+    X-Client-Id: batch-job-1
+    X-Priority: interactive | default | batch | 整数（越小越优先）
+"""
+
+import heapq
+import itertools
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from ollama_toolkit.cache import request_key
+from ollama_toolkit.streaming import StreamChunk
+
+PRIORITIES = {
+    "interactive": 0,
+    "default": 1,
+    "batch": 2,
+}
+
+# 可以合并并转换为流式请求的API
+STREAM_PATHS = {
+    "/api/generate": StreamChunk.from_generate,
+    "/api/chat": StreamChunk.from_chat,
+}
+
+
+def _chunk_data(path, chunk, model=None):
+    """
+    把StreamChunk转换为Ollama格式的数据块：以chunk.text作为response（generate）或message.content（chat），
+    覆盖原始数据中的对应字段，因此带缓存的客户端重放的数据块（原始数据为空）也能正确输出
+    """
+    data = dict(chunk.data)
+    data["done"] = chunk.done
+    if model and "model" not in data:
+        data["model"] = model
+    if path == "/api/chat":
+        message = dict(data.get("message") or {})
+        message.setdefault("role", "assistant")
+        message["content"] = chunk.text
+        data["message"] = message
+    else:
+        data["response"] = chunk.text
+    return data
+
+
+def parse_priority(value, default=PRIORITIES["default"]):
+    """
+    解析优先级名称或整数，无法识别时返回default
+    """
+    if value is None:
+        return default
+    value = str(value).strip().lower()
+    if value in PRIORITIES:
+        return PRIORITIES[value]
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+
+class _Ticket:
+    __slots__ = ("priority", "seq", "client_id")
+
+    def __init__(self, priority, seq, client_id):
+        self.priority = priority
+        self.seq = seq
+        self.client_id = client_id
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class Scheduler:
+    """
+    上游并发的准入控制：总并发数有上限，等待中的请求按优先级（同一优先级内先到先得）获得名额，
+    已达到并发配额的调用方的请求会被跳过，让给其他调用方
+    """
+    def __init__(self, max_concurrency=8, per_client=None, quotas=None):
+        """
+        Args:
+            max_concurrency (int): 同时发往上游的最大请求数
+            per_client (int, optional): 每个调用方同时占用的最大并发数，为None时不限制
+            quotas (dict, optional): 按调用方单独设置的并发配额，优先于per_client
+        """
+        self.max_concurrency = max_concurrency
+        self.per_client = per_client
+        self.quotas = dict(quotas or {})
+        self.active = 0
+        self._active_by_client = {}
+        # 按(priority, seq)排序的堆
+        self._waiting = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _quota(self, client_id):
+        return self.quotas.get(client_id, self.per_client)
+
+    def _eligible(self, ticket):
+        quota = self._quota(ticket.client_id)
+        return quota is None or self._active_by_client.get(ticket.client_id, 0) < quota
+
+    def _next(self):
+        """
+        返回下一个可以获得名额的请求（调用时需持有锁）
+        """
+        if not self._waiting:
+            return None
+        if self._eligible(self._waiting[0]):
+            return self._waiting[0]
+        # 队首的调用方已达到配额，按顺序查找其他调用方的请求
+        for ticket in sorted(self._waiting):
+            if self._eligible(ticket):
+                return ticket
+        return None
+
+    def acquire(self, client_id, priority=PRIORITIES["default"]):
+        """
+        等待获得一个上游名额
+
+        Args:
+            client_id (str): 调用方标识
+            priority (int): 优先级，越小越优先
+
+        Returns:
+            _Ticket: 传给release的凭据
+        """
+        with self._cond:
+            ticket = _Ticket(priority, next(self._seq), client_id)
+            heapq.heappush(self._waiting, ticket)
+            while self.active >= self.max_concurrency or self._next() is not ticket:
+                self._cond.wait()
+            if self._waiting[0] is ticket:
+                heapq.heappop(self._waiting)
+            else:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+            self.active += 1
+            self._active_by_client[client_id] = self._active_by_client.get(client_id, 0) + 1
+            # 名额可能还有剩余，让下一个请求检查
+            self._cond.notify_all()
+            return ticket
+
+    def release(self, ticket):
+        """
+        归还名额
+        """
+        with self._cond:
+            self.active -= 1
+            remaining = self._active_by_client[ticket.client_id] - 1
+            if remaining:
+                self._active_by_client[ticket.client_id] = remaining
+            else:
+                del self._active_by_client[ticket.client_id]
+            self._cond.notify_all()
+
+    @property
+    def stats(self):
+        with self._cond:
+            queued = {}
+            for ticket in self._waiting:
+                queued[ticket.priority] = queued.get(ticket.priority, 0) + 1
+            return {
+                "active": self.active,
+                "max_concurrency": self.max_concurrency,
+                "queued": queued,
+                "active_by_client": dict(self._active_by_client),
+            }
+
+
+class _Flight:
+    """
+    一次上游请求：保存已收到的数据块，等待者各自从头读取
+    """
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.waiters = 0
+        self._cond = threading.Condition()
+
+    def publish(self, chunk):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            self.done = True
+            self.error = error
+            self._cond.notify_all()
+
+    def join(self):
+        with self._cond:
+            self.waiters += 1
+
+    def leave(self):
+        with self._cond:
+            self.waiters -= 1
+
+    def follow(self):
+        """
+        从第一个数据块开始读取，直到上游请求结束
+
+        Yields:
+            dict: 原始数据块
+        """
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self.chunks) and not self.done:
+                    self._cond.wait()
+                pending = self.chunks[index:]
+                index = len(self.chunks)
+                done = self.done and index == len(self.chunks)
+                error = self.error
+            for chunk in pending:
+                yield chunk
+            if done:
+                if error is not None:
+                    raise error
+                return
+
+
+class Gateway:
+    """
+    转发generate/chat请求，合并相同的并发请求并按优先级排队
+
+    用法:
+        gateway = Gateway(OllamaClient(base_url=[...]), max_concurrency=8, per_client=4)
+        for chunk in gateway.stream("/api/chat", data, client_id="app", priority=0):
+            ...
+    """
+    def __init__(self, client, max_concurrency=8, per_client=None, quotas=None, coalesce=True):
+        """
+        Args:
+            client (OllamaClient): 转发请求使用的客户端（可以是多节点、带缓存或容错策略的客户端）
+            max_concurrency (int): 同时发往上游的最大请求数
+            per_client (int, optional): 每个调用方同时占用的最大并发数
+            quotas (dict, optional): 按调用方单独设置的并发配额
+            coalesce (bool): 是否合并相同的并发请求
+        """
+        self.client = client
+        self.scheduler = Scheduler(max_concurrency, per_client, quotas)
+        self.coalesce = coalesce
+        self.requests = 0
+        self.coalesced = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def stream(self, path, data, client_id="anonymous", priority=PRIORITIES["default"]):
+        """
+        转发一个generate/chat请求
+
+        Args:
+            path (str): "/api/generate"或"/api/chat"
+            data (dict): Ollama格式的请求数据
+            client_id (str): 调用方标识
+            priority (int): 优先级，越小越优先
+
+        Yields:
+            dict: Ollama返回的原始数据块（总是流式的）
+        """
+        key = request_key(path, data) if self.coalesce else None
+        leader = False
+        with self._lock:
+            self.requests += 1
+            flight = self._flights.get(key) if key is not None else None
+            if flight is not None:
+                self.coalesced += 1
+            else:
+                flight = _Flight()
+                if key is not None:
+                    self._flights[key] = flight
+                leader = True
+            flight.join()
+        if leader:
+            threading.Thread(
+                target=self._pump, args=(flight, key, path, data, client_id, priority),
+                name="ollama-gateway-upstream", daemon=True
+            ).start()
+        try:
+            for chunk in flight.follow():
+                yield chunk
+        finally:
+            flight.leave()
+
+    def _pump(self, flight, key, path, data, client_id, priority):
+        """
+        获得名额后发出上游请求，把数据块分发给所有等待者；所有等待者都离开后停止读取
+        """
+        error = None
+        ticket = self.scheduler.acquire(client_id, priority)
+        try:
+            if not self._retire(flight, key):
+                chunks = self.client.stream_chunks(path, dict(data, stream=True), STREAM_PATHS[path])
+                try:
+                    for chunk in chunks:
+                        flight.publish(_chunk_data(path, chunk, data.get("model")))
+                        if self._retire(flight, key):
+                            break
+                finally:
+                    chunks.close()
+        except Exception as e:
+            error = e
+        finally:
+            self.scheduler.release(ticket)
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.finish(error)
+
+    def _retire(self, flight, key):
+        """
+        所有等待者都已离开时，在加入等待者所用的同一把锁下移除这次上游请求，
+        之后到达的相同请求会发出新的上游请求，而不会加入一个即将中止的请求
+
+        Returns:
+            bool: 是否已移除
+        """
+        if flight.waiters:
+            return False
+        with self._lock:
+            if flight.waiters:
+                return False
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            return True
+
+    def forward(self, method, path, data=None):
+        """
+        原样转发其他API请求，响应体边读取边转发（例如/api/pull的进度）
+
+        Returns:
+            tuple: (HTTP状态码, Content-Type, 产出响应体字节块的迭代器)
+        """
+        return self.client.forward(method, path, data)
+
+    @property
+    def stats(self):
+        """
+        网关统计信息：请求数、被合并的请求数、进行中的上游请求以及调度器状态
+        """
+        with self._lock:
+            stats = {
+                "requests": self.requests,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._flights),
+            }
+        stats["scheduler"] = self.scheduler.stats
+        return stats
+
+    def serve(self, host="127.0.0.1", port=11435):
+        """
+        创建HTTP服务器，调用返回对象的serve_forever()开始处理请求
+
+        Returns:
+            ThreadingHTTPServer: 服务器对象
+        """
+        server = ThreadingHTTPServer((host, port), _make_handler(self))
+        server.daemon_threads = True
+        return server
+
+
+def _error_response(error):
+    """
+    把上游错误转换为(HTTP状态码, 响应内容)
+    """
+    response = getattr(error, "response", None)
+    if response is not None:
+        return response.status_code, response.content
+    body = json.dumps({"error": str(error)}, ensure_ascii=False).encode("utf-8")
+    return 502, body
+
+
+def _make_handler(gateway):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body, content_type="application/json"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_json(self, obj, status=200):
+            self._send(status, json.dumps(obj, ensure_ascii=False).encode("utf-8"))
+
+        def _write_chunk(self, obj):
+            line = json.dumps(obj, ensure_ascii=False).encode("utf-8") + b"\n"
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+            self.wfile.flush()
+
+        def _read_body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            return json.loads(body) if body else None
+
+        def do_GET(self):
+            if self.path == "/api/gateway/stats":
+                self._send_json(gateway.stats)
+                return
+            self._forward("GET", None)
+
+        def do_POST(self):
+            try:
+                data = self._read_body()
+            except ValueError:
+                self._send_json({"error": "invalid JSON"}, 400)
+                return
+            if self.path in STREAM_PATHS and isinstance(data, dict):
+                self._stream(data)
+            else:
+                self._forward("POST", data)
+
+        def do_DELETE(self):
+            try:
+                data = self._read_body()
+            except ValueError:
+                self._send_json({"error": "invalid JSON"}, 400)
+                return
+            self._forward("DELETE", data)
+
+        def do_HEAD(self):
+            # ollama命令行用HEAD /检查服务器是否在运行
+            try:
+                status, content_type, body = gateway.forward("HEAD", self.path)
+            except requests.exceptions.RequestException as e:
+                status, _ = _error_response(e)
+                content_type = "application/json"
+            else:
+                for _ in body:
+                    pass
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def _forward(self, method, data):
+            try:
+                status, content_type, body = gateway.forward(method, self.path, data)
+            except requests.exceptions.RequestException as e:
+                self._send(*_error_response(e))
+                return
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for block in body:
+                    if block:
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(block), block))
+                        self.wfile.flush()
+            except requests.exceptions.RequestException:
+                # 已经开始输出，无法再返回错误状态，中断连接让调用方知道响应不完整
+                self.close_connection = True
+                return
+            except ConnectionError:
+                # 调用方已断开
+                self.close_connection = True
+                return
+            finally:
+                close = getattr(body, "close", None)
+                if close is not None:
+                    close()
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+        def _stream(self, data):
+            client_id = self.headers.get("X-Client-Id") or self.client_address[0]
+            priority = parse_priority(self.headers.get("X-Priority"))
+            chunks = gateway.stream(self.path, data, client_id=client_id, priority=priority)
+            try:
+                if data.get("stream", True):
+                    self._write_stream(chunks)
+                else:
+                    self._write_single(chunks)
+            except ConnectionError:
+                # 调用方已断开，离开等待队列即可
+                self.close_connection = True
+            finally:
+                chunks.close()
+
+        def _write_stream(self, chunks):
+            # 只捕获读取上游数据块时的错误，写入调用方连接时的ConnectionError交给_stream处理
+            try:
+                chunk = next(chunks, None)
+            except Exception as e:
+                self._send(*_error_response(e))
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            while chunk is not None:
+                self._write_chunk(chunk)
+                try:
+                    chunk = next(chunks, None)
+                except Exception as e:
+                    # 已经开始输出，和Ollama一样在流中返回错误
+                    self._write_chunk({"error": str(e)})
+                    break
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+        def _write_single(self, chunks):
+            try:
+                result = _merge(self.path, list(chunks))
+            except Exception as e:
+                self._send(*_error_response(e))
+                return
+            self._send_json(result)
+
+    return Handler
+
+
+def _merge(path, chunks):
+    """
+    把流式数据块合并为非流式响应
+    """
+    if not chunks:
+        return {"done": True}
+    result = dict(chunks[-1])
+    if path == "/api/chat":
+        message = {"role": "assistant", "content": ""}
+        content, thinking, tool_calls = [], [], []
+        for chunk in chunks:
+            part = chunk.get("message") or {}
+            message["role"] = part.get("role", message["role"])
+            content.append(part.get("content") or "")
+            thinking.append(part.get("thinking") or "")
+            tool_calls.extend(part.get("tool_calls") or [])
+        message["content"] = "".join(content)
+        if any(thinking):
+            message["thinking"] = "".join(thinking)
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+        result["message"] = message
+    else:
+        result["response"] = "".join(chunk.get("response") or "" for chunk in chunks)
+        thinking = "".join(chunk.get("thinking") or "" for chunk in chunks)
+        if thinking:
+            result["thinking"] = thinking
+    return result
@@ -0,0 +1,372 @@
+"""
+持久化的聊天会话：只追加的消息日志加上定长的偏移索引
+
+每个会话由三个文件组成：
+- NAME.jsonl：每行一条消息，只在末尾追加，每轮对话的写入量与历史长度无关
+- NAME.jsonl.idx：每条消息一个定长记录（在日志中的偏移、长度和估算的token数），
+  第i条消息的记录位于i * RECORD.size处，因此无需读取整个日志就能定位任意一条消息
+- NAME.jsonl.summary：较早对话的摘要（可选），体积很小，整个文件原子地替换
+
+恢复会话时从索引末尾向前累计token数，只读取预算内的最近消息。进程在写入中途退出时，
+下次打开会丢弃日志末尾不完整的一行，并为索引中缺少的完整消息补上记录。
+同一会话同一时间只应由一个进程写入。
+"""
+
+import json
+import os
+import re
+import struct
+import threading
+
+from ollama_toolkit.memory import MESSAGE_OVERHEAD, SUMMARY_MESSAGE
+from ollama_toolkit.tokens import estimate_tokens
+
+# 索引记录：消息在日志中的偏移、字节数（包括换行符）和估算的token数
+RECORD = struct.Struct("<QII")
+
+# 从索引末尾向前读取时每次读取的记录数
+INDEX_BLOCK = 256
+
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser("~"), ".ollama_toolkit", "sessions")
+
+_NAME = re.compile(r"^[\w.-]+$")
+
+
+def message_tokens(message):
+    """
+    消息的估算token数，与ConversationMemory的计算方式一致
+    """
+    return estimate_tokens(message.get("content") or "") + MESSAGE_OVERHEAD
+
+
+class ChatLog:
+    """
+    一个持久化的聊天会话
+
+    用法:
+        with ChatLog("work.jsonl") as log:
+            reply = client.chat([{"role": "user", "content": "你好"}], history=log)
+            log.recent()                     # 预算内的最近消息
+            log.read(0, 10)                  # 最早的10条消息
+    """
+    def __init__(self, path, max_tokens=4096, durable=False):
+        """
+        Args:
+            path (str): 日志文件路径，索引和摘要保存在同一目录下
+            max_tokens (int): recent()默认的token预算（估算值）
+            durable (bool): 是否在每次追加后调用fsync，使消息在系统崩溃后也不丢失
+        """
+        self.path = path
+        self.max_tokens = max_tokens
+        self.durable = durable
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # 追加模式：无论读取位置在哪里，写入总是在文件末尾
+        self._log = open(path, "a+b")
+        self._index = open(path + ".idx", "a+b")
+        self._count = 0
+        self._end = 0
+        self._recover()
+
+    def _record(self, i):
+        self._index.seek(i * RECORD.size)
+        return RECORD.unpack(self._index.read(RECORD.size))
+
+    def _recover(self):
+        """
+        使索引与日志一致：截掉不完整的索引记录和日志行，为缺少记录的完整消息补上记录
+        """
+        index_size = os.fstat(self._index.fileno()).st_size
+        log_size = os.fstat(self._log.fileno()).st_size
+        self._count = index_size // RECORD.size
+        if index_size % RECORD.size:
+            self._index.truncate(self._count * RECORD.size)
+        if self._count:
+            offset, length, _ = self._record(self._count - 1)
+            self._end = offset + length
+        if self._end > log_size:
+            # 日志被截短或替换过，索引已不可信，重新建立
+            self._index.truncate(0)
+            self._count = 0
+            self._end = 0
+        if self._end == log_size:
+            return
+        self._log.seek(self._end)
+        tail = self._log.read()
+        position = 0
+        while True:
+            newline = tail.find(b"\n", position)
+            if newline < 0:
+                break
+            line = tail[position:newline + 1]
+            try:
+                message = json.loads(line)
+            except ValueError:
+                break
+            self._index.write(RECORD.pack(self._end, len(line), message_tokens(message)))
+            self._count += 1
+            self._end += len(line)
+            position = newline + 1
+        if self._end < log_size:
+            self._log.truncate(self._end)
+        self._index.flush()
+
+    def __len__(self):
+        return self._count
+
+    def append(self, message):
+        """
+        在会话末尾追加一条消息
+
+        Args:
+            message (dict): 消息，包含role和content
+
+        Returns:
+            int: 消息的序号
+        """
+        line = (json.dumps(message, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock:
+            # 先写日志再写索引：中途退出时只会出现没有索引的消息，下次打开时补上
+            self._log.write(line)
+            self._log.flush()
+            self._index.write(RECORD.pack(self._end, len(line), message_tokens(message)))
+            self._index.flush()
+            if self.durable:
+                os.fsync(self._log.fileno())
+                os.fsync(self._index.fileno())
+            self._end += len(line)
+            self._count += 1
+            return self._count - 1
+
+    def extend(self, messages):
+        """
+        依次追加多条消息
+        """
+        for message in messages:
+            self.append(message)
+
+    def read(self, start=0, stop=None):
+        """
+        读取序号在[start, stop)之间的消息，只读取这些消息所在的字节范围
+
+        Returns:
+            list: 消息列表
+        """
+        with self._lock:
+            stop = self._count if stop is None else min(stop, self._count)
+            if start >= stop:
+                return []
+            first, _, _ = self._record(start)
+            offset, length, _ = self._record(stop - 1)
+            self._log.seek(first)
+            data = self._log.read(offset + length - first)
+        return [json.loads(line) for line in data.splitlines()]
+
+    def tail_start(self, max_tokens=None, keep_recent=0):
+        """
+        从末尾向前累计token数，返回预算内最早一条消息的序号，只读取索引的末尾部分
+
+        Args:
+            max_tokens (int, optional): token预算，默认为self.max_tokens
+            keep_recent (int): 至少包含的最近消息条数，即使超出预算
+
+        Returns:
+            int: 序号，没有消息时为0
+        """
+        budget = self.max_tokens if max_tokens is None else max_tokens
+        with self._lock:
+            start = self._count
+            used = 0
+            while start > 0:
+                count = min(INDEX_BLOCK, start)
+                self._index.seek((start - count) * RECORD.size)
+                block = self._index.read(count * RECORD.size)
+                for _, _, tokens in reversed(list(RECORD.iter_unpack(block))):
+                    if self._count - start >= keep_recent and used + tokens > budget:
+                        return start
+                    used += tokens
+                    start -= 1
+            return start
+
+    def recent(self, max_tokens=None, keep_recent=2):
+        """
+        预算内的最近消息
+
+        Args:
+            max_tokens (int, optional): token预算，默认为self.max_tokens
+            keep_recent (int): 至少包含的最近消息条数
+
+        Returns:
+            list: 消息列表
+        """
+        return self.read(self.tail_start(max_tokens, keep_recent))
+
+    def context(self, max_tokens=None, keep_recent=2):
+        """
+        恢复会话时发送给模型的消息：保存的摘要（作为system消息，与ConversationMemory一致）
+        以及预算内、摘要之后的最近消息
+
+        Args:
+            max_tokens (int, optional): token预算（包括摘要），默认为self.max_tokens
+            keep_recent (int): 至少包含的最近消息条数
+
+        Returns:
+            list: 消息列表
+        """
+        summary, summarized = self.summary()
+        if not summary:
+            return self.recent(max_tokens, keep_recent)
+        budget = self.max_tokens if max_tokens is None else max_tokens
+        budget = max(budget - estimate_tokens(summary) - MESSAGE_OVERHEAD, 0)
+        start = max(self.tail_start(budget, keep_recent), summarized)
+        message = {"role": "system", "content": SUMMARY_MESSAGE.format(summary=summary)}
+        return [message] + self.read(start)
+
+    def __iter__(self):
+        """
+        按顺序逐条读取所有消息
+        """
+        for start in range(0, len(self), INDEX_BLOCK):
+            for message in self.read(start, start + INDEX_BLOCK):
+                yield message
+
+    def summary(self):
+        """
+        保存的摘要
+
+        Returns:
+            tuple: (摘要文本, 摘要涵盖的消息条数)，没有摘要时为("", 0)
+        """
+        try:
+            with open(self.path + ".summary", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return "", 0
+        return saved.get("summary", ""), min(saved.get("turns", 0), len(self))
+
+    def save_summary(self, summary, turns):
+        """
+        保存摘要，替换之前的摘要
+
+        Args:
+            summary (str): 摘要文本
+            turns (int): 摘要涵盖了会话最前面的多少条消息
+        """
+        temp = self.path + ".summary.tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "turns": turns}, f, ensure_ascii=False)
+        os.replace(temp, self.path + ".summary")
+
+    def clear(self):
+        """
+        清空会话，包括摘要
+        """
+        with self._lock:
+            self._log.truncate(0)
+            self._index.truncate(0)
+            self._count = 0
+            self._end = 0
+            try:
+                os.remove(self.path + ".summary")
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        self._log.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class SessionStore:
+    """
+    按名称管理会话的目录
+
+    用法:
+        store = SessionStore()
+        log = store.open("work")
+        for session in store.sessions():
+            print(session["name"], session["messages"])
+    """
+    def __init__(self, directory=None):
+        """
+        Args:
+            directory (str, optional): 保存会话的目录，默认为~/.ollama_toolkit/sessions
+        """
+        self.directory = directory or DEFAULT_DIRECTORY
+
+    def path(self, name):
+        """
+        会话的日志文件路径
+
+        Raises:
+            ValueError: 名称包含字母、数字、"_"、"-"和"."以外的字符
+        """
+        if not _NAME.match(name) or name.startswith("."):
+            raise ValueError(f"无效的会话名称: {name!r}")
+        return os.path.join(self.directory, name + ".jsonl")
+
+    def open(self, name, **kwargs):
+        """
+        打开（不存在时创建）会话
+
+        Args:
+            name (str): 会话名称
+            **kwargs: 传递给ChatLog的其他参数
+
+        Returns:
+            ChatLog: 会话
+        """
+        return ChatLog(self.path(name), **kwargs)
+
+    def exists(self, name):
+        return os.path.exists(self.path(name))
+
+    def sessions(self):
+        """
+        所有会话的名称、消息条数、日志大小和最后修改时间，按修改时间从新到旧排列，不读取日志内容
+
+        Returns:
+            list: 字典列表
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        found = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".jsonl"):
+                continue
+            path = os.path.join(self.directory, filename)
+            stat = os.stat(path)
+            try:
+                messages = os.path.getsize(path + ".idx") // RECORD.size
+            except OSError:
+                messages = 0
+            found.append({
+                "name": filename[:-len(".jsonl")],
+                "messages": messages,
+                "bytes": stat.st_size,
+                "updated": stat.st_mtime,
+            })
+        found.sort(key=lambda session: session["updated"], reverse=True)
+        return found
+
+    def delete(self, name):
+        """
+        删除会话
+
+        Returns:
+            bool: 会话是否存在
+        """
+        path = self.path(name)
+        existed = os.path.exists(path)
+        for suffix in ("", ".idx", ".summary"):
+            try:
+                os.remove(path + suffix)
+            except FileNotFoundError:
+                pass
+        return existed
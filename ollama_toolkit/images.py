@@ -0,0 +1,189 @@
+"""
+多模态请求的图片编码：分块base64编码、线程池并行处理、按文件状态缓存，以及可选的缩放/重新压缩
+"""
+
+import base64
+import collections
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _load_pil():
+    """
+    导入Pillow：它是可选依赖，只有缩放/重新压缩时才需要，因此在第一次使用时才导入
+
+    Returns:
+        module: PIL.Image，未安装时为None
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    return Image
+
+
+# 每次读取的字节数，必须是3的倍数，这样各块的base64编码可以直接拼接
+READ_BLOCK_SIZE = 3 * 256 * 1024
+
+
+def encode_file(path, block_size=READ_BLOCK_SIZE):
+    """
+    分块读取文件并进行base64编码，避免同时在内存中保留完整的原始数据和编码结果
+
+    Args:
+        path (str): 文件路径
+        block_size (int): 每次读取的字节数，必须是3的倍数
+
+    Returns:
+        str: base64编码后的数据
+    """
+    parts = []
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            parts.append(base64.b64encode(block).decode('ascii'))
+    return "".join(parts)
+
+
+class ImageEncoder:
+    """
+    图片编码器，把图片文件转换为Ollama API所需的base64字符串
+
+    编码结果按(路径, 文件大小, 修改时间)缓存，同一张图片重复分析时无需重新读取和编码；
+    多张图片在线程池中并行编码。设置max_side或max_bytes后会先用Pillow缩放/重新压缩图片，
+    以控制请求体大小。
+    """
+    def __init__(self, max_workers=4, max_entries=64, max_side=None, max_bytes=None, quality=85):
+        """
+        Args:
+            max_workers (int): 并行编码的线程数
+            max_entries (int): 最多缓存的编码结果数，为0时不缓存
+            max_side (int, optional): 图片最长边的像素上限，超过时等比缩小
+            max_bytes (int, optional): 编码前图片数据的字节数上限，超过时逐步降低JPEG质量和尺寸
+            quality (int): 重新压缩时使用的初始JPEG质量
+        """
+        if (max_side or max_bytes) and _load_pil() is None:
+            raise ImportError("缩放或压缩图片需要Pillow，请先安装: pip install Pillow")
+        self.max_workers = max_workers
+        self.max_entries = max_entries
+        self.max_side = max_side
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _cache_key(self, path):
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+    def encode(self, path):
+        """
+        编码一张图片
+
+        Args:
+            path (str): 图片文件路径
+
+        Returns:
+            str: base64编码后的图片数据
+
+        Raises:
+            FileNotFoundError: 图片文件不存在
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"图片文件不存在: {path}")
+        key = self._cache_key(path)
+        with self._lock:
+            encoded = self._cache.get(key)
+            if encoded is not None:
+                self._cache.move_to_end(key)
+                return encoded
+
+        if self._needs_resize(key[1]):
+            encoded = base64.b64encode(self._shrink(path)).decode('ascii')
+        else:
+            encoded = encode_file(path)
+
+        if self.max_entries:
+            with self._lock:
+                self._cache[key] = encoded
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        return encoded
+
+    def encode_many(self, paths):
+        """
+        并行编码多张图片
+
+        Args:
+            paths (list): 图片文件路径列表
+
+        Returns:
+            list: 与paths顺序一致的base64编码结果
+        """
+        paths = list(paths)
+        # 先检查所有文件，避免部分图片编码完成后才发现错误
+        for path in paths:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"图片文件不存在: {path}")
+        if len(paths) <= 1 or self.max_workers <= 1:
+            return [self.encode(path) for path in paths]
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        return list(self._pool.map(self.encode, paths))
+
+    def _needs_resize(self, size):
+        if self.max_side:
+            return True
+        return bool(self.max_bytes) and size > self.max_bytes
+
+    def _shrink(self, path):
+        """
+        缩小并重新压缩图片，返回压缩后的字节数据
+        """
+        with _load_pil().open(path) as image:
+            image.load()
+            if self.max_side and max(image.size) <= self.max_side and \
+                    (not self.max_bytes or os.path.getsize(path) <= self.max_bytes):
+                # 尺寸和大小都满足要求，保持原始数据
+                with open(path, 'rb') as f:
+                    return f.read()
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            if self.max_side:
+                image.thumbnail((self.max_side, self.max_side))
+
+            quality = self.quality
+            while True:
+                buffer = io.BytesIO()
+                image.save(buffer, format="JPEG", quality=quality)
+                data = buffer.getvalue()
+                if not self.max_bytes or len(data) <= self.max_bytes:
+                    return data
+                if quality > 40:
+                    quality -= 15
+                elif min(image.size) > 64:
+                    image = image.resize((max(image.width * 3 // 4, 1), max(image.height * 3 // 4, 1)))
+                else:
+                    return data
+
+    def clear(self):
+        """
+        清空编码缓存
+        """
+        with self._lock:
+            self._cache.clear()
+
+    def close(self):
+        """
+        关闭编码线程池
+        """
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
@@ -0,0 +1,267 @@
+"""
+有上限的对话历史：按token预算截断，并在后台把较早的对话滚动总结为摘要
+"""
+
+import collections
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from ollama_toolkit.tokens import estimate_tokens
+
+# 每条消息在角色、分隔符等格式上的额外token开销（估算值）
+MESSAGE_OVERHEAD = 4
+
+SUMMARY_TEMPLATE = (
+    "请把已有摘要和新的对话内容合并为一份简洁的摘要，保留关键事实、用户的偏好和要求以及尚未完成的事项，"
+    "不超过{limit}字，只输出摘要本身。\n\n已有摘要：\n{summary}\n\n新的对话内容：\n{turns}"
+)
+
+SUMMARY_MESSAGE = "以下是之前对话的摘要：\n{summary}"
+
+
+class _Turn:
+    __slots__ = ("message", "tokens")
+
+    def __init__(self, message):
+        self.message = message
+        self.tokens = estimate_tokens(message.get("content", "")) + MESSAGE_OVERHEAD
+
+
+class ConversationMemory:
+    """
+    对话记忆：保留system提示和最近的若干轮对话，使发送给模型的消息不超过token预算
+
+    超出预算的较早消息会被移出历史，并在后台线程中与已有摘要合并为新的摘要；
+    摘要以system消息的形式放在最近对话之前。没有提供client时只截断、不总结。
+
+    提供log（history.ChatLog）时，每条消息都会追加到持久化的会话中，摘要也会随之保存；
+    创建时从会话中恢复摘要和预算内的最近消息，不会读取整个会话。
+
+    用法:
+        memory = ConversationMemory(client, max_tokens=4096, system="你是一个乐于助人的助手")
+        reply = memory.chat("你好，我叫小明")
+        reply = memory.chat("我叫什么名字？")
+    """
+    def __init__(self, client=None, max_tokens=4096, system=None, keep_recent=2,
+                 summary_tokens=512, model=None, log=None):
+        """
+        Args:
+            client (OllamaClient, optional): 用于生成摘要（以及chat方法）的客户端
+            max_tokens (int): 发送给模型的消息的token预算（估算值）
+            system (str, optional): system提示，始终保留
+            keep_recent (int): 至少保留的最近消息条数，即使超出预算也不会移出
+            summary_tokens (int): 摘要的token上限
+            model (str, optional): 生成摘要使用的模型，默认为client的默认模型
+            log (ChatLog, optional): 持久化的会话，为None时对话只保存在内存中
+        """
+        self.client = client
+        self.max_tokens = max_tokens
+        self.keep_recent = keep_recent
+        self.summary_tokens = summary_tokens
+        self.model = model
+        self.system = _Turn({"role": "system", "content": system}) if system else None
+        self.summary = ""
+        self._summary_tokens = 0
+        self._recent = collections.deque()
+        self._recent_tokens = 0
+        self._folded = []
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = None
+        self.log = log
+        # 会话最前面已经合并进摘要的消息条数
+        self._summarized = 0
+        # clear()时递增，丢弃清空之前开始的后台总结的结果
+        self._generation = 0
+        if log is not None:
+            self._restore()
+
+    def _restore(self):
+        """
+        从会话中恢复摘要和预算内的最近消息；摘要之后、预算之前的消息（上次退出时尚未总结）安排后台总结
+        """
+        self.summary, self._summarized = self.log.summary()
+        if self.summary:
+            self._summary_tokens = estimate_tokens(self.summary) + MESSAGE_OVERHEAD
+        budget = max(self.max_tokens - self._fixed_tokens(), 0)
+        start = max(self.log.tail_start(budget, self.keep_recent), self._summarized)
+        for message in self.log.read(start):
+            turn = _Turn(message)
+            self._recent.append(turn)
+            self._recent_tokens += turn.tokens
+        if start > self._summarized and self.client is not None:
+            self._folded = self.log.read(self._summarized, start)
+            with self._lock:
+                self._schedule_summary()
+
+    @property
+    def tokens(self):
+        """
+        当前消息的估算token数
+        """
+        with self._lock:
+            return self._fixed_tokens() + self._recent_tokens
+
+    def _fixed_tokens(self):
+        tokens = self._summary_tokens
+        if self.system is not None:
+            tokens += self.system.tokens
+        return tokens
+
+    def add(self, role, content, **fields):
+        """
+        添加一条消息，超出预算时把较早的消息移出并安排后台总结
+
+        Args:
+            role (str): 角色，例如"user"或"assistant"
+            content (str): 消息内容
+            **fields: 消息的其他字段（例如images）
+        """
+        self._add(dict(fields, role=role, content=content))
+
+    def _add(self, message, log=True):
+        turn = _Turn(message)
+        if log and self.log is not None:
+            self.log.append(turn.message)
+        with self._lock:
+            self._recent.append(turn)
+            self._recent_tokens += turn.tokens
+            evicted = []
+            while len(self._recent) > self.keep_recent and \
+                    self._fixed_tokens() + self._recent_tokens > self.max_tokens:
+                old = self._recent.popleft()
+                self._recent_tokens -= old.tokens
+                evicted.append(old.message)
+            if evicted and self.client is not None:
+                self._folded.extend(evicted)
+                self._schedule_summary()
+        return turn
+
+    def _discard(self, turn):
+        """
+        撤销最后添加的一条消息（请求失败时）
+        """
+        with self._lock:
+            if self._recent and self._recent[-1] is turn:
+                self._recent.pop()
+                self._recent_tokens -= turn.tokens
+
+    def add_messages(self, messages):
+        """
+        依次添加多条消息（例如恢复已有的对话）
+        """
+        for message in messages:
+            message = dict(message)
+            self.add(message.pop("role"), message.pop("content", ""), **message)
+
+    @property
+    def messages(self):
+        """
+        发送给模型的消息列表：system提示、摘要以及预算内的最近消息
+        """
+        with self._lock:
+            messages = []
+            if self.system is not None:
+                messages.append(self.system.message)
+            if self.summary:
+                messages.append({"role": "system", "content": SUMMARY_MESSAGE.format(summary=self.summary)})
+            messages.extend(turn.message for turn in self._recent)
+            return messages
+
+    def _schedule_summary(self):
+        """
+        安排一次后台总结（调用时需持有锁），同一时间最多只有一个总结任务
+        """
+        if self._pending is not None and not self._pending.done():
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending = self._executor.submit(self._summarize)
+
+    def _summarize(self):
+        while True:
+            with self._lock:
+                if not self._folded:
+                    return
+                folded, self._folded = self._folded, []
+                summary = self.summary
+                generation = self._generation
+            turns = "\n".join(f"{message['role']}: {message.get('content', '')}" for message in folded)
+            prompt = SUMMARY_TEMPLATE.format(limit=self.summary_tokens, summary=summary or "（无）", turns=turns)
+            try:
+                new_summary = self.client.generate(
+                    prompt, model=self.model, stream=False,
+                    options={"num_predict": self.summary_tokens}
+                ).strip()
+            except Exception:
+                # 总结失败时把消息放回，下次移出消息时再重试
+                with self._lock:
+                    if generation == self._generation:
+                        self._folded[:0] = folded
+                return
+            with self._lock:
+                if generation != self._generation:
+                    # 对话在总结期间被清空，丢弃这个摘要
+                    continue
+                self.summary = new_summary
+                self._summary_tokens = estimate_tokens(new_summary) + MESSAGE_OVERHEAD if new_summary else 0
+                self._summarized += len(folded)
+                if self.log is not None:
+                    self.log.save_summary(new_summary, self._summarized)
+
+    def wait(self):
+        """
+        等待正在进行的后台总结完成
+        """
+        pending = self._pending
+        if pending is not None:
+            pending.result()
+
+    def close(self):
+        """
+        等待后台总结完成并释放线程
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def clear(self):
+        """
+        清空对话（保留system提示），同时清空持久化的会话
+        """
+        with self._lock:
+            self._recent.clear()
+            self._recent_tokens = 0
+            self._folded = []
+            self.summary = ""
+            self._summary_tokens = 0
+            self._summarized = 0
+            self._generation += 1
+            if self.log is not None:
+                self.log.clear()
+
+    def chat(self, prompt, sink=None, **kwargs):
+        """
+        添加用户消息、调用模型，并把回复加入记忆
+
+        Args:
+            prompt (str): 用户输入
+            sink (callable or file-like, optional): 输出目标，见OllamaClient.chat
+            **kwargs: 其他传递给OllamaClient.chat的参数
+
+        Returns:
+            str: 模型的回复
+        """
+        if self.client is None:
+            raise ValueError("ConversationMemory.chat需要提供client")
+        # 用户消息先只加入内存，请求成功后才写入会话；请求失败或被中断时撤销
+        turn = self._add({"role": "user", "content": prompt}, log=False)
+        try:
+            response = self.client.chat(self.messages, sink=sink, **kwargs)
+        except BaseException:
+            self._discard(turn)
+            raise
+        if self.log is not None:
+            self.log.append(turn.message)
+        self.add("assistant", response)
+        return response
@@ -0,0 +1,115 @@
+"""
+NDJSON流的快速解码：较大的读取缓冲区、只扫描一遍的增量按行切分，以及可选的orjson解析
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson是可选依赖: pip install ollama_toolkit[fast]
+    orjson = None
+
+# 每次从连接读取的最大字节数；分块传输的响应在每个分块到达时立即返回，不会因此增加延迟
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def loads(line):
+    """
+    解析一行JSON，安装了orjson时优先使用orjson，orjson无法解析时再交给标准库
+
+    Raises:
+        ValueError: 无法解析
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(line)
+        except ValueError:
+            pass
+    return json.loads(line)
+
+
+class LineSplitter:
+    """
+    把任意切分的字节块重新切分为行
+
+    每个字节块只扫描一遍：完整的行直接从字节块中切出，只有跨越字节块边界的行
+    才会暂存并在行尾到达时拼接一次，因此很长的行（例如context数组）也是线性时间。
+    """
+    def __init__(self):
+        self._parts = []
+
+    def feed(self, data):
+        """
+        输入一个字节块
+
+        Args:
+            data (bytes): 字节块
+
+        Returns:
+            list: 已完整的行（不含换行符）
+        """
+        end = data.find(b"\n")
+        if end < 0:
+            if data:
+                self._parts.append(data)
+            return []
+        if self._parts:
+            self._parts.append(data[:end])
+            lines = [b"".join(self._parts)]
+            self._parts = []
+        else:
+            lines = [data[:end]]
+        start = end + 1
+        while True:
+            end = data.find(b"\n", start)
+            if end < 0:
+                break
+            lines.append(data[start:end])
+            start = end + 1
+        if start < len(data):
+            self._parts.append(data[start:])
+        return lines
+
+    def flush(self):
+        """
+        取出最后一个没有换行符结尾的行
+
+        Returns:
+            bytes: 剩余的数据，没有时为空字节串
+        """
+        line = b"".join(self._parts)
+        self._parts = []
+        return line
+
+
+def decode_line(line):
+    """
+    解析一行NDJSON，空行或无法解析的行返回None
+    """
+    if not line or line.isspace():
+        return None
+    try:
+        return loads(line)
+    except ValueError:
+        return None
+
+
+def iter_ndjson(chunks):
+    """
+    从字节块迭代器中逐个解析NDJSON对象，跳过空行和无法解析的行
+
+    Args:
+        chunks (iterable): 字节块迭代器，例如response.iter_content(READ_CHUNK_SIZE)
+
+    Yields:
+        dict: 解析后的对象
+    """
+    splitter = LineSplitter()
+    for data in chunks:
+        for line in splitter.feed(data):
+            obj = decode_line(line)
+            if obj is not None:
+                yield obj
+    obj = decode_line(splitter.flush())
+    if obj is not None:
+        yield obj
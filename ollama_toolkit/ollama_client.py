@@ -1,26 +1,562 @@
 import requests
-import json
-import sys
-import os
-import base64
+import time
+import contextlib
+
+from ollama_toolkit import provision
+from ollama_toolkit.batch import run_many
+from ollama_toolkit.catalog import EMBEDDING, VISION, ModelCatalog
+from ollama_toolkit.files import FileIngestor
+from ollama_toolkit.images import ImageEncoder
+from ollama_toolkit.ndjson import READ_CHUNK_SIZE, iter_ndjson
+from ollama_toolkit.pool import NodePool, NoHealthyNodeError
+from ollama_toolkit.resilience import CircuitOpenError, is_transient, race_stream
+from ollama_toolkit.streaming import ResponseAccumulator, StreamChunk
+from ollama_toolkit.structured import iter_structured, schema_dict
+from ollama_toolkit.telemetry import RequestMetrics, emit
+
+def _attach_images(messages, encoded_images):
+    """
+    将base64编码的图片添加到消息列表中（Ollama API支持的格式）
+    
+    不会修改传入的消息列表及其中的消息字典。
+    
+    Args:
+        messages (list): 消息历史列表
+        encoded_images (list): base64编码后的图片列表
+    
+    Returns:
+        list: 添加了images字段的新消息列表
+    """
+    messages_with_image = list(messages)
+    
+    # 在最后一条user消息中添加images字段
+    if messages_with_image and "content" in messages_with_image[-1] \
+            and messages_with_image[-1].get("role") == "user":
+        last_message = dict(messages_with_image[-1])
+        last_message["images"] = list(encoded_images)
+        messages_with_image[-1] = last_message
+    else:
+        # 如果消息列表为空或最后一条消息不是user消息，则添加一条新的user消息
+        messages_with_image.append({
+            "role": "user",
+            "content": "请分析这张图片",
+            "images": list(encoded_images)
+        })
+    return messages_with_image
+
+
+def _format_http_error(error, text):
+    """
+    根据HTTP错误和响应内容生成带有处理建议的错误信息
+    
+    Args:
+        error (Exception): HTTP错误
+        text (str): 错误响应内容
+    
+    Returns:
+        str: 错误信息
+    """
+    error_msg = f"HTTP错误: {error}"
+    if text:
+        error_msg += f"\n错误响应内容: {text}"
+        
+        # 检查是否是资源限制错误
+        if "resource limitations" in text:
+            error_msg += "\n\n提示：这可能是由于Ollama服务器资源不足导致的。\n"
+            error_msg += "      建议：\n"
+            error_msg += "      1. 关闭其他占用内存的程序\n"
+            error_msg += "      2. 尝试使用更小的模型\n"
+            error_msg += "      3. 增加系统内存\n"
+            error_msg += "      4. 检查Ollama服务器日志获取更多详细信息"
+        
+        # 检查是否是模型问题
+        if "model runner" in text:
+            error_msg += "\n\n提示：这可能是由于模型运行器出现问题。\n"
+            error_msg += "      建议：\n"
+            error_msg += "      1. 尝试重新拉取模型: ollama pull model_name\n"
+            error_msg += "      2. 重启Ollama服务\n"
+            error_msg += "      3. 检查Ollama服务器日志"
+    return error_msg
+
+
+# 未配置resilience时默认使用的(连接, 读取)超时秒数：读取超时只用于流式响应，是两次收到数据之间的
+# 最长间隔，避免一个卡住的节点使调用方永远等待；非流式请求要等整个生成（或模型加载）结束才会
+# 收到第一个字节，默认只限制连接时间。显式传入的timeout对非流式请求同样生效
+DEFAULT_TIMEOUT = (5.0, 300.0)
+
+# 未传入timeout参数的标记，与显式传入的值（包括与DEFAULT_TIMEOUT相等的值）区分开
+_UNSET = object()
+
 
 class OllamaClient:
     """
     Ollama客户端，用于调用本地或远程的Ollama模型，并支持流式输出。
     """
-    def __init__(self, base_url="http://localhost:11434", default_model="qwen3"):
+    def __init__(self, base_url="http://localhost:11434", default_model="qwen3", cache=None,
+                 image_encoder=None, file_ingestor=None, resilience=None, hooks=None,
+                 read_chunk_size=READ_CHUNK_SIZE, scheduler=None, catalog_ttl=60.0, timeout=_UNSET,
+                 server_num_ctx=None):
         """
         初始化Ollama客户端
         
         Args:
-            base_url (str): Ollama API的基础URL
+            base_url (str or list): Ollama API的基础URL；传入URL列表时在多个节点之间路由请求，
+                详见pool.NodePool
             default_model (str): 默认使用的模型名称
+            cache (ResponseCache, optional): 响应缓存，为None时不缓存
+            image_encoder (ImageEncoder, optional): 图片编码器，为None时使用默认配置
+            file_ingestor (FileIngestor, optional): 文件处理器，为None时使用默认配置
+            resilience (ResiliencePolicy, optional): 超时、重试、熔断和对冲策略，为None时不重试，
+                超时由timeout决定
+            hooks (list, optional): 每个generate/chat请求结束后以telemetry.RequestMetrics为参数调用的函数
+            read_chunk_size (int): 读取流式响应时每次读取的最大字节数
+            scheduler (ModelScheduler, optional): 按模型分组调度请求，减少服务器切换模型，为None时按到达顺序发送
+            catalog_ttl (float): 模型目录（模型列表、能力和上下文长度）的缓存秒数
+            timeout (tuple or float): 未设置resilience时使用的(连接, 读取)超时秒数，为None时不超时。
+                读取超时是两次收到数据之间的最长间隔，非流式请求相当于等待整个响应的时间；
+                未传入时使用DEFAULT_TIMEOUT，其读取超时只用于流式响应，非流式请求只限制连接时间
+            server_num_ctx (int, optional): 请求和Modelfile都没有设置num_ctx时服务器使用的上下文长度，
+                用于限制文件分块的大小；为None时使用环境变量OLLAMA_CONTEXT_LENGTH或catalog.DEFAULT_NUM_CTX
         """
-        self.base_url = base_url.rstrip('/')
+        if isinstance(base_url, (list, tuple)):
+            self.pool = NodePool(base_url)
+            self.base_url = self.pool.nodes[0].url
+        else:
+            self.pool = None
+            self.base_url = base_url.rstrip('/')
         self.default_model = default_model
+        self.cache = cache
+        self.image_encoder = image_encoder or ImageEncoder()
+        self.file_ingestor = file_ingestor or FileIngestor()
+        self.resilience = resilience
+        self.hooks = list(hooks or [])
+        self.read_chunk_size = read_chunk_size
+        self.scheduler = scheduler
+        self.catalog = ModelCatalog(self, ttl=catalog_ttl, server_num_ctx=server_num_ctx)
+        # 调用方显式设置的超时也用于非流式请求
+        self._limit_non_stream = timeout is not _UNSET
+        self.timeout = DEFAULT_TIMEOUT if timeout is _UNSET else timeout
         self.session = requests.Session()
+        self._pool_maxsize = requests.adapters.DEFAULT_POOLSIZE
+    
+    def _ensure_pool_size(self, size):
+        """
+        确保连接池至少能同时保持size个连接，供并发请求复用
+        """
+        if size > self._pool_maxsize:
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=size)
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+            self._pool_maxsize = size
+    
+    def close(self):
+        """
+        关闭连接池、图片编码线程池以及多节点模式下的后台健康检查
+        """
+        if self.pool is not None:
+            self.pool.close()
+        self.image_encoder.close()
+        self.session.close()
+    
+    def add_hook(self, hook):
+        """
+        添加请求结束后调用的回调函数
+        
+        Args:
+            hook (callable): 接收telemetry.RequestMetrics的函数，例如telemetry.MetricsAggregator
+        """
+        self.hooks.append(hook)
+    
+    def remove_hook(self, hook):
+        """
+        移除回调函数
+        """
+        self.hooks.remove(hook)
+    
+    @contextlib.contextmanager
+    def track(self):
+        """
+        收集代码块中（包括其他线程中）结束的所有请求的性能指标
+        
+        用法:
+            with client.track() as records:
+                client.generate("你好")
+            print(records[0].ttft, records[0].tokens_per_second)
+        
+        Yields:
+            list: RequestMetrics列表，随请求结束而增长
+        """
+        records = []
+        hook = records.append
+        self.add_hook(hook)
+        try:
+            yield records
+        finally:
+            self.remove_hook(hook)
+    
+    @contextlib.contextmanager
+    def _admit(self, model):
+        """
+        配置了调度器时，等待轮到该模型后再发送请求
+        """
+        if self.scheduler is None:
+            yield
+            return
+        with self.scheduler.slot(model or self.default_model):
+            yield
+    
+    def _route(self, model, capability, preferred=None):
+        """
+        未指定模型时，如果默认模型不具备所需的能力，则从模型目录中选择一个具备该能力的模型
+        
+        Args:
+            model (str): 调用方指定的模型，不为None时直接使用
+            capability (str): 所需的能力，例如catalog.VISION
+            preferred (str, optional): 首选的模型，默认为default_model
+        
+        Returns:
+            str: 要使用的模型
+        """
+        if model is not None:
+            return model
+        preferred = preferred or self.default_model
+        try:
+            return self.catalog.route(preferred, capability)
+        except requests.exceptions.RequestException:
+            # 无法读取模型目录时不影响请求本身
+            return preferred
+    
+    def _send(self, method, base_url, path, data, stream):
+        """
+        向指定节点发送请求并检查HTTP状态
+        """
+        policy = self.resilience
+        breaker = policy.breaker(base_url) if policy is not None else None
+        if breaker is not None and not breaker.allow():
+            raise CircuitOpenError(f"{base_url}的熔断器处于打开状态，请稍后重试")
+        
+        try:
+            response = self.session.request(
+                method, f"{base_url}{path}", json=data, stream=stream,
+                timeout=policy.timeout if policy is not None else self._timeout(stream)
+            )
+            
+            # 添加详细的错误处理
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError as e:
+                error_msg = _format_http_error(e, getattr(response, 'text', None))
+                raise requests.exceptions.HTTPError(error_msg, response=response) from e
+        except requests.exceptions.RequestException as e:
+            if breaker is not None:
+                if is_transient(e):
+                    breaker.record_failure()
+                else:
+                    # 节点能正常响应，只是请求本身有问题
+                    breaker.record_success()
+            raise
+        if breaker is not None:
+            breaker.record_success()
+        return response
+    
+    def _timeout(self, stream):
+        """
+        未设置resilience时请求使用的超时：使用默认超时时非流式请求不限制读取时间
+        """
+        if stream or self._limit_non_stream or self.timeout is None:
+            return self.timeout
+        connect = self.timeout[0] if isinstance(self.timeout, tuple) else self.timeout
+        return (connect, None)
+    
+    def _request(self, method, path, data=None, stream=False):
+        """
+        发送请求并检查HTTP状态；多节点模式下选择负载最低的节点，节点故障时换下一个节点重试
+        
+        Args:
+            method (str): HTTP方法
+            path (str): API路径，例如"/api/chat"
+            data (dict, optional): 请求数据
+            stream (bool): 是否以流的方式读取响应
+        
+        Returns:
+            requests.Response: 响应对象
+        
+        Raises:
+            requests.exceptions.HTTPError: 请求失败时抛出，错误信息中包含处理建议
+        """
+        if self.pool is None:
+            return self._send(method, self.base_url, path, data, stream)
+        
+        model = (data or {}).get("model")
+        tried = []
+        last_error = None
+        while True:
+            try:
+                node = self.pool.acquire(model, exclude=tried)
+            except NoHealthyNodeError:
+                if tried:
+                    raise last_error
+                raise
+            try:
+                response = self._send(method, node.url, path, data, stream)
+            except CircuitOpenError as e:
+                # 请求没有发出，是本地的快速失败，不计入节点的失败次数
+                self.pool.abandon(node)
+                tried.append(node)
+                last_error = e
+                continue
+            except requests.exceptions.RequestException as e:
+                if not is_transient(e):
+                    # 请求本身的问题（例如模型不存在），换节点也无济于事
+                    self.pool.release(node)
+                    raise
+                self.pool.release(node, error=e)
+                tried.append(node)
+                last_error = e
+                continue
+            if stream:
+                # 流式响应在读取完毕后才释放节点，见_iter_lines
+                response.node = node
+                response.model = model
+            else:
+                self.pool.release(node, model)
+            return response
+    
+    def _post(self, path, data, stream):
+        """
+        发送POST请求并检查HTTP状态
+        """
+        return self._request("POST", path, data, stream)
+    
+    def _iter_lines(self, response):
+        """
+        逐行解析NDJSON流式响应
+        
+        Yields:
+            dict: Ollama返回的数据块
+        """
+        error = None
+        try:
+            if getattr(response, "cancelled", False):
+                # 对冲中尚未开始读取就被取消的请求，只需释放资源
+                return
+            for chunk in iter_ndjson(response.iter_content(self.read_chunk_size)):
+                yield chunk
+                # 检查是否完成
+                if chunk.get("done", False):
+                    break
+        except requests.exceptions.RequestException as e:
+            # 对冲中被主动取消的请求不算作节点故障
+            if not getattr(response, "cancelled", False):
+                error = e
+            raise
+        finally:
+            self._close_response(response, error)
+    
+    def _iter_raw(self, response):
+        """
+        逐块读取响应体的原始字节，读取完毕或调用方中途停止时释放连接和节点
+        
+        Yields:
+            bytes: 响应体的字节块
+        """
+        error = None
+        try:
+            for block in response.iter_content(self.read_chunk_size):
+                yield block
+        except requests.exceptions.RequestException as e:
+            error = e
+            raise
+        finally:
+            self._close_response(response, error)
+    
+    def _close_response(self, response, error=None):
+        """
+        关闭流式响应；多节点模式下释放处理该请求的节点
+        """
+        response.close()
+        node = getattr(response, "node", None)
+        if node is not None:
+            self.pool.release(node, response.model, error)
+    
+    def _fetch(self, path, data):
+        """
+        发送请求并逐个产出原始数据块；配置了重试策略时，在尚未产出任何数据块之前出现的
+        暂时性错误会在退避后重试
+        """
+        retry = self.resilience.retry if self.resilience is not None else None
+        attempt = 0
+        while True:
+            attempt += 1
+            started = False
+            try:
+                for chunk in self._fetch_once(path, data):
+                    started = True
+                    yield chunk
+                return
+            except requests.exceptions.RequestException as e:
+                if started or retry is None or not retry.should_retry(e, attempt):
+                    raise
+            time.sleep(retry.delay(attempt))
+    
+    def _fetch_once(self, path, data):
+        """
+        发送一次请求并逐个产出原始数据块，非流式请求只产出一个数据块
+        """
+        if data.get("stream", True):
+            policy = self.resilience
+            if policy is not None and policy.races:
+                # 通过后台线程读取，以便执行首个token截止时间和对冲
+                chunks = race_stream(
+                    lambda: self._post(path, data, stream=True),
+                    self._iter_lines,
+                    first_token_timeout=policy.first_token_timeout,
+                    hedge=policy.hedge
+                )
+            else:
+                chunks = self._iter_lines(self._post(path, data, stream=True))
+            for chunk in chunks:
+                yield chunk
+            return
+        
+        response = self._post(path, data, stream=False)
+        try:
+            result = response.json()
+        except ValueError:
+            # 解析JSON响应失败，直接使用响应文本
+            result = None
+        if not isinstance(result, dict):
+            result = {"response": response.text, "message": {"content": response.text}, "done": True}
+        elif path == "/api/chat" and "content" not in (result.get("message") or {}):
+            # 响应中未找到message.content字段，直接使用响应文本
+            result = dict(result, message={"content": response.text}, done=True)
+        yield result
+    
+    def _chunks(self, path, data, make_chunk):
+        """
+        发送请求并产出StreamChunk，同时记录性能指标：最后一个数据块的metrics属性携带本次请求的
+        RequestMetrics，请求结束（包括失败或被调用方中途停止）时调用所有回调函数
+        
+        Args:
+            path (str): API路径
+            data (dict): 请求数据
+            make_chunk (callable): 把原始数据转换为StreamChunk的函数
+        
+        Yields:
+            StreamChunk: 数据块
+        """
+        metrics = RequestMetrics(path, data.get("model"))
+        error = None
+        cancelled = False
+        try:
+            for chunk in self._cached_chunks(path, data, make_chunk):
+                metrics.observe(chunk)
+                if chunk.done:
+                    metrics.finish()
+                    chunk.metrics = metrics
+                    emit(self.hooks, metrics)
+                yield chunk
+        except GeneratorExit:
+            cancelled = True
+            raise
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if metrics.finish(error, cancelled):
+                emit(self.hooks, metrics)
+    
+    def _cached_chunks(self, path, data, make_chunk):
+        """
+        发送请求并产出StreamChunk，启用缓存时先查找缓存，完整的响应会写入缓存
+        """
+        key = self.cache.key_for(path, data) if self.cache is not None else None
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                for chunk in self.cache.replay(cached):
+                    yield chunk
+                return
+        
+        accumulator = ResponseAccumulator()
+        with self._admit(data.get("model")):
+            for raw in self._fetch(path, data):
+                yield accumulator.add(make_chunk(raw))
+        if key is not None and accumulator.final is not None:
+            self.cache.put(key, accumulator.text, accumulator.final.data)
+    
+    def _prepare_chat(self, messages, model, stream, images, kwargs, retrieve=None):
+        """
+        构造chat请求数据，如果有图片则并行编码后全部添加到最后一条user消息中，
+        如果提供了retrieve则把检索到的段落作为system消息放在最前面
+        """
+        if images:
+            # 未指定模型时自动选择支持图片的模型
+            model = self._route(model, VISION)
+        elif model is None:
+            model = self.default_model
+        
+        if retrieve is not None:
+            query = next(
+                (message.get("content", "") for message in reversed(messages) if message.get("role") == "user"),
+                ""
+            )
+            passages = retrieve(query) if query else []
+            if passages:
+                # embeddings会导入NumPy，只在使用检索时才导入
+                from ollama_toolkit.embeddings import retrieval_message
+                messages = [retrieval_message(passages)] + list(messages)
+        
+        data = {
+            "model": model,
+            "messages": messages,
+            "stream": stream,
+            **kwargs
+        }
+        
+        if images:
+            # 读取图片并进行base64编码（会检查图片文件是否存在），并添加到消息中
+            encoded_images = self.image_encoder.encode_many(images)
+            data["messages"] = _attach_images(messages, encoded_images)
+        return data
     
-    def generate(self, prompt, model=None, stream=True, images=None, files=None, **kwargs):
+    def generate_stream(self, prompt, model=None, images=None, files=None, **kwargs):
+        """
+        流式生成文本响应
+        
+        Args:
+            prompt (str): 提示文本
+            model (str, optional): 要使用的模型名称，如果为None则使用默认模型
+            images (list, optional): 图片文件路径列表，提供时改用chat API
+            files (list, optional): 文本文件路径列表，内容过大时分块并发处理后再合并
+            **kwargs: 其他传递给Ollama API的参数
+        
+        Yields:
+            StreamChunk: 数据块，最后一个数据块的done为True并携带统计信息
+        """
+        # 如果有文件，由文件处理器读取并在需要时分块处理
+        if files:
+            for chunk in self.file_ingestor.stream(self, prompt, files, model=model, images=images, **kwargs):
+                yield chunk
+            return
+        
+        # 如果有图像，使用chat API而不是generate API
+        if images:
+            messages = [{"role": "user", "content": prompt}]
+            for chunk in self.chat_stream(messages, model=model, images=images, **kwargs):
+                yield chunk
+            return
+        
+        data = {
+            "model": model or self.default_model,
+            "prompt": prompt,
+            "stream": True,
+            **kwargs
+        }
+        for chunk in self._chunks("/api/generate", data, StreamChunk.from_generate):
+            yield chunk
+    
+    def generate(self, prompt, model=None, stream=True, images=None, files=None, sink=None, **kwargs):
         """
         生成文本响应
         
@@ -29,234 +565,401 @@ class OllamaClient:
             model (str, optional): 要使用的模型名称，如果为None则使用默认模型
             stream (bool, optional): 是否启用流式输出，默认为True
             images (list, optional): 图片文件路径列表
-            files (list, optional): 其他文件路径列表
+            files (list, optional): 文本文件路径列表，内容过大时分块并发处理后再合并
+            sink (callable or file-like, optional): 接收输出文本的函数或带有write方法的对象，
+                为None时不输出任何内容
             **kwargs: 其他传递给Ollama API的参数
         
         Returns:
             str: 完整的响应文本
         """
-        if model is None:
-            model = self.default_model
+        accumulator = ResponseAccumulator(sink)
+        
+        # 文件处理包含多次请求，统一通过流式接口完成
+        if files:
+            return accumulator.consume(
+                self.generate_stream(prompt, model=model, images=images, files=files, **kwargs)
+            )
         
         # 如果有图像，使用chat API而不是generate API
         if images:
-            # 准备消息
             messages = [{"role": "user", "content": prompt}]
-            
-            # 对于带图像的请求，使用非流式响应以确保正确获取完整内容
-            # 并提供有用的提示信息
-            print(f"检测到图片，使用{model}模型进行图像分析...")
-            print(f"提示：分析图片可能需要较多系统资源，这是正常的")
-            
             return self.chat(
                 messages=messages,
                 model=model,
-                stream=False,  # 禁用流式响应，确保完整获取响应内容
+                stream=stream,
                 images=images,
+                sink=sink,
                 **kwargs
             )
         
-        url = f"{self.base_url}/api/generate"
+        # 处理流式响应
+        if stream:
+            return accumulator.consume(self.generate_stream(prompt, model=model, **kwargs))
         
-        # 准备请求数据
+        # 非流式响应
         data = {
-            "model": model,
+            "model": model or self.default_model,
             "prompt": prompt,
-            "stream": stream,
+            "stream": False,
             **kwargs
         }
+        return accumulator.consume(self._chunks("/api/generate", data, StreamChunk.from_generate))
+    
+    def generate_structured(self, prompt, schema=None, model=None, images=None, depth=1, **kwargs):
+        """
+        按JSON Schema生成结构化输出，字段和数组元素一旦完整就立即产出
         
-        # 发送请求
-        response = self.session.post(url, json=data, stream=stream)
+        Args:
+            prompt (str): 提示文本
+            schema (dict, optional): JSON Schema（也可以是pydantic模型类），为None时只要求输出JSON
+            model (str, optional): 要使用的模型名称，如果为None则使用默认模型
+            images (list, optional): 图片文件路径列表
+            depth (int): 产出路径长度不超过depth的值，例如schema为{"items": [...]}时
+                depth=2可以在每条记录完整时立即得到("items", i)
+            **kwargs: 其他传递给Ollama API的参数
         
-        try:
-            response.raise_for_status()
-        except requests.exceptions.HTTPError as e:
-            print(f"HTTP错误: {e}")
-            print(f"错误响应内容: {response.text}")
-            raise
+        Yields:
+            tuple: (path, value)，最后一项是整个文档，路径为()
         
-        full_response = ""
+        Raises:
+            StructuredOutputError: 输出不是合法的JSON或违反了Schema，此时生成已被中断
+        """
+        schema = schema_dict(schema)
+        chunks = self.generate_stream(prompt, model=model, images=images, format=schema or "json", **kwargs)
+        for event in iter_structured(chunks, schema, depth):
+            yield event
+    
+    def generate_json(self, prompt, schema=None, model=None, images=None, **kwargs):
+        """
+        按JSON Schema生成结构化输出，返回解析并校验后的整个文档
         
-        # 处理流式响应
-        if stream:
-            for line in response.iter_lines():
-                if line:
-                    try:
-                        chunk = json.loads(line)
-                        # 提取响应文本
-                        if "response" in chunk:
-                            print(chunk["response"], end="", flush=True)
-                            full_response += chunk["response"]
-                        # 检查是否完成
-                        if chunk.get("done", False):
-                            print()  # 输出换行
-                            break
-                    except json.JSONDecodeError:
-                        continue
-        else:
-            # 非流式响应
-            result = response.json()
-            full_response = result.get("response", "")
-            print(full_response)
+        Returns:
+            dict or list: 解析后的JSON
         
-        return full_response
+        Raises:
+            StructuredOutputError: 输出不是合法的JSON或违反了Schema
+        """
+        for path, value in self.generate_structured(prompt, schema, model=model, images=images, depth=0, **kwargs):
+            result = value
+        return result
     
-    def list_models(self):
+    def list_models(self, refresh=False):
         """
-        列出可用的模型
+        列出可用的模型，结果在catalog_ttl秒内会被缓存
+        
+        Args:
+            refresh (bool): 是否忽略缓存重新请求
         
         Returns:
             list: 模型列表
         """
-        url = f"{self.base_url}/api/tags"
-        response = self.session.get(url)
-        response.raise_for_status()
-        data = response.json()
-        return data.get("models", [])
+        return self.catalog.models(refresh=refresh)
     
-    def chat(self, messages, model=None, stream=True, images=None, **kwargs):
+    def running_models(self):
         """
-        使用聊天模式与模型交互
+        每个节点当前已加载到内存中的模型
+        
+        Returns:
+            dict: 节点URL -> /api/ps返回的模型列表，无法访问的节点对应的值为异常对象
+        """
+        return provision.running_models(self)
+    
+    def preload(self, models=None, keep_alive=None, concurrency=4):
+        """
+        把模型加载到（每个节点的）内存中，避免第一个请求承担加载模型的开销
+        
+        Args:
+            models (str or list, optional): 模型名称或列表，默认为默认模型
+            keep_alive (str or int, optional): 模型保持加载的时间，例如"30m"，-1表示一直保持
+            concurrency (int): 同时执行的最大请求数
+        
+        Returns:
+            list: 每个(节点URL, 模型)的BatchResult，output为加载耗时（秒）
+        """
+        if isinstance(models, str):
+            models = [models]
+        return provision.preload(self, models or [self.default_model], keep_alive, concurrency)
+    
+    def unload(self, models=None, concurrency=4):
+        """
+        立即从（每个节点的）内存中卸载模型
+        
+        Args:
+            models (str or list, optional): 模型名称或列表，为None时卸载所有已加载的模型
+            concurrency (int): 同时执行的最大请求数
+        
+        Returns:
+            list: 每个(节点URL, 模型)的BatchResult
+        """
+        if isinstance(models, str):
+            models = [models]
+        return provision.unload(self, models, concurrency)
+    
+    def warm_up(self, models=None, keep_alive=None, prompt="hi", concurrency=4):
+        """
+        服务启动时预热：加载模型并执行一个只生成一个token的请求，详见provision.warm_up
+        
+        Returns:
+            list: 每个(节点URL, 模型)的BatchResult，output为{"load": 秒数, "first_token": 秒数}
+        """
+        if isinstance(models, str):
+            models = [models]
+        return provision.warm_up(self, models, keep_alive, prompt, concurrency)
+    
+    def pull_many(self, models, concurrency=3, on_progress=None, **kwargs):
+        """
+        并发地拉取多个模型，连接中断时自动从断点继续，详见provision.pull_many
+        
+        Args:
+            models (list): 模型名称列表
+            concurrency (int): 同时拉取的最大模型数
+            on_progress (callable, optional): 每收到一个状态时以provision.PullProgress为参数调用
+            **kwargs: retry、skip_existing、insecure
+        
+        Returns:
+            list: 每个(节点URL, 模型)的BatchResult，output为"success"或"exists"
+        """
+        return provision.pull_many(self, models, concurrency=concurrency, on_progress=on_progress, **kwargs)
+    
+    def embed(self, inputs, model=None, batch_size=64, concurrency=4, **kwargs):
+        """
+        计算文本的嵌入向量，输入会被分批并发地发送到/api/embed
+        
+        Args:
+            inputs (iterable): 文本迭代器，按需读取
+            model (str, optional): 嵌入模型名称，默认为embeddings.EMBED_MODEL（未安装时使用其他嵌入模型）
+            batch_size (int): 每次请求包含的文本数
+            concurrency (int): 同时执行的最大请求数
+            **kwargs: 其他传递给Ollama API的参数（例如truncate、keep_alive）
+        
+        Returns:
+            list: 与输入顺序一致的嵌入向量列表
+        """
+        from ollama_toolkit.embeddings import EMBED_MODEL
+        
+        model = self._route(model, EMBEDDING, preferred=EMBED_MODEL)
+        
+        def batches():
+            batch = []
+            for text in inputs:
+                batch.append(text)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        
+        def call(batch):
+            data = {"model": model, "input": batch, **kwargs}
+            with self._admit(model):
+                return self._post("/api/embed", data, stream=False).json()["embeddings"]
+        
+        self._ensure_pool_size(concurrency)
+        embeddings = []
+        for result in run_many(call, batches(), concurrency=concurrency, ordered=True):
+            if not result.ok:
+                raise result.error
+            embeddings.extend(result.output)
+        return embeddings
+    
+    def chat_stream(self, messages, model=None, images=None, retrieve=None, **kwargs):
+        """
+        流式地使用聊天模式与模型交互
         
         Args:
             messages (list): 消息历史列表，每个消息包含role和content
             model (str, optional): 要使用的模型名称，如果为None则使用默认模型
+            images (list, optional): 图像文件路径列表
+            retrieve (callable, optional): 接收最后一条user消息内容、返回相关段落列表的函数
+                （例如embeddings.Retriever），检索结果会作为system消息放在对话最前面
+            **kwargs: 其他传递给Ollama API的参数
+        
+        Yields:
+            StreamChunk: 数据块，最后一个数据块的done为True并携带统计信息
+        """
+        data = self._prepare_chat(messages, model, True, images, kwargs, retrieve)
+        for chunk in self._chunks("/api/chat", data, StreamChunk.from_chat):
+            yield chunk
+    
+    def chat(self, messages, model=None, stream=True, images=None, sink=None, retrieve=None, history=None,
+             **kwargs):
+        """
+        使用聊天模式与模型交互
+        
+        Args:
+            messages (list): 消息历史列表，每个消息包含role和content；提供history时只需包含本轮的新消息
+            model (str, optional): 要使用的模型名称，如果为None则使用默认模型
             stream (bool, optional): 是否启用流式输出，默认为True
             images (list, optional): 图像文件路径列表
+            sink (callable or file-like, optional): 接收输出文本的函数或带有write方法的对象，
+                为None时不输出任何内容
+            retrieve (callable, optional): 接收最后一条user消息内容、返回相关段落列表的函数，
+                检索结果会作为system消息放在对话最前面
+            history (ChatLog or str, optional): 持久化的会话（history.ChatLog）或会话名称（保存在
+                默认目录中），保存的摘要和预算内的最近消息会放在messages之前发送，请求成功后本轮的消息和回复
+                追加到会话
             **kwargs: 其他传递给Ollama API的参数
         
         Returns:
             str: 最新的响应文本
         """
-        if model is None:
-            model = self.default_model
+        if history is not None:
+            if isinstance(history, str):
+                from ollama_toolkit.history import SessionStore
+                
+                with SessionStore().open(history) as log:
+                    return self.chat(messages, model=model, stream=stream, images=images, sink=sink,
+                                     retrieve=retrieve, history=log, **kwargs)
+            response = self.chat(history.context() + list(messages), model=model, stream=stream, images=images,
+                                 sink=sink, retrieve=retrieve, **kwargs)
+            history.extend(messages)
+            history.append({"role": "assistant", "content": response})
+            return response
         
-        url = f"{self.base_url}/api/chat"
+        accumulator = ResponseAccumulator(sink)
         
-        # 准备请求数据
-        data = {
-            "model": model,
-            "messages": messages,
-            "stream": stream,
-            **kwargs
-        }
+        # 处理流式响应
+        if stream:
+            return accumulator.consume(
+                self.chat_stream(messages, model=model, images=images, retrieve=retrieve, **kwargs)
+            )
         
-        # 发送请求
-        if images and len(images) > 0:
-            # 首先检查图片文件是否存在
-            if not os.path.exists(images[0]):
-                raise FileNotFoundError(f"图片文件不存在: {images[0]}")
-            
-            print(f"正在使用{model}模型分析图片: {images[0]}")
-            print(f"注意：Ollama处理图片可能需要较多资源，请确保系统有足够内存")
-            
-            try:
-                # 读取图片并进行base64编码
-                with open(images[0], 'rb') as f:
-                    image_data = f.read()
-                    base64_image = base64.b64encode(image_data).decode('utf-8')
-                
-                # 为消息添加图片数据 - 使用Ollama API支持的方式
-                messages_with_image = messages.copy()
-                
-                # 在最后一条消息中添加images字段（正确的Ollama API格式）
-                if messages_with_image and "content" in messages_with_image[-1]:
-                    # 确保最后一条消息是user角色
-                    if messages_with_image[-1]["role"] == "user":
-                        # 直接在原始消息中添加images字段
-                        messages_with_image[-1]["images"] = [base64_image]
-                    else:
-                        # 如果最后一条消息不是user角色，则添加一条新的user消息
-                        messages_with_image.append({
-                            "role": "user",
-                            "content": "请分析这张图片",
-                            "images": [base64_image]
-                        })
-                else:
-                    # 如果消息列表为空或最后一条消息没有content字段，则创建一条新消息
-                    messages_with_image.append({
-                        "role": "user",
-                        "content": "请分析这张图片",
-                        "images": [base64_image]
-                    })
-                
-                # 更新数据
-                data["messages"] = messages_with_image
-                
-                # 使用JSON格式发送请求
-                response = self.session.post(url, json=data, stream=stream)
-            except Exception as e:
-                print(f"图片处理过程中出错: {str(e)}")
-                print("提示：Ollama处理图片可能需要较多内存，请确保系统有足够资源")
-                print("      也可能是模型不支持图片分析，请确认使用的是支持多模态的模型")
-                raise
-        else:
-            # 没有图像时，使用JSON格式
-            response = self.session.post(url, json=data, stream=stream)
+        # 非流式响应
+        data = self._prepare_chat(messages, model, False, images, kwargs, retrieve)
+        return accumulator.consume(self._chunks("/api/chat", data, StreamChunk.from_chat))
+    
+    def chat_structured(self, messages, schema=None, model=None, images=None, retrieve=None, depth=1, **kwargs):
+        """
+        在聊天模式中按JSON Schema生成结构化输出，字段和数组元素一旦完整就立即产出
         
-        # 添加详细的错误处理
-        try:
-            response.raise_for_status()
-        except requests.exceptions.HTTPError as e:
-            error_msg = f"HTTP错误: {e}"
-            if hasattr(response, 'text'):
-                error_msg += f"\n错误响应内容: {response.text}"
-                
-                # 检查是否是资源限制错误
-                if "resource limitations" in response.text:
-                    error_msg += "\n\n提示：这可能是由于Ollama服务器资源不足导致的。\n"
-                    error_msg += "      建议：\n"
-                    error_msg += "      1. 关闭其他占用内存的程序\n"
-                    error_msg += "      2. 尝试使用更小的模型\n"
-                    error_msg += "      3. 增加系统内存\n"
-                    error_msg += "      4. 检查Ollama服务器日志获取更多详细信息"
-                
-                # 检查是否是模型问题
-                if "model runner" in response.text:
-                    error_msg += "\n\n提示：这可能是由于模型运行器出现问题。\n"
-                    error_msg += "      建议：\n"
-                    error_msg += "      1. 尝试重新拉取模型: ollama pull model_name\n"
-                    error_msg += "      2. 重启Ollama服务\n"
-                    error_msg += "      3. 检查Ollama服务器日志"
-        
-            print(error_msg)
-            raise
+        Args:
+            messages (list): 消息历史列表，每个消息包含role和content
+            schema (dict, optional): JSON Schema（也可以是pydantic模型类），为None时只要求输出JSON
+            model (str, optional): 要使用的模型名称，如果为None则使用默认模型
+            images (list, optional): 图像文件路径列表
+            retrieve (callable, optional): 接收最后一条user消息内容、返回相关段落列表的函数
+            depth (int): 产出路径长度不超过depth的值
+            **kwargs: 其他传递给Ollama API的参数
         
-        full_response = ""
+        Yields:
+            tuple: (path, value)，最后一项是整个文档，路径为()
         
-        # 处理流式响应
-        if stream:
-            for line in response.iter_lines():
-                if line:
-                    try:
-                        chunk = json.loads(line)
-                        # 提取响应文本
-                        if "message" in chunk and "content" in chunk["message"]:
-                            print(chunk["message"]["content"], end="", flush=True)
-                            full_response += chunk["message"]["content"]
-                        # 检查是否完成
-                        if chunk.get("done", False):
-                            print()  # 输出换行
-                            break
-                    except json.JSONDecodeError:
-                        continue
+        Raises:
+            StructuredOutputError: 输出不是合法的JSON或违反了Schema，此时生成已被中断
+        """
+        schema = schema_dict(schema)
+        chunks = self.chat_stream(messages, model=model, images=images, retrieve=retrieve,
+                                  format=schema or "json", **kwargs)
+        for event in iter_structured(chunks, schema, depth):
+            yield event
+    
+    def chat_json(self, messages, schema=None, model=None, images=None, retrieve=None, **kwargs):
+        """
+        在聊天模式中按JSON Schema生成结构化输出，返回解析并校验后的整个文档
+        
+        Returns:
+            dict or list: 解析后的JSON
+        
+        Raises:
+            StructuredOutputError: 输出不是合法的JSON或违反了Schema
+        """
+        events = self.chat_structured(messages, schema, model=model, images=images, retrieve=retrieve,
+                                      depth=0, **kwargs)
+        for path, value in events:
+            result = value
+        return result
+    
+    def generate_many(self, prompts, concurrency=8, ordered=True, **kwargs):
+        """
+        并发地为多个提示生成响应
+        
+        Args:
+            prompts (iterable): 提示迭代器，每项可以是提示文本，也可以是传给generate的参数字典
+                （例如{"prompt": "...", "model": "llama3"}），按需读取
+            concurrency (int): 同时执行的最大请求数
+            ordered (bool): 为True时按输入顺序返回结果，否则按完成顺序返回
+            **kwargs: 所有请求共用的generate参数，默认stream=False
+        
+        Yields:
+            BatchResult: 每个输入的执行结果，单个输入失败时错误记录在error中，不会中断整个批次
+        """
+        kwargs.setdefault("stream", False)
+        
+        def call(item):
+            if isinstance(item, dict):
+                params = dict(kwargs)
+                params.update(item)
+                return self.generate(**params)
+            return self.generate(item, **kwargs)
+        
+        self._ensure_pool_size(concurrency)
+        return run_many(call, prompts, concurrency=concurrency, ordered=ordered)
+    
+    def chat_many(self, conversations, concurrency=8, ordered=True, **kwargs):
+        """
+        并发地执行多个聊天请求
+        
+        Args:
+            conversations (iterable): 对话迭代器，每项可以是消息列表，也可以是传给chat的参数字典
+                （例如{"messages": [...], "model": "llama3"}），按需读取
+            concurrency (int): 同时执行的最大请求数
+            ordered (bool): 为True时按输入顺序返回结果，否则按完成顺序返回
+            **kwargs: 所有请求共用的chat参数，默认stream=False
+        
+        Yields:
+            BatchResult: 每个输入的执行结果，单个输入失败时错误记录在error中，不会中断整个批次
+        """
+        kwargs.setdefault("stream", False)
+        
+        def call(item):
+            if isinstance(item, dict):
+                params = dict(kwargs)
+                params.update(item)
+                return self.chat(**params)
+            return self.chat(item, **kwargs)
+        
+        self._ensure_pool_size(concurrency)
+        return run_many(call, conversations, concurrency=concurrency, ordered=ordered)
+    
+    def stream_chunks(self, path, data, make_chunk):
+        """
+        发送流式请求并逐个产出StreamChunk，与generate_stream/chat_stream一样使用缓存、重试和性能指标，
+        供网关等需要转发任意请求数据的调用方使用
+        
+        Args:
+            path (str): API路径，例如"/api/generate"
+            data (dict): 请求数据，原样发送
+            make_chunk (callable): 把原始数据转换为StreamChunk的函数，例如StreamChunk.from_generate
+        
+        Yields:
+            StreamChunk: 数据块
+        """
+        return self._chunks(path, data, make_chunk)
+    
+    def forward(self, method, path, data=None):
+        """
+        原样转发API请求（例如/api/pull、/api/tags），并以流的方式读取响应；
+        上游返回的HTTP错误不会抛出，而是连同响应内容一起返回
+        
+        Args:
+            method (str): HTTP方法
+            path (str): API路径
+            data (dict, optional): 请求数据
+        
+        Returns:
+            tuple: (HTTP状态码, Content-Type, 产出响应体字节块的迭代器)
+        
+        Raises:
+            requests.exceptions.RequestException: 无法连接上游节点
+        """
+        try:
+            response = self._request(method, path, data, stream=True)
+        except requests.exceptions.HTTPError as e:
+            if e.response is None:
+                raise
+            response = e.response
+            body = iter([response.content])
         else:
-            # 非流式响应 - 添加更详细的调试信息
-            try:
-                result = response.json()
-                print(f"完整响应: {result}")
-                if "message" in result and "content" in result["message"]:
-                    full_response = result["message"]["content"]
-                    print(full_response)
-                else:
-                    print("响应中未找到message.content字段")
-                    # 尝试直接获取响应文本
-                    full_response = response.text
-                    print(f"直接响应文本: {full_response}")
-            except json.JSONDecodeError:
-                print("解析JSON响应失败，尝试直接获取响应文本")
-                full_response = response.text
-                print(f"直接响应文本: {full_response}")
-        
-        return full_response
\ No newline at end of file
+            body = self._iter_raw(response)
+        return response.status_code, response.headers.get("Content-Type", "application/json"), body
@@ -0,0 +1,224 @@
+"""
+多节点路由：按未完成请求数选择节点，优先选择已加载所需模型的节点，
+连续失败的节点会被暂时剔除，并由后台健康检查在恢复后重新加入
+"""
+
+import threading
+
+import requests
+
+
+class Node:
+    """
+    一个Ollama节点的状态
+
+    Attributes:
+        url (str): 节点的基础URL
+        outstanding (int): 未完成的请求数
+        healthy (bool): 是否参与路由
+        failures (int): 连续失败次数
+        loaded (set): 已加载到内存中的模型名称
+        requests (int): 已路由到该节点的请求总数
+    """
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.outstanding = 0
+        self.healthy = True
+        self.failures = 0
+        self.loaded = set()
+        self.requests = 0
+        self.last_error = None
+
+    def __repr__(self):
+        state = "healthy" if self.healthy else "ejected"
+        return f"Node({self.url!r}, {state}, outstanding={self.outstanding})"
+
+
+class NoHealthyNodeError(requests.exceptions.ConnectionError):
+    """
+    所有节点都不可用
+    """
+
+
+class NodePool:
+    """
+    Ollama节点池
+
+    用法:
+        client = OllamaClient(base_url=["http://gpu1:11434", "http://gpu2:11434"])
+        print(client.pool.nodes)
+    """
+    def __init__(self, urls, max_failures=3, probe_interval=10.0, probe_timeout=3.0, affinity=2):
+        """
+        Args:
+            urls (list): 节点URL列表
+            max_failures (int): 连续失败多少次后剔除节点（连接失败会立即剔除）
+            probe_interval (float): 后台健康检查的间隔秒数
+            probe_timeout (float): 健康检查请求的超时秒数
+            affinity (int): 已加载所需模型的节点可以比其他节点多承担的未完成请求数
+        """
+        if not urls:
+            raise ValueError("至少需要一个节点URL")
+        self.nodes = [Node(url) for url in urls]
+        self.max_failures = max_failures
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.affinity = affinity
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._cursor = 0
+
+    def acquire(self, model=None, exclude=()):
+        """
+        选择一个节点并增加其未完成请求数
+
+        Args:
+            model (str, optional): 请求使用的模型
+            exclude (iterable): 本次请求中已经失败、不再尝试的节点
+
+        Returns:
+            Node: 选中的节点
+
+        Raises:
+            NoHealthyNodeError: 没有可用的节点
+        """
+        self._ensure_prober()
+        with self._lock:
+            candidates = [node for node in self.nodes if node.healthy and node not in exclude]
+            if not candidates:
+                raise NoHealthyNodeError("没有可用的Ollama节点: " + ", ".join(
+                    f"{node.url}（{node.last_error}）" for node in self.nodes
+                ))
+            # 轮转起点，使负载相同的节点轮流被选中
+            self._cursor = (self._cursor + 1) % len(candidates)
+            candidates = candidates[self._cursor:] + candidates[:self._cursor]
+
+            def load(node):
+                bonus = self.affinity if model and model in node.loaded else 0
+                return node.outstanding - bonus
+
+            node = min(candidates, key=load)
+            node.outstanding += 1
+            node.requests += 1
+            return node
+
+    def release(self, node, model=None, error=None):
+        """
+        请求结束后释放节点
+
+        Args:
+            node (Node): acquire返回的节点
+            model (str, optional): 请求使用的模型，成功时记为该节点已加载
+            error (Exception, optional): 请求失败的原因，为None表示成功
+        """
+        with self._lock:
+            node.outstanding -= 1
+            if error is None:
+                node.failures = 0
+                if model:
+                    node.loaded.add(model)
+                return
+            node.failures += 1
+            node.last_error = error
+            if isinstance(error, requests.exceptions.ConnectionError) or node.failures >= self.max_failures:
+                node.healthy = False
+
+    def mark_loaded(self, node, model, loaded=True):
+        """
+        记录模型已加载到节点（或已从节点卸载），用于预加载和卸载模型之后
+
+        Args:
+            node (Node): 节点
+            model (str): 模型名称
+            loaded (bool): 为False时记为已卸载
+        """
+        with self._lock:
+            if loaded:
+                node.loaded.add(model)
+            else:
+                node.loaded.discard(model)
+
+    def abandon(self, node):
+        """
+        释放节点但不记录结果，用于请求没有发出的情况（例如熔断器处于打开状态）
+        """
+        with self._lock:
+            node.outstanding -= 1
+
+    def _ensure_prober(self):
+        if self._thread is None and self.probe_interval:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._probe_loop, name="ollama-node-probe", daemon=True)
+                    self._thread.start()
+
+    def _probe_loop(self):
+        session = requests.Session()
+        while not self._stop.wait(self.probe_interval):
+            for node in self.nodes:
+                self.probe(node, session)
+        session.close()
+
+    def probe(self, node, session=None):
+        """
+        检查节点健康状态（/api/tags），并刷新其已加载的模型（/api/ps）
+
+        Returns:
+            bool: 节点是否健康
+        """
+        session = session or requests
+        try:
+            response = session.get(f"{node.url}/api/tags", timeout=self.probe_timeout)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            with self._lock:
+                node.last_error = e
+                node.healthy = False
+            return False
+
+        loaded = None
+        try:
+            response = session.get(f"{node.url}/api/ps", timeout=self.probe_timeout)
+            if response.ok:
+                loaded = {model["name"] for model in response.json().get("models", [])}
+        except (requests.exceptions.RequestException, ValueError, KeyError):
+            pass
+
+        with self._lock:
+            if not node.healthy:
+                node.failures = 0
+                node.healthy = True
+            if loaded is not None:
+                node.loaded = loaded
+        return True
+
+    def close(self):
+        """
+        停止后台健康检查
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.probe_timeout + 1)
+            self._thread = None
+
+    @property
+    def stats(self):
+        """
+        各节点的状态
+
+        Returns:
+            list: 每个节点一个字典
+        """
+        with self._lock:
+            return [
+                {
+                    "url": node.url,
+                    "healthy": node.healthy,
+                    "outstanding": node.outstanding,
+                    "requests": node.requests,
+                    "failures": node.failures,
+                    "loaded": sorted(node.loaded),
+                }
+                for node in self.nodes
+            ]
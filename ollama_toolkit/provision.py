@@ -0,0 +1,347 @@
+"""
+模型驻留管理：预加载、卸载、服务启动时的预热，以及并发拉取模型
+
+多节点客户端的每个操作都会作用于所有节点，预加载成功的模型会被记为该节点已加载，
+之后的请求优先路由到这些节点。
+"""
+
+import threading
+import time
+
+import requests
+
+from ollama_toolkit.batch import run_many
+from ollama_toolkit.catalog import EMBEDDING
+from ollama_toolkit.ndjson import iter_ndjson
+from ollama_toolkit.resilience import RetryPolicy
+
+
+class PullError(Exception):
+    """
+    服务器在拉取过程中报告了错误（例如模型不存在）
+    """
+
+
+def node_urls(client):
+    """
+    客户端的所有节点URL
+    """
+    if client.pool is None:
+        return [client.base_url]
+    return [node.url for node in client.pool.nodes]
+
+
+def _node(client, url):
+    if client.pool is None:
+        return None
+    for node in client.pool.nodes:
+        if node.url == url:
+            return node
+    return None
+
+
+def _load_request(client, model, keep_alive):
+    """
+    加载或卸载模型的请求：不带提示的generate请求；嵌入模型不支持generate，改用空输入的embed请求
+    """
+    try:
+        info = client.catalog.info(model)
+    except requests.exceptions.RequestException:
+        info = None
+    if info is not None and info.supports(EMBEDDING):
+        path, data = "/api/embed", {"model": model, "input": []}
+    else:
+        path, data = "/api/generate", {"model": model, "stream": False}
+    if keep_alive is not None:
+        data["keep_alive"] = keep_alive
+    return path, data
+
+
+def preload(client, models, keep_alive=None, concurrency=4):
+    """
+    把模型加载到每个节点的内存中
+
+    Args:
+        client (OllamaClient): 客户端
+        models (list): 模型名称列表
+        keep_alive (str or int, optional): 模型保持加载的时间，例如"30m"，-1表示一直保持，
+            为None时使用服务器的默认值
+        concurrency (int): 同时执行的最大请求数
+
+    Returns:
+        list: 每个(节点URL, 模型)的BatchResult，output为加载耗时（秒）
+    """
+    def call(item):
+        url, model = item
+        path, data = _load_request(client, model, keep_alive)
+        started = time.perf_counter()
+        client._send("POST", url, path, data, stream=False)
+        node = _node(client, url)
+        if node is not None:
+            client.pool.mark_loaded(node, model)
+        return time.perf_counter() - started
+
+    items = [(url, model) for url in node_urls(client) for model in models]
+    return list(run_many(call, items, concurrency=concurrency))
+
+
+def running_models(client):
+    """
+    每个节点当前已加载的模型（/api/ps）
+
+    Returns:
+        dict: 节点URL -> 模型列表，无法访问的节点对应的值为异常对象
+    """
+    running = {}
+    for url in node_urls(client):
+        try:
+            running[url] = client._send("GET", url, "/api/ps", None, stream=False).json().get("models", [])
+        except requests.exceptions.RequestException as e:
+            running[url] = e
+    return running
+
+
+def unload(client, models=None, concurrency=4):
+    """
+    立即从每个节点的内存中卸载模型
+
+    Args:
+        client (OllamaClient): 客户端
+        models (list, optional): 模型名称列表，为None时卸载各节点上所有已加载的模型
+        concurrency (int): 同时执行的最大请求数
+
+    Returns:
+        list: 每个(节点URL, 模型)的BatchResult
+    """
+    if models is None:
+        items = []
+        for url, loaded in running_models(client).items():
+            if not isinstance(loaded, Exception):
+                items.extend((url, entry.get("name") or entry.get("model")) for entry in loaded)
+    else:
+        items = [(url, model) for url in node_urls(client) for model in models]
+
+    def call(item):
+        url, model = item
+        path, data = _load_request(client, model, 0)
+        client._send("POST", url, path, data, stream=False)
+        node = _node(client, url)
+        if node is not None:
+            client.pool.mark_loaded(node, model, loaded=False)
+
+    return list(run_many(call, items, concurrency=concurrency))
+
+
+def warm_up(client, models=None, keep_alive=None, prompt="hi", concurrency=4):
+    """
+    服务启动时预热：加载模型，再用一个只生成一个token的请求走一遍完整的推理路径，
+    使第一个真实请求不再承担冷启动的开销
+
+    Args:
+        client (OllamaClient): 客户端
+        models (list, optional): 模型名称列表，默认为客户端的默认模型
+        keep_alive (str or int, optional): 模型保持加载的时间
+        prompt (str): 预热请求的提示文本，为None时只加载模型
+        concurrency (int): 同时执行的最大请求数
+
+    Returns:
+        list: 每个(节点URL, 模型)的BatchResult，output为{"load": 加载秒数, "first_token": 预热请求的秒数}
+    """
+    models = list(models or [client.default_model])
+    loads = {result.input: result for result in preload(client, models, keep_alive, concurrency)}
+
+    def call(item):
+        loaded = loads[item]
+        if not loaded.ok:
+            raise loaded.error
+        if prompt is None:
+            return {"load": loaded.output, "first_token": None}
+        url, model = item
+        path, data = _load_request(client, model, keep_alive)
+        if path == "/api/embed":
+            data["input"] = [prompt]
+        else:
+            data.update(prompt=prompt, options={"num_predict": 1})
+        started = time.perf_counter()
+        client._send("POST", url, path, data, stream=False)
+        return {"load": loaded.output, "first_token": time.perf_counter() - started}
+
+    return list(run_many(call, list(loads), concurrency=concurrency))
+
+
+class PullProgress:
+    """
+    并发拉取的进度汇总：各模型各层的字节数累加为总进度
+
+    Attributes:
+        models (dict): (节点URL, 模型) -> 最新的状态文本
+        total (int): 已知的总字节数（发现新的层时会增加）
+        completed (int): 已下载的字节数
+        finished (int): 已完成的模型数
+        failed (int): 失败的模型数
+    """
+    def __init__(self, count):
+        self.count = count
+        self.models = {}
+        self.finished = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self._layers = {}
+        self._resumed = 0
+        self._lock = threading.Lock()
+
+    def update(self, key, data):
+        """
+        记录/api/pull返回的一个状态
+        """
+        with self._lock:
+            self.models[key] = data.get("status", "")
+            digest = data.get("digest")
+            if digest and data.get("total"):
+                layer = key + (digest,)
+                completed = data.get("completed") or 0
+                if layer not in self._layers:
+                    # 从断点继续时，之前已经下载的部分不计入本次的下载速度
+                    self._resumed += completed
+                self._layers[layer] = (data["total"], completed)
+
+    def finish(self, key, error=None):
+        with self._lock:
+            if error is None:
+                self.finished += 1
+                self.models[key] = "success"
+            else:
+                self.failed += 1
+                self.models[key] = f"error: {error}"
+
+    @property
+    def total(self):
+        with self._lock:
+            return sum(total for total, _ in self._layers.values())
+
+    @property
+    def completed(self):
+        with self._lock:
+            return sum(completed for _, completed in self._layers.values())
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self):
+        """
+        本次运行的平均下载速度（字节/秒）
+        """
+        elapsed = self.elapsed
+        return max(self.completed - self._resumed, 0) / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self):
+        """
+        按当前速度估计的剩余秒数，无法估计时返回None（尚未发现的层不计算在内）
+        """
+        rate = self.rate
+        if not rate:
+            return None
+        return max(self.total - self.completed, 0) / rate
+
+
+def _local_names(client, url):
+    entries = client._send("GET", url, "/api/tags", None, stream=False).json().get("models", [])
+    names = set()
+    for entry in entries:
+        for name in (entry.get("name"), entry.get("model")):
+            if name:
+                names.add(name)
+                if name.endswith(":latest"):
+                    names.add(name[:-len(":latest")])
+    return names
+
+
+def pull_many(client, models, concurrency=3, on_progress=None, retry=None, skip_existing=True, insecure=False):
+    """
+    并发地在每个节点上拉取模型
+
+    连接中断等暂时性错误会在退避后重试，Ollama会保留已下载的部分并从断点继续；
+    整个命令被中断后重新运行，已经拉取完成的模型会被跳过。
+
+    Args:
+        client (OllamaClient): 客户端
+        models (list): 模型名称列表
+        concurrency (int): 同时拉取的最大模型数
+        on_progress (callable, optional): 每收到一个状态时以PullProgress为参数调用
+        retry (RetryPolicy, optional): 重试策略，默认最多尝试5次
+        skip_existing (bool): 是否跳过节点上已经存在的模型，为False时总是检查更新
+        insecure (bool): 是否允许不安全的仓库连接
+
+    Returns:
+        list: 每个(节点URL, 模型)的BatchResult，output为"success"或"exists"
+    """
+    retry = retry or RetryPolicy(max_attempts=5, base_delay=1.0, max_delay=30.0)
+    items = [(url, model) for url in node_urls(client) for model in models]
+    progress = PullProgress(len(items))
+    existing = {}
+    existing_lock = threading.Lock()
+
+    def exists(url, model):
+        with existing_lock:
+            if url not in existing:
+                existing[url] = _local_names(client, url)
+            return model in existing[url]
+
+    def notify():
+        if on_progress is not None:
+            on_progress(progress)
+
+    def pull_once(url, model):
+        data = {"model": model, "stream": True}
+        if insecure:
+            data["insecure"] = True
+        response = client._send("POST", url, "/api/pull", data, stream=True)
+        try:
+            for status in iter_ndjson(response.iter_content(client.read_chunk_size)):
+                if "error" in status:
+                    raise PullError(f"{model}: {status['error']}")
+                progress.update((url, model), status)
+                notify()
+                if status.get("status") == "success":
+                    return
+        finally:
+            response.close()
+        # 流在success之前结束，视为连接中断
+        raise requests.exceptions.ChunkedEncodingError(f"{model}的拉取在完成前中断")
+
+    def pull(url, model):
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return pull_once(url, model)
+            except requests.exceptions.RequestException as e:
+                if not retry.should_retry(e, attempt):
+                    raise
+                progress.update((url, model), {"status": f"重试（第{attempt}次失败: {e}）"})
+                notify()
+                time.sleep(retry.delay(attempt))
+
+    def call(item):
+        url, model = item
+        try:
+            if skip_existing and exists(url, model):
+                outcome = "exists"
+            else:
+                pull(url, model)
+                outcome = "success"
+        except Exception as e:
+            progress.finish(item, e)
+            notify()
+            raise
+        progress.finish(item)
+        notify()
+        return outcome
+
+    results = list(run_many(call, items, concurrency=concurrency))
+    # 新拉取的模型需要出现在模型目录中
+    client.catalog.invalidate()
+    return results
@@ -0,0 +1,79 @@
+"""
+终端输出：把流式响应的token合并为按帧率限制的写入
+
+逐个token写入并刷新终端时，每个token都是一次系统调用和一次终端重绘；生成速度很快时，
+这部分开销会超过解析响应本身。FrameRenderer把同一帧内到达的文本合并为一次写入，
+如果之后不再有新的token，缓冲的文本会在这一帧结束时由定时器写出，不会滞留。
+"""
+
+import sys
+import threading
+import time
+
+
+class FrameRenderer:
+    """
+    按帧率限制写入次数的输出目标，可以直接作为sink使用
+
+    用法:
+        renderer = FrameRenderer(fps=30)
+        client.chat(messages, sink=renderer)
+        renderer.flush()                  # 响应结束后立即写出剩余的文本
+    """
+    def __init__(self, stream=None, fps=30):
+        """
+        Args:
+            stream (file-like, optional): 输出目标，默认为sys.stdout
+            fps (float): 每秒最多写入的次数，为0时每段文本都立即写入
+        """
+        self.stream = stream if stream is not None else sys.stdout
+        self.interval = 1.0 / fps if fps else 0.0
+        self.writes = 0
+        self._buffer = []
+        self._last = 0.0
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        """
+        写入一段文本，距离上一次写入不足一帧时先缓冲
+        """
+        if not text:
+            return
+        with self._lock:
+            self._buffer.append(text)
+            now = time.monotonic()
+            if now - self._last >= self.interval:
+                self._flush(now)
+            elif self._timer is None:
+                # 这一帧结束时写出，避免最后几个token等到下一个token到达才显示
+                self._timer = threading.Timer(self._last + self.interval - now, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """
+        立即写出缓冲的文本
+        """
+        with self._lock:
+            self._flush(time.monotonic())
+
+    def _flush(self, now):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._buffer:
+            self.stream.write("".join(self._buffer))
+            self.stream.flush()
+            self._buffer = []
+            self.writes += 1
+            self._last = now
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
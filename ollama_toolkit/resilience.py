@@ -0,0 +1,368 @@
+"""
+请求的容错策略：连接/读取超时、首个token截止时间、带抖动退避的重试、按节点的熔断器，
+以及在首个token迟迟未到达时发出备份请求的对冲（hedging）
+"""
+
+import queue
+import random
+import threading
+import time
+
+import requests
+
+
+class FirstTokenTimeout(requests.exceptions.Timeout):
+    """
+    在截止时间内没有收到第一个数据块
+    """
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    节点的熔断器处于打开状态，请求未被发送
+    """
+
+
+def is_transient(error):
+    """
+    判断错误是否是暂时性的：连接失败、超时、熔断、429以及服务器5xx错误（包括资源不足、模型运行器异常）
+
+    Args:
+        error (Exception): 请求过程中出现的异常
+
+    Returns:
+        bool: 重试（或换节点重试）是否可能成功
+    """
+    if isinstance(error, requests.exceptions.HTTPError):
+        response = error.response
+        return response is None or response.status_code >= 500 or response.status_code == 429
+    return isinstance(error, (
+        requests.exceptions.ConnectionError,
+        requests.exceptions.Timeout,
+        requests.exceptions.ChunkedEncodingError,
+    ))
+
+
+class RetryPolicy:
+    """
+    带完全抖动（full jitter）指数退避的重试策略
+    """
+    def __init__(self, max_attempts=3, base_delay=0.5, max_delay=8.0, retry_on=is_transient):
+        """
+        Args:
+            max_attempts (int): 包括第一次在内的最大尝试次数
+            base_delay (float): 第一次重试前的平均等待秒数
+            max_delay (float): 单次等待的上限秒数
+            retry_on (callable): 判断异常是否可以重试的函数
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_on = retry_on
+
+    def should_retry(self, error, attempt):
+        """
+        Args:
+            error (Exception): 本次尝试的异常
+            attempt (int): 已经进行的尝试次数（从1开始）
+        """
+        return attempt < self.max_attempts and self.retry_on(error)
+
+    def delay(self, attempt):
+        """
+        第attempt次尝试失败后的等待秒数
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+
+class CircuitBreaker:
+    """
+    熔断器：连续失败达到阈值后在reset_timeout秒内拒绝请求，之后放行一个试探请求，
+    试探成功则恢复，失败则继续熔断
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        判断是否放行请求
+        """
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial = False
+            if self.state == self.HALF_OPEN:
+                if self._trial:
+                    return False
+                self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+
+class HedgePolicy:
+    """
+    对冲策略：如果在最近首个token延迟的某个百分位时间内还没有收到第一个数据块，
+    就再发出一个相同的请求，先产出数据的请求胜出，另一个被取消
+    """
+    def __init__(self, percentile=95, min_samples=20, window=200, min_delay=0.05, initial_delay=None):
+        """
+        Args:
+            percentile (float): 触发对冲的首个token延迟百分位
+            min_samples (int): 样本不足时使用initial_delay（为None时不对冲）
+            window (int): 保留的最近样本数
+            min_delay (float): 对冲等待的下限秒数
+            initial_delay (float, optional): 样本不足时使用的对冲等待秒数
+        """
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window = window
+        self.min_delay = min_delay
+        self.initial_delay = initial_delay
+        self.hedges = 0
+        self.wins = 0
+        self._samples = []
+        self._lock = threading.Lock()
+
+    def record(self, ttft):
+        """
+        记录一次首个token延迟（秒）
+        """
+        with self._lock:
+            self._samples.append(ttft)
+            if len(self._samples) > self.window:
+                del self._samples[0]
+
+    def record_hedge(self):
+        """
+        记录一次发出的备份请求
+        """
+        with self._lock:
+            self.hedges += 1
+
+    def record_win(self):
+        """
+        记录一次备份请求胜出
+        """
+        with self._lock:
+            self.wins += 1
+
+    def delay(self):
+        """
+        当前的对冲等待秒数，为None时不对冲
+        """
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return self.initial_delay
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return max(self.min_delay, ordered[index])
+
+
+class ResiliencePolicy:
+    """
+    OllamaClient的容错配置
+
+    用法:
+        policy = ResiliencePolicy(connect_timeout=3, read_timeout=120, first_token_timeout=60,
+                                  retry=RetryPolicy(max_attempts=3), hedge=HedgePolicy(percentile=95))
+        client = OllamaClient(resilience=policy)
+    """
+    def __init__(self, connect_timeout=5.0, read_timeout=300.0, first_token_timeout=None,
+                 retry=None, breaker_threshold=5, breaker_reset=30.0, hedge=None):
+        """
+        Args:
+            connect_timeout (float): 建立连接的超时秒数
+            read_timeout (float): 两次收到数据之间的最长间隔秒数（非流式请求即整个生成过程）
+            first_token_timeout (float, optional): 流式请求收到第一个数据块的截止秒数
+            retry (RetryPolicy, optional): 重试策略，默认为RetryPolicy()；只在尚未向调用方产出数据时重试
+            breaker_threshold (int): 每个节点连续失败多少次后熔断，为0时不熔断
+            breaker_reset (float): 熔断后多少秒放行试探请求
+            hedge (HedgePolicy, optional): 流式请求的对冲策略，为None时不对冲
+        """
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.first_token_timeout = first_token_timeout
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.hedge = hedge
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    @property
+    def timeout(self):
+        """
+        传给requests的(连接, 读取)超时
+        """
+        return (self.connect_timeout, self.read_timeout)
+
+    def breaker(self, endpoint):
+        """
+        返回某个节点的熔断器，未启用熔断时返回None
+        """
+        if not self.breaker_threshold:
+            return None
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = self._breakers[endpoint] = CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+            return breaker
+
+    @property
+    def races(self):
+        """
+        流式请求是否需要通过后台线程读取（设置了首个token截止时间或对冲）
+        """
+        return bool(self.first_token_timeout) or self.hedge is not None
+
+
+class _Attempt(threading.Thread):
+    """
+    在后台线程中发出一次流式请求，把数据块放入共享队列
+    """
+    def __init__(self, open_response, iterate, events):
+        super().__init__(daemon=True)
+        self.open_response = open_response
+        self.iterate = iterate
+        self.events = events
+        self.cancelled = False
+        self.response = None
+        self._lock = threading.Lock()
+
+    def run(self):
+        try:
+            response = self.open_response()
+            with self._lock:
+                self.response = response
+                cancelled = self.cancelled
+            if cancelled:
+                # 让iterate直接结束并释放资源（例如多节点模式下占用的节点）
+                response.cancelled = True
+            for chunk in self.iterate(response):
+                if self.cancelled:
+                    return
+                self.events.put(("chunk", self, chunk))
+            self.events.put(("end", self, None))
+        except Exception as e:
+            if not self.cancelled:
+                self.events.put(("error", self, e))
+
+    def cancel(self):
+        """
+        取消请求：关闭连接，正在读取的线程会随之结束
+        """
+        with self._lock:
+            self.cancelled = True
+            response = self.response
+        if response is not None:
+            # 标记为主动取消，避免被当作节点故障
+            response.cancelled = True
+            try:
+                response.close()
+            except Exception:
+                pass
+
+
+def race_stream(open_response, iterate, first_token_timeout=None, hedge=None):
+    """
+    发出流式请求，在截止时间内等待第一个数据块，必要时发出对冲请求
+
+    Args:
+        open_response (callable): 发出请求并返回requests.Response的函数
+        iterate (callable): 从响应中逐个读取原始数据块的函数
+        first_token_timeout (float, optional): 第一个数据块的截止秒数
+        hedge (HedgePolicy, optional): 对冲策略
+
+    Yields:
+        dict: 胜出请求的原始数据块
+
+    Raises:
+        FirstTokenTimeout: 在截止时间内所有请求都没有产出数据
+    """
+    events = queue.Queue()
+    started = time.monotonic()
+    attempts = [_Attempt(open_response, iterate, events)]
+    attempts[0].start()
+    hedge_delay = hedge.delay() if hedge is not None else None
+    hedged = False
+    winner = None
+    last_error = None
+    try:
+        # 等待第一个数据块
+        while winner is None:
+            deadlines = []
+            if first_token_timeout:
+                deadlines.append(started + first_token_timeout)
+            if hedge_delay is not None and not hedged:
+                deadlines.append(started + hedge_delay)
+            timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            try:
+                kind, attempt, payload = events.get(timeout=timeout)
+            except queue.Empty:
+                if first_token_timeout and time.monotonic() - started >= first_token_timeout:
+                    raise FirstTokenTimeout(f"{first_token_timeout}秒内没有收到第一个数据块")
+                # 到达对冲时间，发出备份请求
+                hedged = True
+                hedge.record_hedge()
+                backup = _Attempt(open_response, iterate, events)
+                attempts.append(backup)
+                backup.start()
+                continue
+            if kind == "chunk":
+                winner = attempt
+                if hedge is not None:
+                    hedge.record(time.monotonic() - started)
+                    if attempt is not attempts[0]:
+                        hedge.record_win()
+                for other in attempts:
+                    if other is not winner:
+                        other.cancel()
+                yield payload
+            else:
+                # 某个请求在产出数据前就结束了
+                attempts.remove(attempt)
+                if kind == "error":
+                    last_error = payload
+                if not attempts:
+                    if last_error is not None:
+                        raise last_error
+                    return
+        # 继续读取胜出请求的数据
+        while True:
+            kind, attempt, payload = events.get()
+            if attempt is not winner:
+                continue
+            if kind == "chunk":
+                yield payload
+            elif kind == "error":
+                raise payload
+            else:
+                return
+    finally:
+        for attempt in attempts:
+            attempt.cancel()
@@ -0,0 +1,110 @@
+"""
+复用Ollama返回的context（KV缓存状态）的多轮generate会话
+"""
+
+from ollama_toolkit.streaming import ResponseAccumulator
+
+
+class GenerateSession:
+    """
+    多轮generate会话
+
+    /api/generate在结束时返回context数组，下一次请求带上它即可接着之前的状态继续，
+    服务器只需评估新的提示，而不必重新处理整个历史。会话同时统计因此节省的prompt评估量。
+
+    用法:
+        session = GenerateSession(client, keep_alive="30m")
+        session.generate("请记住数字42")
+        session.generate("我让你记住的数字是多少？")
+        print(session.stats)
+    """
+    def __init__(self, client, model=None, keep_alive=None, **kwargs):
+        """
+        Args:
+            client (OllamaClient): 客户端
+            model (str, optional): 要使用的模型名称，如果为None则使用客户端的默认模型
+            keep_alive (str or int, optional): 模型在两次请求之间保持加载的时间，例如"30m"，
+                为None时使用服务器的默认设置
+            **kwargs: 每次请求共用的其他参数（例如system、options）
+        """
+        self.client = client
+        self.model = model or client.default_model
+        self.keep_alive = keep_alive
+        self.kwargs = kwargs
+        self.context = None
+        self.turns = 0
+        self.prompt_eval_count = 0
+        self.eval_count = 0
+        self.reused_tokens = 0
+
+    def reset(self):
+        """
+        丢弃context，下一次请求从头开始
+        """
+        self.context = None
+
+    def generate_stream(self, prompt, **kwargs):
+        """
+        流式生成响应，并在结束时保存返回的context
+
+        Args:
+            prompt (str): 提示文本
+            **kwargs: 本次请求的其他参数，会覆盖会话的默认参数
+
+        Yields:
+            StreamChunk: 数据块
+        """
+        params = dict(self.kwargs)
+        params.update(kwargs)
+        if self.keep_alive is not None:
+            params.setdefault("keep_alive", self.keep_alive)
+        previous = self.context
+        if previous:
+            params["context"] = previous
+
+        for chunk in self.client.generate_stream(prompt, model=self.model, **params):
+            if chunk.done:
+                self._record(chunk, previous)
+            yield chunk
+
+    def generate(self, prompt, sink=None, **kwargs):
+        """
+        生成响应
+
+        Args:
+            prompt (str): 提示文本
+            sink (callable or file-like, optional): 输出目标，见OllamaClient.generate
+            **kwargs: 本次请求的其他参数，会覆盖会话的默认参数
+
+        Returns:
+            str: 完整的响应文本
+        """
+        return ResponseAccumulator(sink).consume(self.generate_stream(prompt, **kwargs))
+
+    def _record(self, chunk, previous):
+        self.turns += 1
+        stats = chunk.stats
+        self.prompt_eval_count += stats.get("prompt_eval_count", 0)
+        self.eval_count += stats.get("eval_count", 0)
+        if previous:
+            # 这些token已在服务器的KV缓存中，不必随新的提示重新评估
+            self.reused_tokens += len(previous)
+        if chunk.context is not None:
+            self.context = chunk.context
+
+    @property
+    def stats(self):
+        """
+        会话统计信息
+
+        Returns:
+            dict: turns（轮数）、context_tokens（当前context长度）、prompt_eval_count（实际评估的提示token数）、
+                eval_count（生成的token数）、reused_tokens（复用context而免于重新评估的token数）
+        """
+        return {
+            "turns": self.turns,
+            "context_tokens": len(self.context) if self.context else 0,
+            "prompt_eval_count": self.prompt_eval_count,
+            "eval_count": self.eval_count,
+            "reused_tokens": self.reused_tokens,
+        }
@@ -0,0 +1,143 @@
+"""
+流式响应相关的数据结构：类型化的数据块以及线性时间的文本累加器
+"""
+
+# 最后一个数据块中携带的统计字段（时长单位为纳秒）
+STATS_FIELDS = (
+    "total_duration",
+    "load_duration",
+    "prompt_eval_count",
+    "prompt_eval_duration",
+    "eval_count",
+    "eval_duration",
+)
+
+
+class StreamChunk:
+    """
+    流式响应中的一个数据块
+
+    Attributes:
+        text (str): 本数据块新增的文本
+        done (bool): 是否为最后一个数据块
+        data (dict): Ollama返回的原始数据
+        metrics (RequestMetrics): 本次请求的性能指标，只有OllamaClient产出的最后一个数据块才有
+    """
+    __slots__ = ("text", "done", "data", "metrics")
+
+    def __init__(self, text, done=False, data=None):
+        self.text = text
+        self.done = done
+        self.data = data if data is not None else {}
+        self.metrics = None
+
+    @classmethod
+    def from_generate(cls, data):
+        """
+        从/api/generate返回的数据创建数据块
+        """
+        return cls(data.get("response", ""), data.get("done", False), data)
+
+    @classmethod
+    def from_chat(cls, data):
+        """
+        从/api/chat返回的数据创建数据块
+        """
+        message = data.get("message") or {}
+        return cls(message.get("content", ""), data.get("done", False), data)
+
+    @property
+    def model(self):
+        return self.data.get("model")
+
+    @property
+    def stats(self):
+        """
+        最后一个数据块中的统计信息，其他数据块返回空字典
+        """
+        return {key: self.data[key] for key in STATS_FIELDS if key in self.data}
+
+    @property
+    def context(self):
+        """
+        /api/generate在结束时返回的context数组（如果有）
+        """
+        return self.data.get("context")
+
+    def __repr__(self):
+        return f"StreamChunk(text={self.text!r}, done={self.done})"
+
+
+class ResponseAccumulator:
+    """
+    收集流式数据块的文本，并可选地把每段文本写入输出目标
+
+    文本片段先保存在列表中，读取时再一次性拼接，避免逐段字符串拼接带来的平方级复制。
+    """
+    def __init__(self, sink=None):
+        """
+        Args:
+            sink (callable or file-like, optional): 输出目标，可以是接收文本的函数，
+                也可以是带有write方法的对象；为None时不输出
+        """
+        self._parts = []
+        self._text = None
+        self.final = None
+        if sink is None or callable(sink):
+            self._write = sink
+        else:
+            self._write = sink.write
+
+    def add(self, chunk):
+        """
+        添加一个数据块
+
+        Args:
+            chunk (StreamChunk): 数据块
+
+        Returns:
+            StreamChunk: 传入的数据块，便于在迭代中链式使用
+        """
+        if chunk.text:
+            self._parts.append(chunk.text)
+            self._text = None
+            if self._write is not None:
+                self._write(chunk.text)
+        if chunk.done:
+            self.final = chunk
+        return chunk
+
+    def consume(self, chunks):
+        """
+        消费整个数据块迭代器
+
+        Returns:
+            str: 完整的响应文本
+        """
+        for chunk in chunks:
+            self.add(chunk)
+        return self.text
+
+    @property
+    def text(self):
+        """
+        目前为止收到的完整文本
+        """
+        if self._text is None:
+            self._text = "".join(self._parts)
+            self._parts = [self._text] if self._text else []
+        return self._text
+
+    @property
+    def stats(self):
+        """
+        最后一个数据块中的统计信息
+        """
+        return self.final.stats if self.final is not None else {}
+
+    @property
+    def metrics(self):
+        """
+        最后一个数据块携带的性能指标（RequestMetrics），没有时为None
+        """
+        return self.final.metrics if self.final is not None else None
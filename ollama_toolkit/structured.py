@@ -0,0 +1,606 @@
+"""
+结构化输出：增量解析模型按format生成的JSON，并在生成过程中按JSON Schema校验
+
+token到达时逐字符解析，字段和数组元素一旦完整就立即产出，下游可以在生成结束前开始处理；
+值的类型、未声明的字段、数组长度、枚举和数值范围等在值开始或结束时立即检查，
+出现无法挽回的违规时抛出StructuredOutputError，调用方据此停止读取并中断生成。
+
+支持的Schema关键字：type、properties、required、additionalProperties、items、prefixItems、
+minItems、maxItems、enum、const、minimum、maximum、exclusiveMinimum、exclusiveMaximum、
+minLength、maxLength、pattern、anyOf、oneOf、$ref（文档内的#/...引用），其他关键字被忽略。
+"""
+
+import json
+import re
+
+_WHITESPACE = " \t\r\n"
+_NUMBER_CHARS = frozenset("0123456789+-.eE")
+_LITERALS = {"t": ("true", True), "f": ("false", False), "n": ("null", None)}
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+# 值的第一个字符对应的JSON类型
+_KIND_BY_CHAR = {"{": "object", "[": "array", '"': "string", "t": "boolean", "f": "boolean", "n": "null"}
+_KIND_BY_CHAR.update({c: "number" for c in "-0123456789"})
+
+# 解析状态
+_VALUE = 0            # 等待一个值
+_VALUE_OR_END = 1     # "["之后：等待值或"]"
+_KEY_OR_END = 2       # "{"之后：等待键或"}"
+_KEY = 3              # 对象中的","之后：等待键
+_COLON = 4            # 键之后：等待":"
+_COMMA_OR_END = 5     # 值之后：等待","或结束符
+_DONE = 6             # 顶层的值已经完整
+
+
+class StructuredOutputError(ValueError):
+    """
+    模型输出不是合法的JSON，或者违反了Schema
+
+    Attributes:
+        path (tuple): 出错位置的路径，例如("items", 3, "price")
+        text (str): 出错前收到的全部文本
+    """
+    def __init__(self, message, path=(), text=""):
+        location = "/".join(str(part) for part in path)
+        super().__init__(f"{message}（位置: /{location}）")
+        self.path = tuple(path)
+        self.text = text
+
+
+def schema_dict(schema):
+    """
+    把Schema统一为字典：支持字典、JSON字符串以及pydantic模型类（model_json_schema/schema方法）
+
+    Returns:
+        dict: JSON Schema，schema为None或"json"时返回None
+    """
+    if schema is None or schema == "json":
+        return None
+    if isinstance(schema, str):
+        return json.loads(schema)
+    for name in ("model_json_schema", "schema"):
+        method = getattr(schema, name, None)
+        if callable(method):
+            return method()
+    return schema
+
+
+def _types(schema):
+    kind = schema.get("type")
+    if kind is None:
+        return None
+    return {kind} if isinstance(kind, str) else set(kind)
+
+
+def _kind_of(value):
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, (int, float)):
+        return "number"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, list):
+        return "array"
+    return "object"
+
+
+def _type_allows(types, kind, value=None):
+    """
+    判断JSON类型kind是否被允许，数值在值完整后再区分integer
+    """
+    if types is None or kind in types:
+        return True
+    if kind == "number" and "integer" in types:
+        return value is None or float(value).is_integer()
+    return False
+
+
+class SchemaValidator:
+    """
+    JSON Schema的子集，提供解析过程中逐步检查的接口
+    """
+    def __init__(self, schema):
+        """
+        Args:
+            schema (dict): JSON Schema
+        """
+        self.root = schema
+
+    def resolve(self, schema, kind=None, path=()):
+        """
+        展开$ref，并按值的类型在anyOf/oneOf中选择分支
+
+        Args:
+            schema (dict): Schema，为None表示不受约束
+            kind (str, optional): 值的JSON类型，已知时用来排除不可能的分支
+            path (tuple): 值的路径，用于错误信息
+
+        Returns:
+            dict: 展开后的Schema，无法唯一确定分支时返回原Schema（值完整后整体校验）
+        """
+        while schema is not None and "$ref" in schema:
+            schema = self._ref(schema["$ref"], path)
+        if schema is None or kind is None:
+            return schema
+        branches = schema.get("anyOf") or schema.get("oneOf")
+        if not branches:
+            return schema
+        candidates = []
+        for branch in branches:
+            branch = self.resolve(branch, None, path)
+            if _type_allows(_types(branch), kind):
+                candidates.append(branch)
+        if not candidates:
+            raise StructuredOutputError(f"类型{kind}不符合任何一个可选的Schema", path)
+        return candidates[0] if len(candidates) == 1 else schema
+
+    def _ref(self, ref, path):
+        if not ref.startswith("#"):
+            raise StructuredOutputError(f"不支持外部引用{ref}", path)
+        target = self.root
+        for part in ref[1:].split("/"):
+            if not part:
+                continue
+            part = part.replace("~1", "/").replace("~0", "~")
+            try:
+                target = target[part]
+            except (KeyError, TypeError):
+                raise StructuredOutputError(f"无法解析引用{ref}", path)
+        return target
+
+    def begin(self, schema, kind, path):
+        """
+        值开始时检查类型
+        """
+        if schema is None:
+            return
+        if not _type_allows(_types(schema), kind):
+            raise StructuredOutputError(f"类型应为{schema.get('type')}，实际为{kind}", path)
+        if "enum" in schema and not any(_kind_of(option) == kind for option in schema["enum"]):
+            raise StructuredOutputError(f"类型{kind}不可能是{schema['enum']}中的值", path)
+
+    def key(self, schema, key, path):
+        """
+        对象的键完整时检查是否允许，并返回该字段的Schema
+        """
+        if schema is None:
+            return None
+        properties = schema.get("properties") or {}
+        if key in properties:
+            return properties[key]
+        extra = schema.get("additionalProperties", True)
+        if extra is False:
+            raise StructuredOutputError(f"不允许的字段{key!r}", path + (key,))
+        return extra if isinstance(extra, dict) else None
+
+    def item(self, schema, index, path):
+        """
+        数组元素开始时检查长度，并返回该元素的Schema
+        """
+        if schema is None:
+            return None
+        maximum = schema.get("maxItems")
+        if maximum is not None and index >= maximum:
+            raise StructuredOutputError(f"数组最多只能有{maximum}个元素", path)
+        prefix = schema.get("prefixItems")
+        items = schema.get("items")
+        if prefix is None and isinstance(items, list):
+            # draft 4-7的元组形式
+            prefix, items = items, schema.get("additionalItems")
+        if prefix is not None and index < len(prefix):
+            return prefix[index]
+        if items is False:
+            raise StructuredOutputError(f"数组最多只能有{len(prefix or [])}个元素", path)
+        return items if isinstance(items, dict) else None
+
+    def end(self, schema, value, path):
+        """
+        值完整时检查该值本身的约束（子元素在各自结束时已经检查过）
+        """
+        if schema is None:
+            return
+        if not _type_allows(_types(schema), _kind_of(value), value):
+            raise StructuredOutputError(f"类型应为{schema.get('type')}，实际为{_kind_of(value)}", path)
+        if ("anyOf" in schema or "oneOf" in schema) and not self._matches_branch(schema, value, path):
+            raise StructuredOutputError("不符合任何一个可选的Schema", path)
+        if "const" in schema and value != schema["const"]:
+            raise StructuredOutputError(f"值应为{schema['const']!r}", path)
+        if "enum" in schema and value not in schema["enum"]:
+            raise StructuredOutputError(f"值{value!r}不在{schema['enum']}中", path)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            self._check_range(schema, value, path)
+        elif isinstance(value, str):
+            self._check_string(schema, value, path)
+        elif isinstance(value, list):
+            minimum = schema.get("minItems")
+            if minimum is not None and len(value) < minimum:
+                raise StructuredOutputError(f"数组至少需要{minimum}个元素", path)
+        elif isinstance(value, dict):
+            missing = [key for key in schema.get("required", ()) if key not in value]
+            if missing:
+                raise StructuredOutputError(f"缺少必需的字段{missing}", path)
+
+    def _check_range(self, schema, value, path):
+        if "minimum" in schema and value < schema["minimum"]:
+            raise StructuredOutputError(f"值{value}小于最小值{schema['minimum']}", path)
+        if "maximum" in schema and value > schema["maximum"]:
+            raise StructuredOutputError(f"值{value}大于最大值{schema['maximum']}", path)
+        if "exclusiveMinimum" in schema and value <= schema["exclusiveMinimum"]:
+            raise StructuredOutputError(f"值{value}应大于{schema['exclusiveMinimum']}", path)
+        if "exclusiveMaximum" in schema and value >= schema["exclusiveMaximum"]:
+            raise StructuredOutputError(f"值{value}应小于{schema['exclusiveMaximum']}", path)
+
+    def _check_string(self, schema, value, path):
+        if "minLength" in schema and len(value) < schema["minLength"]:
+            raise StructuredOutputError(f"字符串长度应至少为{schema['minLength']}", path)
+        if "maxLength" in schema and len(value) > schema["maxLength"]:
+            raise StructuredOutputError(f"字符串长度应至多为{schema['maxLength']}", path)
+        if "pattern" in schema and not re.search(schema["pattern"], value):
+            raise StructuredOutputError(f"字符串不匹配{schema['pattern']!r}", path)
+
+    def _matches_branch(self, schema, value, path):
+        for branch in schema.get("anyOf") or schema.get("oneOf"):
+            try:
+                self._validate(value, branch, path)
+            except StructuredOutputError:
+                continue
+            return True
+        return False
+
+    def validate(self, value):
+        """
+        完整地校验一个已经解析好的值
+
+        Raises:
+            StructuredOutputError: 值违反了Schema
+        """
+        self._validate(value, self.root, ())
+
+    def _validate(self, value, schema, path):
+        schema = self.resolve(schema, _kind_of(value), path)
+        if schema is None:
+            return
+        self.begin(schema, _kind_of(value), path)
+        if isinstance(value, dict):
+            for key, item in value.items():
+                self._validate(item, self.key(schema, key, path), path + (key,))
+        elif isinstance(value, list):
+            for index, item in enumerate(value):
+                self._validate(item, self.item(schema, index, path), path + (index,))
+        self.end(schema, value, path)
+
+
+class _Frame:
+    """
+    正在解析的对象或数组
+    """
+    __slots__ = ("value", "schema", "path", "key", "key_schema")
+
+    def __init__(self, value, schema, path):
+        self.value = value
+        self.schema = schema
+        self.path = path
+        self.key = None
+        self.key_schema = None
+
+
+class JSONStreamParser:
+    """
+    增量JSON解析器
+
+    用法:
+        parser = JSONStreamParser(schema, depth=2)
+        for text in pieces:
+            for path, value in parser.feed(text):
+                ...                      # 例如("items", 0)及其完整的值
+        for path, value in parser.close():
+            ...                          # 最后产出整个文档，路径为()
+    """
+    def __init__(self, schema=None, depth=1):
+        """
+        Args:
+            schema (dict, optional): JSON Schema，为None时只检查JSON语法
+            depth (int): 产出路径长度不超过depth的值，例如1表示顶层字段或顶层数组的元素；
+                整个文档（路径为()）总是在最后产出
+        """
+        schema = schema_dict(schema)
+        self.validator = SchemaValidator(schema) if schema is not None else None
+        self.depth = depth
+        self.value = None
+        self._state = _VALUE
+        self._stack = []
+        self._text = []
+        self._token = None       # 正在读取的字符串、数字或字面量
+        self._token_kind = None
+        self._token_schema = None
+        self._token_path = ()
+        self._escape = False
+        self._key_mode = False
+        self._events = []
+        self._failure = None
+
+    @property
+    def done(self):
+        """
+        顶层的值是否已经完整
+        """
+        return self._state == _DONE
+
+    @property
+    def text(self):
+        """
+        到目前为止收到的全部文本
+        """
+        return "".join(self._text)
+
+    def _error(self, message, path=None):
+        if path is None:
+            path = self._stack[-1].path if self._stack else ()
+        return StructuredOutputError(message, path, self.text)
+
+    def feed(self, text):
+        """
+        输入一段文本
+
+        Args:
+            text (str): 模型新生成的文本
+
+        Returns:
+            list: 本次完整的值，每项为(path, value)
+
+        Raises:
+            StructuredOutputError: 输出不是合法的JSON或违反了Schema；出错位置之前已经完整的值
+                会先被返回，错误在下一次调用feed或close时抛出
+        """
+        if self._failure is not None:
+            raise self._failure
+        if not text:
+            return []
+        self._text.append(text)
+        self._events = []
+        try:
+            self._parse(text)
+        except StructuredOutputError as e:
+            if not e.text:
+                e.text = self.text
+            self._failure = e
+            if not self._events:
+                raise
+        return self._events
+
+    def close(self):
+        """
+        输出结束时调用，检查文档是否完整
+
+        Returns:
+            list: 剩余的完整值（顶层是数字时，直到结束才能确定）
+
+        Raises:
+            StructuredOutputError: 文档不完整
+        """
+        if self._failure is not None:
+            raise self._failure
+        self._events = []
+        if self._token is not None and self._token_kind in ("number", "literal") and not self._stack:
+            self._finish_token()
+        if self._state != _DONE:
+            raise self._error("输出在JSON完整之前结束")
+        return self._events
+
+    def _parse(self, text):
+        i = 0
+        n = len(text)
+        while i < n:
+            if self._token is not None:
+                i = self._continue_token(text, i)
+                continue
+            c = text[i]
+            if c in _WHITESPACE:
+                i += 1
+                continue
+            state = self._state
+            if state == _VALUE or state == _VALUE_OR_END:
+                if c == "]" and state == _VALUE_OR_END:
+                    self._close_container("]")
+                else:
+                    self._begin_value(c)
+            elif state == _KEY_OR_END or state == _KEY:
+                if c == "}" and state == _KEY_OR_END:
+                    self._close_container("}")
+                elif c == '"':
+                    self._key_mode = True
+                    self._start_token("string", None, None)
+                else:
+                    raise self._error(f"应为字段名，实际为{c!r}")
+            elif state == _COLON:
+                if c != ":":
+                    raise self._error(f"应为':'，实际为{c!r}")
+                self._state = _VALUE
+            elif state == _COMMA_OR_END:
+                frame = self._stack[-1]
+                if c == ",":
+                    self._state = _KEY if isinstance(frame.value, dict) else _VALUE
+                elif c in "}]":
+                    self._close_container(c)
+                else:
+                    raise self._error(f"应为','或结束符，实际为{c!r}")
+            else:
+                raise self._error(f"JSON之后出现多余的内容{c!r}")
+            i += 1
+
+    def _value_schema(self):
+        """
+        即将开始的值的路径和Schema
+        """
+        if not self._stack:
+            return (), (self.validator.root if self.validator else None)
+        frame = self._stack[-1]
+        if isinstance(frame.value, dict):
+            return frame.path + (frame.key,), frame.key_schema
+        index = len(frame.value)
+        path = frame.path + (index,)
+        if self.validator is None:
+            return path, None
+        return path, self.validator.item(frame.schema, index, path)
+
+    def _begin_value(self, c):
+        kind = _KIND_BY_CHAR.get(c)
+        if kind is None:
+            raise self._error(f"应为一个值，实际为{c!r}")
+        path, schema = self._value_schema()
+        if self.validator is not None:
+            schema = self.validator.resolve(schema, kind, path)
+            self.validator.begin(schema, kind, path)
+        if c == "{":
+            self._stack.append(_Frame({}, schema, path))
+            self._state = _KEY_OR_END
+        elif c == "[":
+            self._stack.append(_Frame([], schema, path))
+            self._state = _VALUE_OR_END
+        elif c == '"':
+            self._start_token("string", schema, path)
+        else:
+            self._start_token("number" if kind == "number" else "literal", schema, path)
+            self._token.append(c)
+
+    def _start_token(self, kind, schema, path):
+        self._token = []
+        self._token_kind = kind
+        self._token_schema = schema
+        self._token_path = path
+        self._escape = False
+
+    def _continue_token(self, text, i):
+        """
+        继续读取字符串、数字或字面量，返回下一个未处理字符的位置
+        """
+        if self._token_kind == "string":
+            return self._continue_string(text, i)
+        n = len(text)
+        start = i
+        if self._token_kind == "number":
+            while i < n and text[i] in _NUMBER_CHARS:
+                i += 1
+        else:
+            while i < n and text[i].isalpha():
+                i += 1
+            word = "".join(self._token) + text[start:i]
+            if not _LITERALS[word[0]][0].startswith(word):
+                raise self._error(f"无法识别的值{word!r}", self._token_path)
+        self._token.append(text[start:i])
+        if i < n:
+            # 遇到分隔符，数字或字面量结束
+            self._finish_token()
+        return i
+
+    def _continue_string(self, text, i):
+        n = len(text)
+        if self._escape:
+            self._token.append(text[i])
+            self._escape = False
+            i += 1
+        while i < n:
+            match = _STRING_SPECIAL.search(text, i)
+            if match is None:
+                self._token.append(text[i:])
+                return n
+            end = match.start()
+            self._token.append(text[i:end])
+            if text[end] == '"':
+                self._finish_token()
+                return end + 1
+            # 反斜杠及其后的一个字符原样保留，结束时统一解码
+            self._token.append("\\")
+            if end + 1 < n:
+                self._token.append(text[end + 1])
+                i = end + 2
+            else:
+                self._escape = True
+                i = n
+        return i
+
+    def _finish_token(self):
+        raw = "".join(self._token)
+        kind = self._token_kind
+        schema = self._token_schema
+        self._token = None
+        if kind == "string":
+            try:
+                value = json.loads('"' + raw + '"', strict=False)
+            except ValueError:
+                raise self._error("字符串中有无效的转义序列")
+            if self._key_mode:
+                self._key_mode = False
+                frame = self._stack[-1]
+                frame.key = value
+                frame.key_schema = self.validator.key(frame.schema, value, frame.path) if self.validator else None
+                self._state = _COLON
+                return
+        elif kind == "number":
+            try:
+                value = json.loads(raw)
+            except ValueError:
+                raise self._error(f"无效的数字{raw!r}", self._token_path)
+        else:
+            word, value = _LITERALS[raw[0]]
+            if raw != word:
+                raise self._error(f"无法识别的值{raw!r}", self._token_path)
+        self._complete(value, schema, self._token_path)
+
+    def _close_container(self, c):
+        frame = self._stack[-1]
+        expected = "}" if isinstance(frame.value, dict) else "]"
+        if c != expected:
+            raise self._error(f"应为{expected!r}，实际为{c!r}")
+        self._stack.pop()
+        self._complete(frame.value, frame.schema, frame.path)
+
+    def _complete(self, value, schema, path):
+        """
+        一个值完整：校验、加入上一级容器并按深度产出
+        """
+        if self.validator is not None:
+            self.validator.end(schema, value, path)
+        if self._stack:
+            parent = self._stack[-1]
+            if isinstance(parent.value, dict):
+                parent.value[parent.key] = value
+            else:
+                parent.value.append(value)
+            self._state = _COMMA_OR_END
+            if len(path) <= self.depth:
+                self._events.append((path, value))
+        else:
+            self.value = value
+            self._state = _DONE
+            self._events.append(((), value))
+
+
+def iter_structured(chunks, schema=None, depth=1):
+    """
+    从流式数据块中增量解析JSON，违反Schema时停止读取（关闭chunks，从而中断生成）
+
+    Args:
+        chunks (iterator): StreamChunk迭代器，例如client.generate_stream(...)
+        schema (dict, optional): JSON Schema
+        depth (int): 产出路径长度不超过depth的值
+
+    Yields:
+        tuple: (path, value)，最后一项是整个文档，路径为()
+
+    Raises:
+        StructuredOutputError: 输出不是合法的JSON或违反了Schema
+    """
+    parser = JSONStreamParser(schema, depth)
+    try:
+        for chunk in chunks:
+            for event in parser.feed(chunk.text):
+                yield event
+        for event in parser.close():
+            yield event
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
@@ -0,0 +1,362 @@
+"""
+请求级性能指标：客户端测得的首个数据块延迟（TTFT）和token间延迟，以及Ollama在最后一个数据块中
+返回的模型加载、提示评估和生成耗时；指标可以通过回调函数获取，也可以汇总为Prometheus文本格式的直方图
+"""
+
+import bisect
+import threading
+import time
+import warnings
+
+# Ollama返回的时长单位为纳秒
+NANOSECONDS = 1e9
+
+
+def _seconds(value):
+    return value / NANOSECONDS if value is not None else None
+
+
+class RequestMetrics:
+    """
+    一次generate/chat请求的性能指标，时间单位均为秒
+
+    Attributes:
+        endpoint (str): API路径，例如"/api/chat"
+        model (str): 请求的模型名称
+        started_at (float): 请求开始时的时间戳（time.time()）
+        ttft (float): 从发出请求到收到第一个数据块的时间（非流式请求即整个请求的时间），
+            没有收到数据时为None
+        duration (float): 从发出请求到读取结束的时间
+        chunks (int): 收到的数据块数
+        inter_token (list): 相邻两个数据块之间的间隔
+        cached (bool): 响应是否来自缓存
+        error (Exception): 请求失败的原因，成功时为None
+        cancelled (bool): 调用方是否在读取完毕前停止了迭代
+        server (dict): 服务器在最后一个数据块中返回的统计字段（时长单位为纳秒）
+    """
+    def __init__(self, endpoint, model=None):
+        self.endpoint = endpoint
+        self.model = model
+        self.started_at = time.time()
+        self.ttft = None
+        self.duration = None
+        self.chunks = 0
+        self.inter_token = []
+        self.cached = False
+        self.error = None
+        self.cancelled = False
+        self.server = {}
+        self._start = time.perf_counter()
+        self._last = None
+
+    def observe(self, chunk):
+        """
+        记录收到的一个数据块
+
+        Args:
+            chunk (StreamChunk): 数据块
+        """
+        now = time.perf_counter()
+        if self._last is None:
+            self.ttft = now - self._start
+        elif not chunk.done:
+            self.inter_token.append(now - self._last)
+        self._last = now
+        self.chunks += 1
+        if chunk.done:
+            self.server = chunk.stats
+            self.cached = bool(chunk.data.get("cached"))
+            self.model = chunk.model or self.model
+
+    def finish(self, error=None, cancelled=False):
+        """
+        结束计时，重复调用时不做任何事
+
+        Returns:
+            bool: 本次调用是否结束了计时
+        """
+        if self.duration is not None:
+            return False
+        self.duration = time.perf_counter() - self._start
+        self.error = error
+        self.cancelled = cancelled
+        return True
+
+    @property
+    def status(self):
+        """
+        请求结果："ok"、"cached"、"error"或"cancelled"
+        """
+        if self.error is not None:
+            return "error"
+        if self.cancelled:
+            return "cancelled"
+        return "cached" if self.cached else "ok"
+
+    @property
+    def load_duration(self):
+        """
+        服务器加载模型的时间，冷启动时明显大于0
+        """
+        return _seconds(self.server.get("load_duration"))
+
+    @property
+    def prompt_eval_duration(self):
+        return _seconds(self.server.get("prompt_eval_duration"))
+
+    @property
+    def eval_duration(self):
+        return _seconds(self.server.get("eval_duration"))
+
+    @property
+    def total_duration(self):
+        return _seconds(self.server.get("total_duration"))
+
+    @property
+    def prompt_eval_count(self):
+        return self.server.get("prompt_eval_count")
+
+    @property
+    def eval_count(self):
+        return self.server.get("eval_count")
+
+    @property
+    def tokens_per_second(self):
+        """
+        生成速度（eval_count / eval_duration）
+        """
+        if self.eval_count and self.server.get("eval_duration"):
+            return self.eval_count / self.eval_duration
+        return None
+
+    @property
+    def prompt_tokens_per_second(self):
+        """
+        提示评估速度（prompt_eval_count / prompt_eval_duration）
+        """
+        if self.prompt_eval_count and self.server.get("prompt_eval_duration"):
+            return self.prompt_eval_count / self.prompt_eval_duration
+        return None
+
+    @property
+    def mean_inter_token(self):
+        if not self.inter_token:
+            return None
+        return sum(self.inter_token) / len(self.inter_token)
+
+    def as_dict(self):
+        """
+        转换为可以JSON序列化的字典（不包含每个间隔的明细）
+        """
+        return {
+            "endpoint": self.endpoint,
+            "model": self.model,
+            "status": self.status,
+            "error": repr(self.error) if self.error is not None else None,
+            "started_at": self.started_at,
+            "ttft": self.ttft,
+            "duration": self.duration,
+            "chunks": self.chunks,
+            "mean_inter_token": self.mean_inter_token,
+            "max_inter_token": max(self.inter_token) if self.inter_token else None,
+            "load_duration": self.load_duration,
+            "prompt_eval_count": self.prompt_eval_count,
+            "prompt_eval_duration": self.prompt_eval_duration,
+            "eval_count": self.eval_count,
+            "eval_duration": self.eval_duration,
+            "tokens_per_second": self.tokens_per_second,
+            "prompt_tokens_per_second": self.prompt_tokens_per_second,
+        }
+
+    def __repr__(self):
+        return (f"RequestMetrics({self.endpoint!r}, model={self.model!r}, status={self.status!r}, "
+                f"ttft={self.ttft}, duration={self.duration})")
+
+
+def emit(hooks, metrics):
+    """
+    把指标依次传给回调函数；回调出错只会发出警告，不会影响请求本身
+    """
+    for hook in tuple(hooks):
+        try:
+            hook(metrics)
+        except Exception as e:
+            warnings.warn(f"性能指标回调出错: {e!r}", RuntimeWarning)
+
+
+# 默认的直方图分桶（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+INTER_TOKEN_BUCKETS = (0.005, 0.01, 0.02, 0.03, 0.05, 0.075, 0.1, 0.2, 0.5, 1)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 200, 500, 1000)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Histogram:
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # 每组标签值对应[各分桶计数（非累计）, 总和, 总数]
+        self.series = {}
+
+    def observe(self, values, value):
+        series = self.series.get(values)
+        if series is None:
+            series = self.series[values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self, lines):
+        lines.append(f"# HELP {self.name} {self.help}")
+        lines.append(f"# TYPE {self.name} histogram")
+        for values, (counts, total, count) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, values)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, values)} {count}")
+
+
+class _Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.series = {}
+
+    def inc(self, values, amount=1):
+        self.series[values] = self.series.get(values, 0) + amount
+
+    def render(self, lines):
+        lines.append(f"# HELP {self.name} {self.help}")
+        lines.append(f"# TYPE {self.name} counter")
+        for values, value in sorted(self.series.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, values)} {value}")
+
+
+class MetricsAggregator:
+    """
+    进程内的指标汇总，按模型统计直方图并以Prometheus文本格式导出；本身就是一个回调函数
+
+    用法:
+        metrics = MetricsAggregator()
+        client = OllamaClient(hooks=[metrics])
+        ...
+        print(metrics.render())
+        metrics.serve(9464)  # 在http://localhost:9464/metrics提供给Prometheus抓取
+    """
+    def __init__(self, prefix="ollama", latency_buckets=LATENCY_BUCKETS,
+                 inter_token_buckets=INTER_TOKEN_BUCKETS, rate_buckets=RATE_BUCKETS):
+        """
+        Args:
+            prefix (str): 指标名称前缀
+            latency_buckets (tuple): TTFT、请求时间以及加载/提示评估时间的分桶上界（秒）
+            inter_token_buckets (tuple): token间延迟的分桶上界（秒）
+            rate_buckets (tuple): 生成速度的分桶上界（token/秒）
+        """
+        model = ("model",)
+        self.requests = _Counter(f"{prefix}_requests_total", "按结果统计的请求数", ("endpoint", "model", "status"))
+        self.prompt_tokens = _Counter(f"{prefix}_prompt_tokens_total", "服务器评估的提示token数", model)
+        self.generated_tokens = _Counter(f"{prefix}_generated_tokens_total", "生成的token数", model)
+        self.ttft = _Histogram(f"{prefix}_time_to_first_token_seconds", "从发出请求到收到第一个数据块的时间",
+                               model, latency_buckets)
+        self.duration = _Histogram(f"{prefix}_request_duration_seconds", "请求的总时间", model, latency_buckets)
+        self.inter_token = _Histogram(f"{prefix}_inter_token_seconds", "相邻两个数据块之间的间隔",
+                                      model, inter_token_buckets)
+        self.load = _Histogram(f"{prefix}_load_duration_seconds", "服务器加载模型的时间", model, latency_buckets)
+        self.prompt_eval = _Histogram(f"{prefix}_prompt_eval_duration_seconds", "服务器评估提示的时间",
+                                      model, latency_buckets)
+        self.rate = _Histogram(f"{prefix}_eval_tokens_per_second", "生成速度", model, rate_buckets)
+        self._metrics = (self.requests, self.prompt_tokens, self.generated_tokens, self.ttft, self.duration,
+                         self.inter_token, self.load, self.prompt_eval, self.rate)
+        self._lock = threading.Lock()
+        self._server = None
+
+    def __call__(self, metrics):
+        """
+        汇总一次请求的指标；来自缓存的响应只计入请求数
+        """
+        model = (metrics.model or "",)
+        with self._lock:
+            self.requests.inc((metrics.endpoint, metrics.model or "", metrics.status))
+            if metrics.status != "ok":
+                return
+            if metrics.ttft is not None:
+                self.ttft.observe(model, metrics.ttft)
+            self.duration.observe(model, metrics.duration)
+            for gap in metrics.inter_token:
+                self.inter_token.observe(model, gap)
+            if metrics.load_duration is not None:
+                self.load.observe(model, metrics.load_duration)
+            if metrics.prompt_eval_duration is not None:
+                self.prompt_eval.observe(model, metrics.prompt_eval_duration)
+            if metrics.tokens_per_second is not None:
+                self.rate.observe(model, metrics.tokens_per_second)
+            if metrics.prompt_eval_count:
+                self.prompt_tokens.inc(model, metrics.prompt_eval_count)
+            if metrics.eval_count:
+                self.generated_tokens.inc(model, metrics.eval_count)
+
+    def render(self):
+        """
+        Returns:
+            str: Prometheus文本格式的指标
+        """
+        lines = []
+        with self._lock:
+            for metric in self._metrics:
+                metric.render(lines)
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port=9464, host="127.0.0.1"):
+        """
+        在后台线程中启动HTTP服务，在/metrics路径提供指标
+
+        Returns:
+            ThreadingHTTPServer: 服务器对象，调用shutdown()停止
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        aggregator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = aggregator.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="ollama-metrics", daemon=True).start()
+        return self._server
+
+    def close(self):
+        """
+        停止HTTP服务
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,48 @@
+"""
+无需分词器的近似token计数
+"""
+
+import re
+
+# 中日韩文字及全角符号，通常每个字符对应至少一个token
+_CJK = re.compile(r'[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]')
+
+
+def estimate_tokens(text):
+    """
+    估算文本的token数：中日韩字符按每字一个token计算，其他字符按每4个字符一个token计算
+
+    Args:
+        text (str): 文本
+
+    Returns:
+        int: 估算的token数
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def truncate_tokens(text, max_tokens):
+    """
+    截断文本，使估算的token数不超过max_tokens
+
+    Args:
+        text (str): 文本
+        max_tokens (int): 最大token数
+
+    Returns:
+        str: 截断后的文本，未超过时原样返回
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # 二分查找满足预算的最长前缀
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low]
@@ -22,6 +22,12 @@ setup(
     install_requires=[
         'requests>=2.25.0',
     ],
+    extras_require={
+        'async': ['aiohttp>=3.7'],
+        'images': ['Pillow>=8.0'],
+        'vector': ['numpy>=1.17'],
+        'fast': ['orjson>=3.0'],
+    },
     entry_points={
         'console_scripts': [
             'ollama-tool=ollama_toolkit.cli:main',
@@ -0,0 +1,29 @@
+import pytest
+
+from ollama_toolkit.fake_server import FakeOllamaServer
+from ollama_toolkit.ollama_client import OllamaClient
+
+
+@pytest.fixture
+def server():
+    with FakeOllamaServer(num_tokens=8) as server:
+        yield server
+
+
+@pytest.fixture
+def client(server):
+    client = OllamaClient(base_url=server.url)
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def png(tmp_path):
+    """
+    一张可以被图片编码器读取的小图片
+    """
+    Image = pytest.importorskip("PIL.Image")
+
+    path = tmp_path / "image.png"
+    Image.new("RGB", (64, 48), (200, 30, 30)).save(path)
+    return str(path)
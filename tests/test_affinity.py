@@ -0,0 +1,80 @@
+import threading
+import time
+
+from ollama_toolkit.affinity import ModelScheduler
+from ollama_toolkit.ollama_client import OllamaClient
+
+
+def queue_behind(scheduler, models, order):
+    """
+    依次为每个模型启动一个等待名额的线程，获得名额后记录模型名称并立即释放
+    """
+    def run(model):
+        with scheduler.slot(model):
+            order.append(model)
+
+    threads = []
+    queued = sum(scheduler.stats["waiting"].values())
+    for model in models:
+        thread = threading.Thread(target=run, args=(model,))
+        thread.start()
+        threads.append(thread)
+        while sum(scheduler.stats["waiting"].values()) < queued + len(threads):
+            time.sleep(0.001)
+    return threads
+
+
+def test_requests_are_drained_in_model_waves():
+    scheduler = ModelScheduler(per_model=1, max_loaded=1, max_wait=60)
+    scheduler.acquire("a")
+    order = []
+    threads = queue_behind(scheduler, ["b", "a", "b", "a"], order)
+    scheduler.release("a")
+    for thread in threads:
+        thread.join(5)
+    assert order == ["a", "a", "b", "b"]
+    stats = scheduler.stats
+    assert stats["switches"] == 1 and stats["arrival_switches"] == 4
+    assert stats["avoided_switches"] == 3
+    assert stats["running"] == {} and stats["waiting"] == {} and stats["loaded"] == ["b"]
+
+
+def test_same_model_requests_run_concurrently_up_to_per_model():
+    scheduler = ModelScheduler(per_model=2, max_loaded=1)
+    scheduler.acquire("a")
+    scheduler.acquire("a")
+    assert scheduler.stats["running"] == {"a": 2}
+    order = []
+    threads = queue_behind(scheduler, ["a"], order)
+    assert order == []
+    scheduler.release("a")
+    threads[0].join(5)
+    assert order == ["a"]
+    scheduler.release("a")
+
+
+def test_starving_model_stops_current_wave():
+    scheduler = ModelScheduler(per_model=4, max_loaded=1, max_wait=0.05)
+    scheduler.acquire("a")
+    order = []
+    threads = queue_behind(scheduler, ["b"], order)
+    time.sleep(0.1)
+    # b已等待超过max_wait，a即使还有名额也不再接收新的请求
+    threads += queue_behind(scheduler, ["a"], order)
+    assert order == []
+    scheduler.release("a")
+    for thread in threads:
+        thread.join(5)
+    assert order == ["b", "a"]
+
+
+def test_client_admits_requests_through_scheduler(server):
+    scheduler = ModelScheduler(per_model=2)
+    client = OllamaClient(base_url=server.url, scheduler=scheduler)
+    items = [{"prompt": "hi", "model": model} for model in ("qwen3", "other") * 4]
+    results = list(client.generate_many(items, concurrency=4))
+    assert all(result.ok for result in results)
+    stats = scheduler.stats
+    assert stats["requests"] == 8 and stats["running"] == {}
+    assert stats["switches"] <= stats["arrival_switches"]
+    client.close()
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from ollama_toolkit.async_client import AsyncOllamaClient
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_generate_stream_yields_chunks_and_final_stats(server):
+    async def main():
+        async with AsyncOllamaClient(base_url=server.url) as client:
+            return [chunk async for chunk in client.generate_stream("hi")]
+
+    chunks = run(main())
+    assert "".join(chunk.text for chunk in chunks) == " token" * 8
+    assert chunks[-1].done
+    assert chunks[-1].stats["eval_count"] == 8
+
+
+def test_generate_and_chat_stream_and_non_stream_agree(server):
+    async def main():
+        async with AsyncOllamaClient(base_url=server.url) as client:
+            return [
+                await client.generate("hi"),
+                await client.generate("hi", stream=False),
+                await client.chat([{"role": "user", "content": "hi"}]),
+                await client.chat([{"role": "user", "content": "hi"}], stream=False),
+            ]
+
+    assert run(main()) == [" token" * 8] * 4
+
+
+def test_chat_with_images_encodes_off_the_event_loop(server, png):
+    async def main():
+        async with AsyncOllamaClient(base_url=server.url) as client:
+            data = await client._prepare_chat([{"role": "user", "content": "看图"}], None, True, [png], {})
+            reply = await client.chat([{"role": "user", "content": "看图"}], images=[png])
+            return data, reply
+
+    data, reply = run(main())
+    assert len(data["messages"][-1]["images"]) == 1
+    assert reply == " token" * 8
+
+
+def test_generate_many_runs_concurrently_in_input_order(server):
+    async def main():
+        async with AsyncOllamaClient(base_url=server.url, max_connections=4) as client:
+            return [result async for result in client.generate_many([f"p{i}" for i in range(10)], concurrency=4)]
+
+    results = run(main())
+    assert [result.index for result in results] == list(range(10))
+    assert all(result.ok for result in results)
+
+
+def test_http_errors_raise_client_response_error(server):
+    import aiohttp
+
+    server.error_rate = 1.0
+
+    async def main():
+        async with AsyncOllamaClient(base_url=server.url) as client:
+            await client.generate("hi", stream=False)
+
+    with pytest.raises(aiohttp.ClientResponseError) as info:
+        run(main())
+    assert info.value.status == 500
+
+
+def test_close_shuts_down_encoder_pool(server, png):
+    from ollama_toolkit.images import ImageEncoder
+
+    async def main():
+        client = AsyncOllamaClient(base_url=server.url, image_encoder=ImageEncoder(max_workers=2))
+        await client.chat([{"role": "user", "content": "看图"}], images=[png, png])
+        assert client.image_encoder._pool is not None
+        await client.close()
+        return client.image_encoder._pool
+
+    assert run(main()) is None
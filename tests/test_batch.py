@@ -0,0 +1,190 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from ollama_toolkit.batch import arun_many, run_many
+
+
+def test_run_many_keeps_input_order_and_records_errors():
+    def func(item):
+        if item == 3:
+            raise ValueError("bad")
+        time.sleep(0.01 * (5 - item))
+        return item * 2
+
+    results = list(run_many(func, range(5), concurrency=4))
+    assert [result.index for result in results] == [0, 1, 2, 3, 4]
+    assert [result.output for result in results if result.ok] == [0, 2, 4, 8]
+    assert isinstance(results[3].error, ValueError) and not results[3].ok
+
+
+def test_run_many_reads_input_lazily_and_bounds_concurrency():
+    active = []
+    peak = []
+    lock = threading.Lock()
+    consumed = []
+
+    def items():
+        for i in range(100):
+            consumed.append(i)
+            yield i
+
+    def func(item):
+        with lock:
+            active.append(item)
+            peak.append(len(active))
+        time.sleep(0.002)
+        with lock:
+            active.remove(item)
+        return item
+
+    results = run_many(func, items(), concurrency=3, max_pending=6)
+    next(results)
+    assert len(consumed) <= 7
+    rest = list(results)
+    assert len(rest) == 99
+    assert max(peak) <= 3
+    results.close()
+
+
+def test_run_many_unordered_yields_all_results():
+    results = list(run_many(lambda item: item, range(20), concurrency=5, ordered=False))
+    assert sorted(result.output for result in results) == list(range(20))
+
+
+def test_run_many_rejects_zero_concurrency():
+    with pytest.raises(ValueError):
+        list(run_many(lambda item: item, [1], concurrency=0))
+
+
+def test_arun_many_accepts_async_iterables():
+    async def source():
+        for i in range(6):
+            yield i
+
+    async def func(item):
+        await asyncio.sleep(0.001 * (6 - item))
+        return item + 1
+
+    async def main():
+        return [result async for result in arun_many(func, source(), concurrency=3)]
+
+    results = asyncio.run(main())
+    assert [result.output for result in results] == [1, 2, 3, 4, 5, 6]
+
+
+def test_generate_many_and_chat_many(client):
+    prompts = ["a", {"prompt": "b", "options": {"num_predict": 2}}]
+    outputs = [result.output for result in client.generate_many(prompts, concurrency=2)]
+    assert outputs == [" token" * 8, " token" * 2]
+    conversations = [[{"role": "user", "content": "hi"}]] * 3
+    assert all(result.ok for result in client.chat_many(conversations, concurrency=3))
+
+
+def _read_jsonl(path):
+    import json
+
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def _write_requests(path, lines):
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def test_run_jsonl_writes_results_and_resumes_from_checkpoint(client, tmp_path):
+    from ollama_toolkit.batch import run_jsonl
+
+    requests_path = tmp_path / "in.jsonl"
+    output = tmp_path / "out.jsonl"
+    _write_requests(requests_path, [
+        '{"id": "a", "prompt": "1"}',
+        '{"id": "b", "messages": [{"role": "user", "content": "2"}]}',
+        '{"prompt": "3", "options": {"num_predict": 1}}',
+    ])
+    progress = run_jsonl(client, str(requests_path), str(output), concurrency=2)
+    assert (progress.completed, progress.failed, progress.skipped) == (3, 0, 0)
+    rows = {row["id"]: row for row in _read_jsonl(output)}
+    assert rows["a"]["response"] == " token" * 8 and rows[3]["response"] == " token"
+
+    progress = run_jsonl(client, str(requests_path), str(output))
+    assert (progress.completed, progress.skipped) == (0, 3)
+    assert len(_read_jsonl(output)) == 3
+
+
+def test_run_jsonl_reports_malformed_lines_and_keeps_going(client, tmp_path):
+    from ollama_toolkit.batch import run_jsonl
+
+    requests_path = tmp_path / "in.jsonl"
+    output = tmp_path / "out.jsonl"
+    lines = ['{"id": %d, "prompt": "x"}' % i for i in range(1, 30)]
+    lines[4] = '{"id": 5, "prompt": '
+    lines[9] = '[1, 2]'
+    _write_requests(requests_path, lines)
+    progress = run_jsonl(client, str(requests_path), str(output), concurrency=4)
+    assert (progress.completed, progress.failed) == (27, 2)
+    errors = {row["id"]: row["error"] for row in _read_jsonl(output) if "error" in row}
+    assert sorted(errors) == [5, 10]
+    assert "第5行" in errors[5]
+
+    # 恢复时只有无法解析的行再次失败
+    progress = run_jsonl(client, str(requests_path), str(output))
+    assert (progress.completed, progress.failed, progress.skipped) == (0, 2, 27)
+
+
+def test_checkpoint_drops_torn_last_line(tmp_path):
+    from ollama_toolkit.batch import Checkpoint
+
+    path = tmp_path / "out.ckpt"
+    path.write_bytes(b'"a"\n"b"\n"cc')
+    checkpoint = Checkpoint(str(path))
+    assert checkpoint.completed == {"a", "b"}
+    checkpoint.add("d")
+    checkpoint.close()
+    assert path.read_bytes() == b'"a"\n"b"\n"d"\n'
+    assert Checkpoint(str(path)).completed == {"a", "b", "d"}
+
+
+def test_run_jsonl_rejects_non_scalar_ids(client, tmp_path):
+    from ollama_toolkit.batch import run_jsonl
+
+    requests_path = tmp_path / "in.jsonl"
+    output = tmp_path / "out.jsonl"
+    _write_requests(requests_path, [
+        '{"id": ["a"], "prompt": "x"}',
+        '{"id": {"k": 1}, "prompt": "x"}',
+        '{"id": "c", "prompt": "x"}',
+    ])
+    progress = run_jsonl(client, str(requests_path), str(output))
+    assert (progress.completed, progress.failed) == (1, 2)
+    errors = {row["id"] for row in _read_jsonl(output) if "error" in row}
+    assert errors == {1, 2}
+
+
+def test_run_jsonl_repairs_torn_output_before_resuming(client, tmp_path):
+    from ollama_toolkit.batch import run_jsonl
+
+    requests_path = tmp_path / "in.jsonl"
+    output = tmp_path / "out.jsonl"
+    _write_requests(requests_path, ['{"id": "a", "prompt": "x"}', '{"id": "b", "prompt": "x"}'])
+    output.write_text('{"id": "a", "response": "ok"}\n{"id": "b", "resp', encoding="utf-8")
+    (tmp_path / "out.jsonl.ckpt").write_text('"a"\n', encoding="utf-8")
+    progress = run_jsonl(client, str(requests_path), str(output))
+    assert (progress.completed, progress.skipped) == (1, 1)
+    assert [row["id"] for row in _read_jsonl(output)] == ["a", "b"]
+
+
+def test_truncate_partial_line_searches_backwards_in_blocks(tmp_path):
+    from ollama_toolkit.batch import _truncate_partial_line
+
+    path = tmp_path / "out.jsonl"
+    path.write_bytes(b"first\n" + b"x" * 50)
+    _truncate_partial_line(str(path), block_size=8)
+    assert path.read_bytes() == b"first\n"
+    _truncate_partial_line(str(path), block_size=8)
+    assert path.read_bytes() == b"first\n"
+    path.write_bytes(b"no newline at all")
+    _truncate_partial_line(str(path), block_size=4)
+    assert path.read_bytes() == b""
@@ -0,0 +1,61 @@
+import time
+
+import pytest
+import requests
+
+from ollama_toolkit import bench
+from ollama_toolkit.fake_server import FakeOllamaServer
+from ollama_toolkit.ollama_client import OllamaClient
+
+
+def test_fake_server_paces_tokens_and_embeds():
+    with FakeOllamaServer(num_tokens=5, tokens_per_second=50, embedding_dim=16) as server:
+        client = OllamaClient(base_url=server.url)
+        started = time.perf_counter()
+        assert client.generate("hi") == " token" * 5
+        assert time.perf_counter() - started >= 0.08
+        assert client.generate("hi", options={"num_predict": 2}) == " token" * 2
+        response = requests.post(server.url + "/api/embed", json={"model": "nomic-embed-text", "input": ["a", "b"]})
+        assert [len(vector) for vector in response.json()["embeddings"]] == [16, 16]
+        client.close()
+
+
+def test_fake_server_injects_errors():
+    with FakeOllamaServer(error_rate=1.0, error_status=503) as server:
+        response = requests.post(server.url + "/api/generate", json={"model": "qwen3", "prompt": "hi"})
+        assert response.status_code == 503
+        assert server.requests == 1 and server.errors == 1
+
+
+def test_bench_overhead_and_concurrency(client):
+    result = bench.bench_overhead(client, 5, stream=True)
+    assert result["requests"] == 5 and result["ttft_overhead_p50_ms"] is not None
+    result = bench.bench_concurrency(client, 2, 4, tokens_per_second=100)
+    assert result["failed"] == 0 and result["tokens"] == 32
+
+
+def test_bench_decode_counts_every_line():
+    result = bench.bench_decode(tokens=200)
+    assert result["tokens"] == 201 and result["speedup"]
+
+
+def test_run_benchmarks_rejects_unknown_names():
+    with pytest.raises(ValueError, match="nope"):
+        bench.run_benchmarks(only=["nope"])
+
+
+def test_compare_matches_flattened_metrics():
+    baseline = {"results": {"sync": {"cpu_per_token_us": 10.0},
+                            "concurrency": [{"concurrency": 8, "tokens_per_second": 100.0}]}}
+    current = {"results": {"sync": {"cpu_per_token_us": 5.0},
+                           "concurrency": [{"concurrency": 8, "tokens_per_second": 150.0}]}}
+    rows = {name: change for name, _, _, change in bench.compare(current, baseline)}
+    assert rows["sync.cpu_per_token_us"] == -0.5
+    assert rows["concurrency.8.tokens_per_second"] == 0.5
+
+
+def test_save_and_load_results(tmp_path):
+    report = {"results": {"decode": {"tokens": 1}}}
+    path = str(tmp_path / "bench.json")
+    bench.save_results(report, path)
+    assert bench.load_results(path) == report
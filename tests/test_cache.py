@@ -0,0 +1,71 @@
+import time
+
+from ollama_toolkit.cache import MemoryCache, ResponseCache, SqliteCache, is_deterministic, request_key
+from ollama_toolkit.ollama_client import OllamaClient
+
+
+def test_request_key_ignores_stream_and_hashes_images():
+    base = {"model": "m", "prompt": "p", "images": ["aGk="]}
+    assert request_key("/api/generate", dict(base, stream=True)) == request_key("/api/generate", base)
+    assert request_key("/api/generate", base) != request_key("/api/chat", base)
+    assert request_key("/api/generate", base) != request_key("/api/generate", dict(base, images=["aG8="]))
+
+
+def test_is_deterministic():
+    assert is_deterministic({"options": {"temperature": 0}})
+    assert is_deterministic({"options": {"seed": 1}})
+    assert not is_deterministic({"options": {"temperature": 0.7}})
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+
+
+def test_sqlite_cache_evicts_by_size(tmp_path):
+    cache = SqliteCache(str(tmp_path / "c.db"), max_bytes=100)
+    for i in range(10):
+        cache.put(str(i), "x" * 30)
+    assert cache._size <= 100
+    assert cache.get("9")[0] == "x" * 30
+    assert cache.get("0") is None
+
+
+def test_sqlite_cache_purges_expired_entries_on_open_and_periodically(tmp_path):
+    path = str(tmp_path / "c.db")
+    cache = SqliteCache(path)
+    cache.put("old", "v", created=time.time() - 100)
+    cache.put("new", "v")
+    cache.close()
+
+    cache = SqliteCache(path, ttl=10, purge_every=2)
+    count = cache._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+    assert count == 1
+    cache.put("stale", "v", created=time.time() - 100)
+    cache.put("fresh", "v")
+    keys = {row[0] for row in cache._conn.execute("SELECT key FROM responses")}
+    assert keys == {"new", "fresh"}
+    cache.close()
+
+
+def test_cached_client_replays_hits_without_contacting_server(server, tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "c.db"))
+    client = OllamaClient(base_url=server.url, cache=cache)
+    options = {"temperature": 0}
+    first = client.generate("hi", options=options)
+    requests = server.requests
+    chunks = list(client.generate_stream("hi", options=options))
+    assert "".join(chunk.text for chunk in chunks) == first
+    assert chunks[-1].done and chunks[-1].data["cached"]
+    assert client.generate("hi", stream=False, options=options) == first
+    assert server.requests == requests
+    assert cache.hits == 2
+    # 非确定性请求不缓存
+    client.generate("hi")
+    assert server.requests == requests + 1
+    client.close()
+    cache.close()
@@ -0,0 +1,102 @@
+from ollama_toolkit.catalog import COMPLETION, DEFAULT_NUM_CTX, EMBEDDING, VISION, ModelCatalog, ModelInfo
+from ollama_toolkit.fake_server import FakeOllamaServer
+from ollama_toolkit.ollama_client import OllamaClient
+
+
+class Response:
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+class StubClient:
+    """
+    返回固定模型列表的客户端，记录每个请求的路径
+    """
+    def __init__(self, models):
+        self.models = models
+        self.calls = []
+
+    def _request(self, method, path, data=None):
+        self.calls.append(path)
+        if path == "/api/tags":
+            return Response({"models": self.models})
+        return Response({"details": {"family": "llama", "parameter_size": "7B"},
+                         "model_info": {"general.architecture": "llama", "llama.context_length": 4096},
+                         "capabilities": ["completion"]})
+
+
+def test_model_info_reads_show_response():
+    show = {
+        "details": {"family": "llama", "families": ["llama", "clip"], "parameter_size": "8.2B",
+                    "quantization_level": "Q4_K_M"},
+        "model_info": {"general.architecture": "llama", "llama.context_length": 131072,
+                       "llama.embedding_length": 4096},
+        "parameters": "stop \"<|eot|>\"\nnum_ctx 8192\n",
+    }
+    info = ModelInfo({"name": "llava:latest", "digest": "abc"}, show)
+    assert info.capabilities == {COMPLETION, VISION}
+    assert info.parameters == 8.2 and info.quantization == "Q4_K_M"
+    assert info.context_length == 131072 and info.context_window == 8192
+    assert info.as_dict()["capabilities"] == [COMPLETION, VISION]
+
+
+def test_model_info_infers_embedding_models(monkeypatch):
+    monkeypatch.delenv("OLLAMA_CONTEXT_LENGTH", raising=False)
+    info = ModelInfo({"name": "bge"}, {"details": {"family": "bert", "parameter_size": "335M"}})
+    assert info.capabilities == {EMBEDDING}
+    assert round(info.parameters, 3) == 0.335
+    assert info.context_window == DEFAULT_NUM_CTX
+
+
+def test_context_window_uses_server_default_below_trained_length(monkeypatch):
+    monkeypatch.delenv("OLLAMA_CONTEXT_LENGTH", raising=False)
+    show = {"model_info": {"general.architecture": "qwen3", "qwen3.context_length": 40960}}
+    info = ModelInfo({"name": "qwen3:latest"}, show)
+    # 模型支持的最大长度只是上限，没有设置num_ctx时服务器使用默认值
+    assert info.context_window == DEFAULT_NUM_CTX
+    assert info.window(default=8192) == 8192
+    assert info.window({"num_ctx": 16384}) == 16384
+    assert info.window({"num_ctx": 65536}) == 40960
+    monkeypatch.setenv("OLLAMA_CONTEXT_LENGTH", "32768")
+    assert info.context_window == 32768
+    catalog = ModelCatalog(StubClient([{"name": "qwen3:latest"}]), server_num_ctx=2048)
+    assert catalog.context_window("qwen3") == 2048
+
+
+def test_catalog_caches_tags_and_show():
+    client = StubClient([{"name": "qwen3:latest", "digest": "a"}])
+    catalog = ModelCatalog(client, ttl=60)
+    assert catalog.info("qwen3").name == "qwen3:latest"
+    assert catalog.info("qwen3:latest").context_window == 4096
+    assert catalog.info("missing") is None
+    assert client.calls == ["/api/tags", "/api/show"]
+
+
+def test_catalog_refetches_show_only_for_changed_digests():
+    client = StubClient([{"name": "a:latest", "digest": "1"}, {"name": "b:latest", "digest": "1"}])
+    catalog = ModelCatalog(client, ttl=0)
+    assert len(catalog.find(COMPLETION)) == 2
+    client.models = [{"name": "a:latest", "digest": "1"}, {"name": "b:latest", "digest": "2"}]
+    client.calls = []
+    assert len(catalog.find(COMPLETION)) == 2
+    assert client.calls.count("/api/show") == 1
+
+
+def test_client_routes_by_capability(monkeypatch):
+    monkeypatch.delenv("OLLAMA_CONTEXT_LENGTH", raising=False)
+    with FakeOllamaServer(models=("qwen3", "nomic-embed-text")) as server:
+        client = OllamaClient(base_url=server.url)
+        assert [info.name for info in client.catalog.find(EMBEDDING)] == ["nomic-embed-text"]
+        assert client.catalog.route("qwen3", EMBEDDING) == "nomic-embed-text"
+        assert client.catalog.route("qwen3", COMPLETION) == "qwen3"
+        # 没有模型具备该能力时使用首选的模型
+        assert client.catalog.route("qwen3", VISION) == "qwen3"
+        assert client.catalog.context_window("qwen3") == DEFAULT_NUM_CTX
+        assert client.catalog.context_window("qwen3", {"num_ctx": 2048}) == 2048
+        assert client.catalog.context_window("qwen3", {"num_ctx": 8192}) == 8192
+        assert client._route(None, EMBEDDING, preferred="qwen3") == "nomic-embed-text"
+        assert client._route("explicit", EMBEDDING) == "explicit"
+        client.close()
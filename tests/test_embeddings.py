@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from ollama_toolkit.embeddings import Retriever, VectorIndex, retrieval_message
+
+
+def test_search_returns_top_k_by_cosine_similarity():
+    index = VectorIndex()
+    index.add([[1, 0], [0, 1], [1, 1]], payloads=["x", "y", "xy"])
+    results = index.search([2, 0.1], k=2)
+    assert [payload for _, _, payload in results] == ["x", "xy"]
+    assert results[0][0] == pytest.approx(0.9988, abs=1e-3)
+    assert [len(hits) for hits in index.search_many([[1, 0], [0, 1]], k=5)] == [3, 3]
+
+
+def test_add_validates_dimensions_and_payload_count():
+    index = VectorIndex(dim=2)
+    with pytest.raises(ValueError):
+        index.add([[1, 2, 3]])
+    with pytest.raises(ValueError):
+        index.add([[1, 2]], payloads=["a", "b"])
+
+
+def test_persisted_index_reopens_memory_mapped(tmp_path):
+    path = str(tmp_path / "index")
+    index = VectorIndex(path=path)
+    index.add([[1, 0], [0, 1]], payloads=["a", "b"])
+    assert list(index.add([[1, 1]], payloads=[{"id": 3}])) == [2]
+    reopened = VectorIndex(path=path)
+    assert len(reopened) == 3
+    assert isinstance(reopened._vectors, np.memmap)
+    assert reopened.search([1, 1], k=1)[0][2] == {"id": 3}
+
+
+def test_crash_between_vector_and_payload_writes_is_repaired(tmp_path):
+    path = str(tmp_path / "index")
+    index = VectorIndex(path=path)
+    index.add([[1, 0], [0, 1]], payloads=["a", "b"])
+    # 模拟崩溃：向量已经写入，附加数据只写了一半
+    with open(os.path.join(path, VectorIndex.VECTORS_FILE), "ab") as f:
+        f.write(np.asarray([[0.6, 0.8]], dtype=np.float32).tobytes())
+    with open(os.path.join(path, VectorIndex.PAYLOADS_FILE), "a", encoding="utf-8") as f:
+        f.write('"c')
+
+    reopened = VectorIndex(path=path)
+    assert len(reopened) == 2 and reopened.payloads == ["a", "b"]
+    reopened.add([[-1, 0]], payloads=["d"])
+    again = VectorIndex(path=path)
+    assert again.payloads == ["a", "b", "d"]
+    assert again.search([-1, 0], k=1)[0][1:] == (2, "d")
+    assert os.path.getsize(os.path.join(path, VectorIndex.VECTORS_FILE)) == 3 * 2 * 4
+
+
+def test_extra_payloads_without_vectors_are_dropped(tmp_path):
+    path = str(tmp_path / "index")
+    VectorIndex(path=path).add([[1, 0]], payloads=["a"])
+    with open(os.path.join(path, VectorIndex.PAYLOADS_FILE), "a", encoding="utf-8") as f:
+        f.write('"orphan"\n')
+    index = VectorIndex(path=path)
+    index.add([[0, 1]], payloads=["b"])
+    assert VectorIndex(path=path).search([0, 1], k=1)[0][2] == "b"
+
+
+def test_embed_batches_and_retriever(client):
+    texts = [f"text {i}" for i in range(10)]
+    vectors = client.embed(texts, batch_size=3, concurrency=2)
+    assert len(vectors) == 10 and len(vectors[0]) == 384
+    assert vectors[4] == client.embed(["text 4"])[0]
+    index = VectorIndex()
+    index.add(vectors, payloads=texts)
+    assert Retriever(client, index, k=1)("text 7") == ["text 7"]
+    assert "[1] p" in retrieval_message(["p"])["content"]
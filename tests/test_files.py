@@ -0,0 +1,100 @@
+import pytest
+
+from ollama_toolkit.files import FileIngestor, FileProcessingError, iter_chunks
+from ollama_toolkit.ollama_client import OllamaClient
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    path = tmp_path / "server.log"
+    path.write_text("".join(f"line {i} some log text here\n" for i in range(1, 401)), encoding="utf-8")
+    return str(path)
+
+
+def test_iter_chunks_respects_budget_and_tracks_lines(log_file):
+    chunks = list(iter_chunks(log_file, max_tokens=300))
+    assert len(chunks) > 1
+    assert all(chunk.tokens <= 300 for chunk in chunks)
+    assert "".join(chunk.text for chunk in chunks) == open(log_file, encoding="utf-8").read()
+    assert chunks[0].start_line == 1
+    assert [chunk.start_line for chunk in chunks[1:]] == [chunk.end_line + 1 for chunk in chunks[:-1]]
+    assert chunks[-1].end_line == 400
+
+
+def test_iter_chunks_bounds_lines_without_newlines(tmp_path):
+    path = tmp_path / "one-line.txt"
+    path.write_text("x" * 10000, encoding="utf-8")
+    chunks = list(iter_chunks(str(path), max_tokens=500))
+    assert len(chunks) > 1
+    assert all(chunk.start_line == chunk.end_line == 1 for chunk in chunks)
+
+
+class RecordingClient(OllamaClient):
+    """
+    记录每次generate请求，并让包含fail_marker的map请求失败
+    """
+    def __init__(self, *args, fail_marker=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fail_marker = fail_marker
+        self.calls = []
+        self.final_prompts = []
+
+    def generate_stream(self, prompt, **kwargs):
+        if not kwargs.get("files"):
+            self.final_prompts.append(prompt)
+        return super().generate_stream(prompt, **kwargs)
+
+    def generate(self, prompt, **kwargs):
+        self.calls.append((prompt, kwargs))
+        if self.fail_marker and self.fail_marker in prompt:
+            raise RuntimeError("boom")
+        return super().generate(prompt, **kwargs)
+
+
+def test_small_files_are_inlined(client, tmp_path):
+    path = tmp_path / "small.txt"
+    path.write_text("hello", encoding="utf-8")
+    assert client.generate("总结", files=[str(path)]) == " token" * 8
+
+
+def test_large_files_map_reduce_without_format_on_intermediate_calls(server, log_file):
+    client = RecordingClient(base_url=server.url, file_ingestor=FileIngestor(chunk_tokens=300))
+    chunks = list(client.generate_stream("总结", files=[log_file], format="json"))
+    assert chunks[-1].done and "failed_chunks" not in chunks[-1].data
+    maps = [kwargs for prompt, kwargs in client.calls if "部分内容" in prompt]
+    assert len(maps) > 1
+    assert all("format" not in kwargs for kwargs in maps)
+
+
+def test_failed_chunks_raise_with_line_ranges(server, log_file):
+    client = RecordingClient(base_url=server.url, file_ingestor=FileIngestor(chunk_tokens=300),
+                             fail_marker="第2部分")
+    with pytest.raises(FileProcessingError) as info:
+        client.generate("总结", files=[log_file])
+    [failure] = info.value.failures
+    assert failure.index == 2 and failure.start_line > 1
+    assert "第2部分" in str(info.value)
+
+
+def test_allow_partial_reports_failed_chunks(server, log_file):
+    client = RecordingClient(base_url=server.url,
+                             file_ingestor=FileIngestor(chunk_tokens=300, allow_partial=True),
+                             fail_marker="第2部分")
+    chunks = list(client.generate_stream("总结", files=[log_file]))
+    assert len(chunks[-1].data["failed_chunks"]) == 1
+    [final_prompt] = client.final_prompts
+    assert final_prompt.startswith("注意：") and "第2部分" in final_prompt
+
+
+def test_reduce_truncates_oversized_partials_to_keep_merging(log_file):
+    from ollama_toolkit.fake_server import FakeOllamaServer
+    from ollama_toolkit.tokens import estimate_tokens
+
+    # 每个块的结果（约600个token）都超过预算，两两之间无法直接合并
+    with FakeOllamaServer(num_tokens=400) as server:
+        client = RecordingClient(base_url=server.url, file_ingestor=FileIngestor(chunk_tokens=300))
+        client.generate("总结", files=[log_file])
+    reduces = [prompt for prompt, kwargs in client.calls if "部分内容" not in prompt]
+    assert reduces
+    [final_prompt] = client.final_prompts
+    assert estimate_tokens(final_prompt) < 400
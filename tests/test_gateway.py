@@ -0,0 +1,227 @@
+import json
+import threading
+import time
+
+import pytest
+import requests
+
+from ollama_toolkit.cache import ResponseCache, request_key
+from ollama_toolkit.fake_server import FakeOllamaServer
+from ollama_toolkit.gateway import PRIORITIES, Gateway, Scheduler, _Flight, parse_priority
+from ollama_toolkit.ollama_client import OllamaClient
+from ollama_toolkit.streaming import StreamChunk
+
+TEXT = " token" * 8
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(gateway):
+        server = gateway.serve(port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return "http://127.0.0.1:%d" % server.server_address[1]
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def read_stream(url, path, data):
+    with requests.post(url + path, json=data, stream=True) as response:
+        assert response.status_code == 200
+        return [json.loads(line) for line in response.iter_lines() if line]
+
+
+def test_parse_priority():
+    assert parse_priority("interactive") == 0
+    assert parse_priority(" Batch ") == PRIORITIES["batch"]
+    assert parse_priority("-3") == -3
+    assert parse_priority("unknown") == PRIORITIES["default"]
+    assert parse_priority(None, default=7) == 7
+
+
+def test_scheduler_grants_slots_by_priority_then_arrival():
+    scheduler = Scheduler(max_concurrency=1)
+    held = scheduler.acquire("holder")
+    order = []
+
+    def wait(name, priority):
+        ticket = scheduler.acquire(name, priority)
+        order.append(name)
+        scheduler.release(ticket)
+
+    threads = []
+    for name, priority in (("batch", 2), ("first", 0), ("second", 0)):
+        thread = threading.Thread(target=wait, args=(name, priority))
+        thread.start()
+        threads.append(thread)
+        while sum(scheduler.stats["queued"].values()) < len(threads):
+            time.sleep(0.001)
+    scheduler.release(held)
+    for thread in threads:
+        thread.join(5)
+    assert order == ["first", "second", "batch"]
+    assert scheduler.stats["active"] == 0 and not scheduler.stats["queued"]
+
+
+def test_scheduler_skips_clients_over_quota():
+    scheduler = Scheduler(max_concurrency=2, per_client=1)
+    busy = scheduler.acquire("busy", 0)
+    acquired = []
+
+    def wait(name, priority):
+        acquired.append(scheduler.acquire(name, priority))
+
+    blocked = threading.Thread(target=wait, args=("busy", 0), daemon=True)
+    blocked.start()
+    while not scheduler.stats["queued"]:
+        time.sleep(0.001)
+    # 队首的请求所属的调用方已达到配额，优先级更低的其他调用方仍然可以获得名额
+    other = threading.Thread(target=wait, args=("other", 2))
+    other.start()
+    other.join(5)
+    assert [ticket.client_id for ticket in acquired] == ["other"]
+    scheduler.release(busy)
+    blocked.join(5)
+    assert [ticket.client_id for ticket in acquired] == ["other", "busy"]
+
+
+def test_identical_concurrent_requests_share_one_upstream_request():
+    with FakeOllamaServer(num_tokens=8, latency=0.2) as server:
+        gateway = Gateway(OllamaClient(base_url=server.url))
+        data = {"model": "qwen3", "prompt": "hi"}
+        results = []
+
+        def run():
+            results.append(list(gateway.stream("/api/generate", data)))
+
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        assert server.requests == 1
+        assert gateway.stats["coalesced"] == 3 and gateway.stats["in_flight"] == 0
+        for chunks in results:
+            assert "".join(chunk["response"] for chunk in chunks) == TEXT
+            assert chunks[-1]["done"]
+
+
+def test_abandoned_flight_is_retired_before_late_joiners_attach():
+    gateway = Gateway(client=None)
+    key = request_key("/api/generate", {"prompt": "hi"})
+    flight = _Flight()
+    gateway._flights[key] = flight
+    flight.join()
+    assert not gateway._retire(flight, key)
+    flight.leave()
+    assert gateway._retire(flight, key)
+    assert key not in gateway._flights
+
+
+def test_late_joiner_after_cancel_gets_full_response():
+    with FakeOllamaServer(num_tokens=8, tokens_per_second=100) as server:
+        gateway = Gateway(OllamaClient(base_url=server.url))
+        data = {"model": "qwen3", "prompt": "hi"}
+        stream = gateway.stream("/api/generate", data)
+        next(stream)
+        stream.close()
+        chunks = list(gateway.stream("/api/generate", data))
+        assert "".join(chunk["response"] for chunk in chunks) == TEXT
+
+
+@pytest.mark.parametrize("path, data, text_of", [
+    ("/api/generate", {"model": "qwen3", "prompt": "hi"}, lambda chunk: chunk["response"]),
+    ("/api/chat", {"model": "qwen3", "messages": [{"role": "user", "content": "hi"}]},
+     lambda chunk: chunk["message"]["content"]),
+])
+def test_cached_client_responses_are_forwarded(server, tmp_path, serve, path, data, text_of):
+    cache = ResponseCache(path=str(tmp_path / "c.db"))
+    url = serve(Gateway(OllamaClient(base_url=server.url, cache=cache)))
+    data = dict(data, options={"temperature": 0})
+    for _ in range(2):
+        chunks = read_stream(url, path, data)
+        assert "".join(text_of(chunk) for chunk in chunks) == TEXT
+        assert chunks[-1]["done"] and chunks[-1]["model"] == "qwen3"
+        single = requests.post(url + path, json=dict(data, stream=False)).json()
+        assert text_of(single) == TEXT
+    assert cache.hits == 3 and server.requests == 1
+    cache.close()
+
+
+class FailingClient:
+    def stream_chunks(self, path, data, make_chunk):
+        yield StreamChunk("partial", False, {"response": "partial"})
+        raise RuntimeError("upstream broke")
+
+
+def test_stream_reports_unexpected_upstream_errors(serve):
+    url = serve(Gateway(FailingClient(), coalesce=False))
+    chunks = read_stream(url, "/api/generate", {"model": "qwen3", "prompt": "hi"})
+    assert chunks[0]["response"] == "partial"
+    assert chunks[-1] == {"error": "upstream broke"}
+    response = requests.post(url + "/api/generate", json={"model": "qwen3", "prompt": "hi", "stream": False})
+    assert response.status_code == 502 and "upstream broke" in response.json()["error"]
+
+
+@pytest.fixture
+def pull_upstream():
+    """
+    逐行返回/api/pull进度的上游服务器，收到release信号后才发送最后一行
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    release = threading.Event()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_HEAD(self):
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for line in (b'{"status":"pulling manifest"}\n', None, b'{"status":"success"}\n'):
+                if line is None:
+                    release.wait(5)
+                    continue
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield "http://127.0.0.1:%d" % server.server_address[1], release
+    server.shutdown()
+    server.server_close()
+
+
+def test_forward_streams_pull_progress_as_it_arrives(serve, pull_upstream):
+    upstream, release = pull_upstream
+    url = serve(Gateway(OllamaClient(base_url=upstream)))
+    with requests.post(url + "/api/pull", json={"model": "qwen3"}, stream=True, timeout=2) as response:
+        lines = response.iter_lines()
+        # 第一行在上游完成之前就已到达
+        assert json.loads(next(lines)) == {"status": "pulling manifest"}
+        release.set()
+        assert [json.loads(line) for line in lines if line] == [{"status": "success"}]
+
+
+def test_head_heartbeat_is_forwarded(serve, pull_upstream):
+    upstream, _ = pull_upstream
+    url = serve(Gateway(OllamaClient(base_url=upstream)))
+    assert requests.head(url + "/").status_code == 200
@@ -0,0 +1,138 @@
+import pytest
+
+from ollama_toolkit.fake_server import FakeOllamaServer
+from ollama_toolkit.history import ChatLog, SessionStore
+from ollama_toolkit.ollama_client import OllamaClient
+
+
+def message(i):
+    # 40个字符约10个token，加上每条消息的固定开销共14个
+    return {"role": "user" if i % 2 == 0 else "assistant", "content": f"{i:02d}" + "x" * 38}
+
+
+def test_append_read_and_iterate(tmp_path):
+    path = str(tmp_path / "s.jsonl")
+    with ChatLog(path) as log:
+        assert [log.append(message(i)) for i in range(3)] == [0, 1, 2]
+        log.extend(message(i) for i in range(3, 600))
+        assert len(log) == 600
+        assert log.read(10, 12) == [message(10), message(11)]
+        assert log.read(599, 1000) == [message(599)]
+        assert log.read(5, 5) == []
+        assert list(log) == [message(i) for i in range(600)]
+    with ChatLog(path) as log:
+        assert len(log) == 600 and log.read(598) == [message(598), message(599)]
+
+
+def test_recent_respects_token_budget(tmp_path):
+    with ChatLog(str(tmp_path / "s.jsonl"), max_tokens=30) as log:
+        assert log.tail_start() == 0 and log.recent() == []
+        log.extend(message(i) for i in range(10))
+        assert log.tail_start() == 8
+        assert log.recent() == [message(8), message(9)]
+        assert log.tail_start(max_tokens=0, keep_recent=3) == 7
+        assert len(log.recent(max_tokens=1000)) == 10
+
+
+def test_recovers_from_torn_writes(tmp_path):
+    path = str(tmp_path / "s.jsonl")
+    with ChatLog(path) as log:
+        log.extend(message(i) for i in range(3))
+    # 模拟写入日志后、写入索引前退出，以及写到一半的日志行和索引记录
+    with open(path, "ab") as f:
+        f.write(b'{"role":"user","content":"lost index"}\n{"role":"us')
+    with open(path + ".idx", "ab") as f:
+        f.write(b"\x01\x02")
+    with ChatLog(path) as log:
+        assert len(log) == 4
+        assert log.read(3) == [{"role": "user", "content": "lost index"}]
+        log.append(message(4))
+        assert log.read(3)[-1] == message(4)
+    with ChatLog(path) as log:
+        assert len(log) == 5
+
+
+def test_rebuilds_index_when_log_was_replaced(tmp_path):
+    path = str(tmp_path / "s.jsonl")
+    with ChatLog(path) as log:
+        log.extend(message(i) for i in range(5))
+    with open(path, "wb") as f:
+        f.write(b'{"role":"user","content":"new"}\n')
+    with ChatLog(path) as log:
+        assert list(log) == [{"role": "user", "content": "new"}]
+
+
+def test_summary_and_clear(tmp_path):
+    with ChatLog(str(tmp_path / "s.jsonl")) as log:
+        assert log.summary() == ("", 0)
+        log.extend(message(i) for i in range(4))
+        log.save_summary("之前的对话", 10)
+        # 摘要涵盖的条数不超过实际的消息数
+        assert log.summary() == ("之前的对话", 4)
+        log.clear()
+        assert len(log) == 0 and log.summary() == ("", 0)
+        log.append(message(0))
+        assert list(log) == [message(0)]
+
+
+def test_session_store(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions"))
+    assert store.sessions() == []
+    with store.open("work") as log:
+        log.extend(message(i) for i in range(3))
+    with store.open("notes.v2"):
+        pass
+    sessions = {session["name"]: session for session in store.sessions()}
+    assert sessions["work"]["messages"] == 3 and sessions["notes.v2"]["messages"] == 0
+    assert store.exists("work")
+    assert store.delete("work") and not store.delete("work")
+    assert not store.exists("work")
+    for name in ("../escape", ".hidden", "a b"):
+        with pytest.raises(ValueError):
+            store.path(name)
+
+
+def test_chat_with_history_appends_turns(client, tmp_path):
+    path = str(tmp_path / "s.jsonl")
+    with ChatLog(path) as log:
+        reply = client.chat([{"role": "user", "content": "hi"}], history=log)
+        client.chat([{"role": "user", "content": "again"}], history=log)
+        assert len(log) == 4
+        assert log.read(0, 2) == [{"role": "user", "content": "hi"}, {"role": "assistant", "content": reply}]
+
+
+def test_failed_chat_leaves_history_unchanged(tmp_path):
+    with FakeOllamaServer(error_rate=1.0, error_status=400) as server, ChatLog(str(tmp_path / "s.jsonl")) as log:
+        client = OllamaClient(base_url=server.url)
+        with pytest.raises(Exception):
+            client.chat([{"role": "user", "content": "hi"}], history=log)
+        assert len(log) == 0
+        client.close()
+
+
+def test_context_prepends_summary_and_skips_summarized_messages(tmp_path):
+    with ChatLog(str(tmp_path / "s.jsonl")) as log:
+        assert log.context() == []
+        log.extend(message(i) for i in range(6))
+        assert log.context() == log.recent()
+        log.save_summary("之前的对话", 4)
+        summary, *recent = log.context()
+        assert summary["role"] == "system" and "之前的对话" in summary["content"]
+        assert recent == [message(4), message(5)]
+
+
+def test_chat_with_history_sends_saved_summary(tmp_path):
+    class RecordingClient(OllamaClient):
+        def chat(self, messages, **kwargs):
+            if kwargs.get("history") is None:
+                self.sent = list(messages)
+            return super().chat(messages, **kwargs)
+
+    with FakeOllamaServer(num_tokens=2) as server, ChatLog(str(tmp_path / "s.jsonl")) as log:
+        log.extend(message(i) for i in range(4))
+        log.save_summary("之前的对话", 2)
+        client = RecordingClient(base_url=server.url)
+        client.chat([{"role": "user", "content": "hi"}], history=log)
+        assert client.sent[0]["role"] == "system" and "之前的对话" in client.sent[0]["content"]
+        assert client.sent[1:] == [message(2), message(3), {"role": "user", "content": "hi"}]
+        client.close()
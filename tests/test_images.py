@@ -0,0 +1,58 @@
+import base64
+import io
+import os
+
+import pytest
+
+from ollama_toolkit.images import ImageEncoder, encode_file
+
+
+def test_encode_file_matches_base64(png):
+    with open(png, "rb") as f:
+        assert encode_file(png, block_size=30) == base64.b64encode(f.read()).decode("ascii")
+
+
+def test_encoder_caches_until_file_changes(png):
+    encoder = ImageEncoder()
+    first = encoder.encode(png)
+    assert encoder.encode(png) is first
+    with open(png, "ab") as f:
+        f.write(b"\0")
+    os.utime(png, ns=(0, 0))
+    assert encoder.encode(png) != first
+
+
+def test_encode_many_keeps_order_and_checks_files_first(png, tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+
+    other = str(tmp_path / "other.png")
+    Image.new("RGB", (10, 10)).save(other)
+    encoder = ImageEncoder(max_workers=2)
+    assert encoder.encode_many([png, other, png]) == [encode_file(png), encode_file(other), encode_file(png)]
+    with pytest.raises(FileNotFoundError):
+        encoder.encode_many([png, str(tmp_path / "missing.png")])
+    encoder.close()
+
+
+def test_max_side_downscales(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+
+    path = str(tmp_path / "big.png")
+    Image.new("RGB", (800, 400), (10, 200, 10)).save(path)
+    encoded = ImageEncoder(max_side=100).encode(path)
+    with Image.open(io.BytesIO(base64.b64decode(encoded))) as image:
+        assert max(image.size) == 100
+
+
+def test_generate_with_images_uses_chat(client, png):
+    assert client.generate("看图", images=[png]) == " token" * 8
+
+
+def test_client_close_shuts_down_encoder_pool(png):
+    from ollama_toolkit.ollama_client import OllamaClient
+
+    client = OllamaClient(image_encoder=ImageEncoder(max_workers=2))
+    client.image_encoder.encode_many([png, png])
+    assert client.image_encoder._pool is not None
+    client.close()
+    assert client.image_encoder._pool is None
@@ -0,0 +1,83 @@
+import threading
+
+import pytest
+
+from ollama_toolkit.history import ChatLog
+from ollama_toolkit.memory import ConversationMemory
+
+
+class StubClient:
+    """
+    可以控制摘要请求何时返回、chat是否失败的客户端替身
+    """
+    def __init__(self):
+        self.release = threading.Event()
+        self.release.set()
+        self.started = threading.Event()
+        self.fail_chat = False
+        self.summaries = 0
+
+    def generate(self, prompt, **kwargs):
+        self.started.set()
+        self.release.wait(5)
+        self.summaries += 1
+        return f"摘要{self.summaries}"
+
+    def chat(self, messages, sink=None, **kwargs):
+        if self.fail_chat:
+            raise ConnectionError("down")
+        return "回复"
+
+
+def test_budget_keeps_system_and_recent_messages():
+    memory = ConversationMemory(max_tokens=40, system="sys", keep_recent=2)
+    for i in range(20):
+        memory.add("user", f"message number {i}")
+    messages = memory.messages
+    assert messages[0] == {"role": "system", "content": "sys"}
+    assert messages[-1]["content"] == "message number 19"
+    assert memory.tokens <= 40
+    assert len(messages) < 21
+
+
+def test_evicted_messages_are_summarized_in_background(client):
+    memory = ConversationMemory(client, max_tokens=60)
+    for i in range(10):
+        memory.add("user", f"message number {i} " * 3)
+    memory.wait()
+    memory.close()
+    assert memory.summary.startswith("token")
+    assert memory.messages[0]["content"].startswith("以下是之前对话的摘要")
+
+
+def test_clear_discards_summary_started_before_it(tmp_path):
+    client = StubClient()
+    client.release.clear()
+    log = ChatLog(str(tmp_path / "s.jsonl"))
+    memory = ConversationMemory(client, max_tokens=30, log=log)
+    for i in range(6):
+        memory.add("user", f"message number {i} " * 2)
+    assert client.started.wait(5)
+    memory.clear()
+    client.release.set()
+    memory.wait()
+    memory.close()
+    assert memory.summary == ""
+    assert memory.messages == []
+    assert log.summary() == ("", 0)
+    assert len(log) == 0
+
+
+def test_failed_chat_rolls_back_user_turn(tmp_path):
+    client = StubClient()
+    log = ChatLog(str(tmp_path / "s.jsonl"))
+    memory = ConversationMemory(client, log=log)
+    assert memory.chat("你好") == "回复"
+    client.fail_chat = True
+    with pytest.raises(ConnectionError):
+        memory.chat("在吗")
+    assert [message["content"] for message in memory.messages] == ["你好", "回复"]
+    assert [message["content"] for message in log] == ["你好", "回复"]
+    client.fail_chat = False
+    memory.chat("在吗")
+    assert [message["content"] for message in log] == ["你好", "回复", "在吗", "回复"]
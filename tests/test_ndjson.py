@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from ollama_toolkit import ndjson
+
+
+def test_line_splitter_handles_arbitrary_boundaries():
+    payload = b'{"a":1}\n{"b":[1,2,3]}\n\n{"c":"x"}\n{"d":4}'
+    expected = [b'{"a":1}', b'{"b":[1,2,3]}', b"", b'{"c":"x"}']
+    for size in (1, 2, 3, 7, len(payload)):
+        splitter = ndjson.LineSplitter()
+        lines = []
+        for start in range(0, len(payload), size):
+            lines.extend(splitter.feed(payload[start:start + size]))
+        assert lines == expected
+        assert splitter.flush() == b'{"d":4}'
+        assert splitter.flush() == b""
+
+
+def test_decode_line_skips_blank_and_invalid_lines():
+    assert ndjson.decode_line(b"") is None
+    assert ndjson.decode_line(b"  \r") is None
+    assert ndjson.decode_line(b"{not json") is None
+    assert ndjson.decode_line('{"text":"中文"}'.encode("utf-8")) == {"text": "中文"}
+
+
+def test_iter_ndjson_matches_json_module():
+    objects = [{"response": f" token{i}", "done": False} for i in range(50)]
+    objects.append({"response": "", "done": True, "context": list(range(1000))})
+    payload = "".join(json.dumps(obj) + "\n" for obj in objects).encode("utf-8")
+    chunks = [payload[start:start + 100] for start in range(0, len(payload), 100)]
+    assert list(ndjson.iter_ndjson(chunks)) == objects
+
+
+def test_iter_ndjson_yields_unterminated_last_line():
+    chunks = [b'{"a":1}\ngarbage\n{"b"', b':2}']
+    assert list(ndjson.iter_ndjson(chunks)) == [{"a": 1}, {"b": 2}]
+
+
+def test_loads_falls_back_to_json_module():
+    # orjson不接受NaN，标准库可以解析
+    assert ndjson.loads(b'{"x": NaN}')["x"] != 0
+    with pytest.raises(ValueError):
+        ndjson.loads(b"{")
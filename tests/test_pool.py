@@ -0,0 +1,71 @@
+import socket
+
+import pytest
+import requests
+
+from ollama_toolkit.fake_server import FakeOllamaServer
+from ollama_toolkit.ollama_client import OllamaClient
+from ollama_toolkit.pool import NodePool, NoHealthyNodeError
+
+
+def closed_port_url():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return f"http://127.0.0.1:{port}"
+
+
+def test_acquire_prefers_least_outstanding_and_loaded_model():
+    pool = NodePool(["http://a", "http://b"], probe_interval=0, affinity=2)
+    a, b = pool.nodes
+    first = pool.acquire()
+    second = pool.acquire()
+    assert {first, second} == {a, b}
+    pool.release(first)
+    pool.release(second)
+    b.loaded.add("m")
+    # 已加载模型的节点可以多承担affinity个请求
+    picks = [pool.acquire("m") for _ in range(3)]
+    assert picks.count(b) == 3
+    assert pool.acquire("m") is a
+
+
+def test_release_ejects_on_connection_error_or_repeated_failures():
+    pool = NodePool(["http://a", "http://b"], probe_interval=0, max_failures=2)
+    a, b = pool.nodes
+    pool.release(pool.acquire(exclude=[b]), error=requests.exceptions.HTTPError("500"))
+    assert a.healthy
+    pool.release(pool.acquire(exclude=[b]), error=requests.exceptions.HTTPError("500"))
+    assert not a.healthy
+    pool.release(pool.acquire(), error=requests.exceptions.ConnectionError("refused"))
+    assert not b.healthy
+    with pytest.raises(NoHealthyNodeError):
+        pool.acquire()
+
+
+def test_client_fails_over_and_probe_readmits_node():
+    with FakeOllamaServer(num_tokens=2) as server:
+        dead = closed_port_url()
+        client = OllamaClient(base_url=[dead, server.url])
+        client.pool.probe_interval = 0
+        # 每次使用不同的模型，避免亲和性总是选中同一个节点
+        for i in range(4):
+            assert client.generate("hi", model=f"m{i}", stream=False) == " token" * 2
+        dead_node, live_node = client.pool.nodes
+        assert not dead_node.healthy and live_node.healthy
+        assert dead_node.requests == 1
+        assert live_node.outstanding == 0 and dead_node.outstanding == 0
+        assert "m0" in live_node.loaded
+        assert client.pool.probe(live_node)
+        assert not client.pool.probe(dead_node)
+        client.close()
+
+
+def test_streams_release_node_after_reading():
+    with FakeOllamaServer(num_tokens=3) as server:
+        client = OllamaClient(base_url=[server.url, server.url + "/"])
+        client.pool.probe_interval = 0
+        assert client.generate("hi") == " token" * 3
+        assert all(node.outstanding == 0 for node in client.pool.nodes)
+        client.close()
@@ -0,0 +1,57 @@
+import requests
+
+from ollama_toolkit.fake_server import FakeOllamaServer
+from ollama_toolkit.ollama_client import OllamaClient
+from ollama_toolkit.provision import PullProgress, preload, pull_many, running_models, unload, warm_up
+
+
+def test_preload_marks_models_loaded_on_every_node():
+    with FakeOllamaServer() as first, FakeOllamaServer() as second:
+        client = OllamaClient(base_url=[first.url, second.url])
+        results = preload(client, ["qwen3", "nomic-embed-text"], keep_alive="5m")
+        assert len(results) == 4 and all(result.ok for result in results)
+        assert all(node.loaded >= {"qwen3", "nomic-embed-text"} for node in client.pool.nodes)
+        assert first.requests == second.requests == 2
+
+        unload(client, ["qwen3"])
+        assert all("qwen3" not in node.loaded for node in client.pool.nodes)
+        client.close()
+
+
+def test_unload_all_uses_running_models(client, server):
+    running = running_models(client)
+    assert [entry["name"] for entry in running[server.url]] == ["qwen3"]
+    results = unload(client)
+    assert [result.input for result in results] == [(server.url, "qwen3")]
+
+
+def test_warm_up_reports_load_and_first_token(client, server):
+    results = warm_up(client, ["qwen3", "nomic-embed-text"])
+    assert all(result.ok for result in results)
+    for result in results:
+        assert result.output["load"] >= 0 and result.output["first_token"] >= 0
+    assert warm_up(client, prompt=None)[0].output["first_token"] is None
+
+
+def test_pull_many_skips_existing_and_reports_failures(client):
+    seen = []
+    results = pull_many(client, ["qwen3", "missing"], on_progress=lambda progress: seen.append(progress.finished))
+    outcomes = {result.input[1]: result for result in results}
+    assert outcomes["qwen3"].output == "exists"
+    assert isinstance(outcomes["missing"].error, requests.exceptions.HTTPError)
+    assert seen
+
+
+def test_pull_progress_sums_layers_and_ignores_resumed_bytes():
+    progress = PullProgress(2)
+    key = ("http://node", "m")
+    progress.update(key, {"status": "pulling", "digest": "a", "total": 100, "completed": 40})
+    progress.update(key, {"status": "pulling", "digest": "b", "total": 50, "completed": 0})
+    progress.update(key, {"status": "pulling", "digest": "a", "total": 100, "completed": 100})
+    assert progress.total == 150 and progress.completed == 100
+    assert progress._resumed == 40
+    assert progress.rate > 0 and progress.eta is not None
+    progress.finish(key)
+    progress.finish(("http://node", "x"), RuntimeError("boom"))
+    assert progress.finished == 1 and progress.failed == 1
+    assert progress.models[key] == "success"
@@ -0,0 +1,50 @@
+import io
+import time
+
+import pytest
+
+from ollama_toolkit import bench
+from ollama_toolkit.render import FrameRenderer
+
+
+def test_tokens_within_a_frame_are_coalesced():
+    stream = io.StringIO()
+    renderer = FrameRenderer(stream, fps=10)
+    for _ in range(100):
+        renderer.write(" token")
+    assert renderer.writes == 1
+    renderer.flush()
+    assert renderer.writes == 2
+    assert stream.getvalue() == " token" * 100
+
+
+def test_buffered_text_is_written_when_the_frame_ends():
+    stream = io.StringIO()
+    renderer = FrameRenderer(stream, fps=50)
+    renderer.write("a")
+    renderer.write("b")
+    assert stream.getvalue() == "a"
+    time.sleep(0.1)
+    assert stream.getvalue() == "ab" and renderer.writes == 2
+
+
+def test_zero_fps_writes_immediately_and_empty_text_is_ignored():
+    stream = io.StringIO()
+    with FrameRenderer(stream, fps=0) as renderer:
+        renderer.write("a")
+        renderer.write("")
+        renderer.write("b")
+    assert stream.getvalue() == "ab" and renderer.writes == 2
+
+
+def test_client_streams_into_renderer(client):
+    stream = io.StringIO()
+    with FrameRenderer(stream, fps=30) as renderer:
+        text = client.generate("hi", sink=renderer)
+    assert stream.getvalue() == text == " token" * 8
+
+
+@pytest.mark.parametrize("module", sorted(bench.IMPORT_BUDGET))
+def test_imports_stay_within_budget(module):
+    _, loaded = bench._import_profile(module)
+    assert loaded == []
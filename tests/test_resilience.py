@@ -0,0 +1,143 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from ollama_toolkit.fake_server import FakeOllamaServer
+from ollama_toolkit.ollama_client import DEFAULT_TIMEOUT, OllamaClient
+from ollama_toolkit.resilience import (
+    CircuitBreaker, CircuitOpenError, FirstTokenTimeout, HedgePolicy, ResiliencePolicy, RetryPolicy, is_transient
+)
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.exceptions.HTTPError(str(status), response=response)
+
+
+def test_is_transient():
+    assert is_transient(http_error(503)) and is_transient(http_error(429))
+    assert not is_transient(http_error(404))
+    assert is_transient(requests.exceptions.ConnectionError())
+    assert is_transient(requests.exceptions.ReadTimeout())
+    assert not is_transient(ValueError())
+
+
+def test_retry_policy_bounds_attempts_and_delay():
+    policy = RetryPolicy(max_attempts=3, base_delay=1.0, max_delay=3.0)
+    error = requests.exceptions.ConnectionError()
+    assert policy.should_retry(error, 2) and not policy.should_retry(error, 3)
+    assert all(0 <= policy.delay(attempt) <= 3.0 for attempt in range(1, 10) for _ in range(20))
+
+
+def test_circuit_breaker_opens_and_half_opens():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+
+def test_hedge_delay_uses_percentile_of_recent_samples():
+    hedge = HedgePolicy(percentile=50, min_samples=3, min_delay=0.01, initial_delay=1.0)
+    assert hedge.delay() == 1.0
+    for sample in (0.1, 0.2, 0.3, 0.4):
+        hedge.record(sample)
+    assert hedge.delay() == 0.3
+
+
+def test_client_uses_default_timeout_without_policy(client):
+    assert client.timeout == DEFAULT_TIMEOUT
+    assert OllamaClient(resilience=ResiliencePolicy(connect_timeout=1, read_timeout=2)).resilience.timeout == (1, 2)
+    # 默认的读取超时只用于流式响应，非流式请求只限制连接时间
+    assert client._timeout(True) == DEFAULT_TIMEOUT
+    assert client._timeout(False) == (DEFAULT_TIMEOUT[0], None)
+    # 显式设置的超时对非流式请求同样生效
+    assert OllamaClient(timeout=3)._timeout(False) == 3
+    assert OllamaClient(timeout=(5, 60))._timeout(False) == (5, 60)
+    # 与默认值相等的显式超时同样生效
+    assert OllamaClient(timeout=DEFAULT_TIMEOUT)._timeout(False) == DEFAULT_TIMEOUT
+    assert OllamaClient(timeout=None)._timeout(False) is None
+
+
+def test_explicit_read_timeout_limits_non_streaming_requests():
+    with FakeOllamaServer(num_tokens=2, latency=0.3) as server:
+        client = OllamaClient(base_url=server.url, timeout=(5, 0.1))
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            client.generate("hi", stream=False)
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            client.generate("hi")
+        client.close()
+
+
+def test_cli_timeout_option():
+    from ollama_toolkit.cli import timeout_options
+
+    class Args:
+        timeout = None
+
+    assert timeout_options(Args) == {}
+    Args.timeout = 0
+    assert timeout_options(Args) == {"timeout": (DEFAULT_TIMEOUT[0], None)}
+    Args.timeout = 60
+    assert timeout_options(Args) == {"timeout": (DEFAULT_TIMEOUT[0], 60)}
+
+
+def test_retries_transient_server_errors():
+    with FakeOllamaServer(num_tokens=2, error_rate=0.5, seed=3) as server:
+        policy = ResiliencePolicy(retry=RetryPolicy(max_attempts=10, base_delay=0.001), breaker_threshold=0)
+        client = OllamaClient(base_url=server.url, resilience=policy)
+        for _ in range(5):
+            assert client.generate("hi") == " token" * 2
+        assert server.errors > 0
+
+
+def test_first_token_timeout():
+    with FakeOllamaServer(latency=0.5) as server:
+        policy = ResiliencePolicy(first_token_timeout=0.1, retry=RetryPolicy(max_attempts=1))
+        client = OllamaClient(base_url=server.url, resilience=policy)
+        with pytest.raises(FirstTokenTimeout):
+            client.generate("hi")
+
+
+def test_open_breaker_is_not_counted_against_pool_node():
+    with FakeOllamaServer(num_tokens=2) as first, FakeOllamaServer(num_tokens=2) as second:
+        policy = ResiliencePolicy(retry=RetryPolicy(max_attempts=1), breaker_threshold=1, breaker_reset=60)
+        client = OllamaClient(base_url=[first.url, second.url], resilience=policy)
+        client.pool.probe_interval = 0
+        client.pool.max_failures = 1
+        policy.breaker(client.pool.nodes[0].url).record_failure()
+        for i in range(4):
+            assert client.generate("hi", model=f"m{i}", stream=False) == " token" * 2
+        blocked = client.pool.nodes[0]
+        assert blocked.healthy and blocked.failures == 0 and blocked.outstanding == 0
+        assert first.requests == 0
+
+        # 所有节点都熔断时抛出CircuitOpenError
+        policy.breaker(client.pool.nodes[1].url).record_failure()
+        with pytest.raises(CircuitOpenError):
+            client.generate("hi", stream=False)
+        assert all(node.healthy for node in client.pool.nodes)
+        client.close()
+
+
+def test_hedge_counters_are_thread_safe():
+    hedge = HedgePolicy()
+
+    def record():
+        for _ in range(1000):
+            hedge.record_hedge()
+            hedge.record_win()
+
+    threads = [threading.Thread(target=record) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert (hedge.hedges, hedge.wins) == (8000, 8000)
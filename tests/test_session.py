@@ -0,0 +1,44 @@
+from ollama_toolkit.ollama_client import OllamaClient
+from ollama_toolkit.session import GenerateSession
+
+
+class RecordingClient(OllamaClient):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sent = []
+
+    def generate_stream(self, prompt, **kwargs):
+        self.sent.append(kwargs)
+        return super().generate_stream(prompt, **kwargs)
+
+
+def test_session_sends_previous_context_and_counts_reuse(server):
+    client = RecordingClient(base_url=server.url)
+    session = GenerateSession(client, keep_alive="30m", options={"num_predict": 4})
+    assert session.generate("记住42") == " token" * 4
+    assert "context" not in client.sent[0]
+    assert client.sent[0]["keep_alive"] == "30m"
+    session.generate("是多少？")
+    assert client.sent[1]["context"] == [0, 1, 2, 3]
+    stats = session.stats
+    assert (stats["turns"], stats["context_tokens"], stats["reused_tokens"], stats["eval_count"]) == (2, 4, 4, 8)
+
+
+def test_per_call_kwargs_override_defaults_and_reset_drops_context(server):
+    client = RecordingClient(base_url=server.url)
+    session = GenerateSession(client, options={"num_predict": 4})
+    session.generate("a", options={"num_predict": 2})
+    assert client.sent[0]["options"] == {"num_predict": 2}
+    session.reset()
+    session.generate("b")
+    assert "context" not in client.sent[1]
+
+
+def test_abandoned_stream_keeps_previous_context(server):
+    client = RecordingClient(base_url=server.url)
+    session = GenerateSession(client)
+    session.generate("a", options={"num_predict": 3})
+    chunks = session.generate_stream("b")
+    next(chunks)
+    chunks.close()
+    assert session.context == [0, 1, 2] and session.turns == 1
@@ -0,0 +1,62 @@
+import io
+
+from ollama_toolkit.streaming import ResponseAccumulator, StreamChunk
+
+
+def test_chunk_constructors_read_text_and_stats():
+    chunk = StreamChunk.from_generate({"response": "a", "done": True, "eval_count": 3, "context": [1]})
+    assert (chunk.text, chunk.done, chunk.stats, chunk.context) == ("a", True, {"eval_count": 3}, [1])
+    chunk = StreamChunk.from_chat({"message": {"role": "assistant", "content": "b"}, "done": False})
+    assert (chunk.text, chunk.done, chunk.stats) == ("b", False, {})
+    assert StreamChunk.from_chat({"done": True}).text == ""
+
+
+def test_accumulator_joins_text_and_keeps_final_chunk():
+    accumulator = ResponseAccumulator()
+    for text in ("a", "", "b", "c"):
+        accumulator.add(StreamChunk(text))
+    assert accumulator.text == "abc"
+    accumulator.add(StreamChunk("d"))
+    final = StreamChunk("", True, {"eval_count": 4})
+    assert accumulator.add(final) is final
+    assert accumulator.text == "abcd"
+    assert accumulator.final is final
+    assert accumulator.stats == {"eval_count": 4}
+
+
+def test_accumulator_writes_to_callable_and_file_sinks():
+    parts = []
+    stream = io.StringIO()
+    chunks = [StreamChunk("x"), StreamChunk(""), StreamChunk("y", True)]
+    assert ResponseAccumulator(parts.append).consume(chunks) == "xy"
+    assert ResponseAccumulator(stream).consume(chunks) == "xy"
+    assert parts == ["x", "y"]
+    assert stream.getvalue() == "xy"
+
+
+def test_generate_stream_is_lazy_iterator(client):
+    chunks = list(client.generate_stream("hi"))
+    assert "".join(chunk.text for chunk in chunks) == " token" * 8
+    assert [chunk.done for chunk in chunks].count(True) == 1
+    assert chunks[-1].done and chunks[-1].stats["eval_count"] == 8
+
+
+def test_generate_and_chat_do_not_print_without_sink(client, capsys):
+    assert client.generate("hi") == " token" * 8
+    assert client.generate("hi", stream=False) == " token" * 8
+    assert client.chat([{"role": "user", "content": "hi"}]) == " token" * 8
+    assert capsys.readouterr().out == ""
+
+
+def test_chat_stream_forwards_text_to_sink(client):
+    sink = io.StringIO()
+    reply = client.chat([{"role": "user", "content": "hi"}], sink=sink)
+    assert sink.getvalue() == reply == " token" * 8
+
+
+def test_closing_stream_early_releases_connection(client, server):
+    chunks = client.generate_stream("hi", options={"num_predict": 1000})
+    next(chunks)
+    chunks.close()
+    # 连接已归还，后续请求不受影响
+    assert client.generate("hi") == " token" * 8
@@ -0,0 +1,142 @@
+import json
+
+import pytest
+
+from ollama_toolkit.streaming import StreamChunk
+from ollama_toolkit.structured import (
+    JSONStreamParser, SchemaValidator, StructuredOutputError, iter_structured, schema_dict
+)
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string", "maxLength": 20},
+        "tags": {"type": "array", "items": {"type": "string"}, "maxItems": 3},
+        "score": {"type": "integer", "minimum": 0, "maximum": 10},
+    },
+    "required": ["title", "score"],
+    "additionalProperties": False,
+}
+
+DOCUMENT = {"title": "标题 \"quoted\"\n", "tags": ["a", "b\\c"], "score": 7}
+
+
+def feed_all(parser, text, size):
+    events = []
+    for start in range(0, len(text), size):
+        events.extend(parser.feed(text[start:start + size]))
+    events.extend(parser.close())
+    return events
+
+
+@pytest.mark.parametrize("size", [1, 2, 5, 1000])
+def test_values_are_emitted_as_soon_as_complete(size):
+    text = json.dumps(DOCUMENT, ensure_ascii=False, indent=1)
+    events = feed_all(JSONStreamParser(SCHEMA), text, size)
+    assert events == [(("title",), DOCUMENT["title"]), (("tags",), DOCUMENT["tags"]),
+                      (("score",), 7), ((), DOCUMENT)]
+
+
+def test_depth_controls_nested_events():
+    parser = JSONStreamParser(depth=2)
+    events = parser.feed('{"tags": ["a", "b"], ')
+    assert events == [(("tags", 0), "a"), (("tags", 1), "b"), (("tags",), ["a", "b"])]
+    assert not parser.done
+
+
+def test_top_level_number_completes_on_close():
+    parser = JSONStreamParser({"type": "number"})
+    assert parser.feed("12") == []
+    assert parser.close() == [((), 12)]
+
+
+def test_schema_error_is_raised_after_completed_values():
+    parser = JSONStreamParser(SCHEMA)
+    events = parser.feed('{"title": "ok", "extra": 1}')
+    assert events == [(("title",), "ok")]
+    with pytest.raises(StructuredOutputError) as info:
+        parser.feed("more")
+    assert info.value.path == ("extra",)
+    assert info.value.text == '{"title": "ok", "extra": 1}'
+
+
+@pytest.mark.parametrize("text, path", [
+    ('{"title": 5', ("title",)),                            # 类型在值开始时检查
+    ('{"title": "x", "tags": ["a", "b", "c", "d"', ("tags", 3)),  # maxItems在元素开始时检查
+    ('{"title": "x", "score": 11,', ("score",)),
+    ('{"title": "x", "score": 1.5}', ("score",)),
+    ('{"score": 1}', ()),                                   # 缺少必需的字段
+])
+def test_schema_violations_are_detected_while_streaming(text, path):
+    parser = JSONStreamParser(SCHEMA)
+    with pytest.raises(StructuredOutputError) as info:
+        parser.feed(text)
+        parser.feed(" ")
+    assert info.value.path == path
+
+
+@pytest.mark.parametrize("text", ['{"a" 1}', "[1 2]", '{"a": tru', "{} x", '"\\x"'])
+def test_invalid_json_is_rejected(text):
+    parser = JSONStreamParser()
+    with pytest.raises(StructuredOutputError):
+        parser.feed(text)
+        parser.close()
+
+
+def test_incomplete_document_fails_on_close():
+    parser = JSONStreamParser()
+    parser.feed('{"a": [1, 2')
+    with pytest.raises(StructuredOutputError, match="完整"):
+        parser.close()
+
+
+def test_refs_and_any_of():
+    schema = {
+        "$defs": {"item": {"type": "object", "properties": {"n": {"type": "integer"}}, "required": ["n"]}},
+        "type": "array",
+        "items": {"anyOf": [{"$ref": "#/$defs/item"}, {"type": "null"}]},
+    }
+    assert feed_all(JSONStreamParser(schema), '[{"n": 1}, null]', 3)[-1] == ((), [{"n": 1}, None])
+    parser = JSONStreamParser(schema)
+    assert parser.feed('[{"n": 1}, "x"]') == [((0,), {"n": 1})]
+    with pytest.raises(StructuredOutputError) as info:
+        parser.close()
+    assert info.value.path == (1,)
+    SchemaValidator(schema).validate([{"n": 2}])
+    with pytest.raises(StructuredOutputError):
+        SchemaValidator(schema).validate([{}])
+
+
+def test_schema_dict_accepts_strings_and_model_classes():
+    class Model:
+        @classmethod
+        def model_json_schema(cls):
+            return {"type": "object"}
+
+    assert schema_dict("json") is None
+    assert schema_dict('{"type": "array"}') == {"type": "array"}
+    assert schema_dict(Model) == {"type": "object"}
+
+
+def test_iter_structured_closes_the_stream_on_violation():
+    closed = []
+
+    def chunks():
+        try:
+            for piece in ('{"title": "ok", ', '"score": 99', ", ", '"never": 1}'):
+                yield StreamChunk(piece)
+        finally:
+            closed.append(True)
+
+    events = []
+    with pytest.raises(StructuredOutputError):
+        for event in iter_structured(chunks(), SCHEMA):
+            events.append(event)
+    assert events == [(("title",), "ok")]
+    assert closed == [True]
+
+
+def test_client_stops_generation_on_invalid_output(client):
+    # 模拟服务器输出的不是JSON
+    with pytest.raises(StructuredOutputError):
+        list(client.generate_structured("hi", schema=SCHEMA))
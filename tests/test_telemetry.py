@@ -0,0 +1,92 @@
+import urllib.request
+import warnings
+
+import pytest
+
+from ollama_toolkit.fake_server import FakeOllamaServer
+from ollama_toolkit.ollama_client import OllamaClient
+from ollama_toolkit.streaming import StreamChunk
+from ollama_toolkit.telemetry import MetricsAggregator, RequestMetrics, emit
+
+
+def test_request_metrics_from_chunks():
+    metrics = RequestMetrics("/api/generate", "qwen3")
+    metrics.observe(StreamChunk("a", False, {}))
+    metrics.observe(StreamChunk("b", False, {}))
+    final = StreamChunk("", True, {"done": True, "eval_count": 10, "eval_duration": 2_000_000_000,
+                                   "prompt_eval_count": 4, "prompt_eval_duration": 1_000_000_000})
+    metrics.observe(final)
+    assert metrics.finish() and not metrics.finish()
+    assert metrics.chunks == 3 and len(metrics.inter_token) == 1
+    assert metrics.ttft is not None and metrics.duration >= metrics.ttft
+    assert metrics.tokens_per_second == 5 and metrics.prompt_tokens_per_second == 4
+    assert metrics.status == "ok" and metrics.as_dict()["eval_count"] == 10
+
+
+def test_client_records_streamed_request(client):
+    with client.track() as records:
+        chunks = list(client.generate_stream("hi"))
+    assert len(records) == 1
+    metrics = records[0]
+    assert chunks[-1].metrics is metrics
+    assert metrics.status == "ok" and metrics.chunks == len(chunks)
+    assert metrics.eval_count == 8 and metrics.tokens_per_second
+
+
+def test_cancelled_and_failed_requests_are_reported(client):
+    with client.track() as records:
+        stream = client.generate_stream("hi")
+        next(stream)
+        stream.close()
+    assert records[0].status == "cancelled"
+
+    with FakeOllamaServer(error_rate=1.0) as server:
+        failing = OllamaClient(base_url=server.url)
+        with failing.track() as records:
+            with pytest.raises(Exception):
+                failing.generate("hi")
+        assert records and records[-1].status == "error"
+
+
+def test_hook_errors_only_warn():
+    def broken(metrics):
+        raise ValueError("boom")
+
+    seen = []
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        emit([broken, seen.append], RequestMetrics("/api/chat"))
+    assert len(seen) == 1 and caught[0].category is RuntimeWarning
+
+
+def test_aggregator_renders_prometheus_text(client):
+    aggregator = MetricsAggregator(prefix="test")
+    client.add_hook(aggregator)
+    client.generate("hi")
+    client.chat([{"role": "user", "content": "hi"}])
+    client.remove_hook(aggregator)
+    text = aggregator.render()
+    assert 'test_requests_total{endpoint="/api/generate",model="qwen3",status="ok"} 1' in text
+    assert 'test_requests_total{endpoint="/api/chat",model="qwen3",status="ok"} 1' in text
+    assert 'test_generated_tokens_total{model="qwen3"} 16' in text
+    assert 'test_request_duration_seconds_count{model="qwen3"} 2' in text
+    assert 'test_time_to_first_token_seconds_bucket{model="qwen3",le="+Inf"} 2' in text
+
+
+def test_aggregator_skips_histograms_for_errors():
+    aggregator = MetricsAggregator()
+    metrics = RequestMetrics("/api/generate", "m")
+    metrics.finish(error=RuntimeError())
+    aggregator(metrics)
+    assert aggregator.requests.series == {("/api/generate", "m", "error"): 1}
+    assert not aggregator.duration.series
+
+
+def test_aggregator_serves_metrics():
+    aggregator = MetricsAggregator()
+    server = aggregator.serve(port=0)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+            assert b"# TYPE ollama_requests_total counter" in response.read()
+    finally:
+        aggregator.close()